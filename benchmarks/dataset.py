@@ -0,0 +1,109 @@
+"""
+Synthetic dataset with the bucket layout, for benchmarks without GCS.
+
+Writes `postings_gcp/` (built by `SpimiIndexBuilder`), `pr/pagerank.pkl`
+and `id_to_title/doc_id_to_title.pkl` under one directory, which
+`DataProvider(bucket_name=None, ...)` and `search_frontend` (`IR_DATA_DIR`)
+serve like the bucket. Document text is drawn from a Zipf distribution
+over `--vocab` terms that includes every term of the training queries, so
+replayed queries hit posting lists of realistic, varied length.
+
+    python -m benchmarks.dataset /tmp/ir_bench --docs 100000
+"""
+import argparse
+import json
+import pickle
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+
+from indexing.spimi import SpimiIndexBuilder
+from inverted_index_gcp import POSTING_FORMAT_BLOCK_V1, POSTING_FORMAT_RAW
+from text_processor.query_tokenize import QueryTokenize
+
+DATASET_META_FILE = "dataset.json"
+
+
+def load_queries(path: str = "queries_train.json") -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        return list(json.load(f))
+
+
+def _vocabulary(queries: List[str], vocab_size: int, rng: np.random.Generator) -> List[str]:
+    query_terms = list(dict.fromkeys(t for q in queries for t in QueryTokenize().tokenize(q)))
+    vocab = [f"w{i:06d}" for i in range(max(vocab_size, len(query_terms)) - len(query_terms))]
+    # query terms get Zipf ranks spread over the head and the tail
+    ranks = np.sort(rng.choice(len(vocab) + len(query_terms), len(query_terms), replace=False))
+    for rank, term in zip(ranks.tolist(), query_terms):
+        vocab.insert(rank, term)
+    return vocab
+
+
+def _documents(doc_ids: np.ndarray, vocab: List[str], doc_len: int, rng: np.random.Generator,
+               chunk: int = 1000) -> Iterator[Tuple[int, str]]:
+    weights = 1.0 / np.arange(1, len(vocab) + 1) ** 1.1
+    weights /= weights.sum()
+    words = np.array(vocab, dtype=object)
+    for start in range(0, len(doc_ids), chunk):
+        ids = doc_ids[start:start + chunk]
+        lengths = rng.integers(doc_len // 4, doc_len * 7 // 4 + 1, len(ids))
+        tokens = words[rng.choice(len(vocab), int(lengths.sum()), p=weights)]
+        for doc_id, toks in zip(ids.tolist(), np.split(tokens, np.cumsum(lengths)[:-1])):
+            yield doc_id, " ".join(toks)
+
+
+def build_dataset(root: str, n_docs: int = 20000, doc_len: int = 150, vocab_size: int = 50000,
+                  queries_path: str = "queries_train.json", block_format: bool = True, workers: int = 0,
+                  seed: int = 0) -> Dict:
+    """
+    Build the dataset in `root` (skipped when `root` already holds one
+    with the same parameters). Returns its metadata.
+    """
+    params = {"docs": n_docs, "doc_len": doc_len, "vocab": vocab_size, "block_format": block_format, "seed": seed}
+    meta_path = Path(root) / DATASET_META_FILE
+    if meta_path.exists():
+        meta = json.loads(meta_path.read_text())
+        if meta["params"] == params:
+            return meta
+
+    t0 = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    vocab = _vocabulary(load_queries(queries_path), vocab_size, rng)
+    # sparse ids like Wikipedia's, so gap encoding sees realistic gaps
+    doc_ids = np.sort(rng.choice(70_000_000, n_docs, replace=False) + 1)
+    builder = SpimiIndexBuilder(f"{root}/postings_gcp", workers=workers,
+                                posting_format=POSTING_FORMAT_BLOCK_V1 if block_format else POSTING_FORMAT_RAW)
+    builder.build(_documents(doc_ids, vocab, doc_len, rng))
+
+    for subdir, name, data in (("pr", "pagerank.pkl", dict(zip(doc_ids.tolist(), rng.pareto(1.5, n_docs).tolist()))),
+                               ("id_to_title", "doc_id_to_title.pkl",
+                                {d: f"Synthetic article {d}" for d in doc_ids.tolist()})):
+        Path(root, subdir).mkdir(parents=True, exist_ok=True)
+        with open(Path(root, subdir, name), "wb") as f:
+            pickle.dump(data, f)
+
+    meta = {"params": params, "build_s": time.perf_counter() - t0, "index": builder.stats}
+    meta_path.write_text(json.dumps(meta, indent=2))
+    return meta
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("root")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--doc-len", type=int, default=150, help="mean tokens per document")
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--queries", default="queries_train.json")
+    parser.add_argument("--raw-format", action="store_true", help="write the 6-byte posting format")
+    parser.add_argument("--workers", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    meta = build_dataset(args.root, args.docs, args.doc_len, args.vocab, args.queries,
+                         block_format=not args.raw_format, workers=args.workers, seed=args.seed)
+    print(json.dumps(meta, indent=2))
+
+
+if __name__ == "__main__":
+    main()
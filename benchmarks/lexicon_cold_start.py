@@ -0,0 +1,85 @@
+"""
+Cold-start benchmark: pickled InvertedIndex vs memory-mapped Lexicon.
+
+Builds a synthetic index metadata of `--terms` terms, writes it both as
+index.pkl and as a lexicon, then loads each one in a fresh interpreter and
+reports load time, resident memory and the time of `--lookups` df/location
+lookups. Prints a JSON report.
+
+    python -m benchmarks.lexicon_cold_start --terms 2000000
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from data_provider.lexicon import Lexicon
+from inverted_index_gcp import InvertedIndex
+
+_LOAD_SCRIPT = r"""
+import json, sys, time
+kind, path, terms = sys.argv[1], sys.argv[2], sys.argv[3:]
+t0 = time.perf_counter()
+if kind == "pickle":
+    from inverted_index_gcp import InvertedIndex
+    index = InvertedIndex.read_index(path, "index")
+else:
+    from data_provider.lexicon import Lexicon
+    index = Lexicon(path)
+t1 = time.perf_counter()
+for t in terms:
+    index.df.get(t, 0)
+    index.posting_locs[t]
+t2 = time.perf_counter()
+# VmHWM is the peak RSS of this interpreter (ru_maxrss survives exec)
+with open("/proc/self/status") as f:
+    hwm_kb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM"))
+print(json.dumps({"load_s": t1 - t0, "lookup_s": t2 - t1, "peak_rss_mb": hwm_kb / 1024}))
+"""
+
+
+def build_synthetic_index(n_terms: int, seed: int = 0) -> InvertedIndex:
+    rng = random.Random(seed)
+    index = InvertedIndex()
+    for i in range(n_terms):
+        w = f"term{i:08d}"
+        df = rng.randint(1, 5000)
+        index.df[w] = df
+        index.term_total[w] = df + rng.randint(0, df)
+        index.posting_locs[w].append((f"{i % 124}_{i // 50000:03}.bin", rng.randint(0, 1999990)))
+    return index
+
+
+def run_loader(kind: str, path: str, terms) -> dict:
+    repo_root = str(Path(__file__).resolve().parents[1])
+    out = subprocess.run([sys.executable, "-c", _LOAD_SCRIPT, kind, path, *terms],
+                         cwd=repo_root, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--terms", type=int, default=500_000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    index = build_synthetic_index(args.terms)
+    rng = random.Random(1)
+    lookups = [f"term{rng.randrange(args.terms):08d}" for _ in range(args.lookups)]
+    with tempfile.TemporaryDirectory() as tmp:
+        index._write_globals(tmp, "index", None)
+        Lexicon.build(index, f"{tmp}/lexicon")
+        report = {
+            "terms": args.terms,
+            "lookups": args.lookups,
+            "pickle": run_loader("pickle", tmp, lookups),
+            "lexicon": run_loader("lexicon", f"{tmp}/lexicon", lookups),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
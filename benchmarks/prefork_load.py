@@ -0,0 +1,109 @@
+"""
+Load test for the pre-fork server: throughput as the number of workers grows.
+
+For each `--workers` value a `PreforkServer` is started in a subprocess on a
+synthetic in-memory corpus (`SyntheticDataProvider`), `--clients` threads
+send /search requests for `--seconds`, and the queries per second are
+reported as JSON. Scoring is CPU bound, so with one worker the GIL caps the
+throughput at one core; it should grow with workers up to the core count.
+
+    python -m benchmarks.prefork_load --workers 1 2 4 8
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from pathlib import Path
+
+from flask import Flask, jsonify, request
+
+app = Flask(__name__)
+controller = None
+
+
+@app.route("/search")
+def search():
+    return jsonify(controller.get_top_100(request.args.get("query", ""), k=100))
+
+
+def serve(workers: int, args) -> None:
+    from benchmarks.synthetic import SyntheticDataProvider
+    from controllers.SearchController import SearchController
+    from serving.prefork import PreforkServer
+
+    def preload():
+        global controller
+        dp = SyntheticDataProvider(n_terms=args.terms, postings_per_term=args.postings)
+        controller = SearchController(bucket_name=None, data_provider=dp)
+
+    # per-request access logs would dominate the measurement
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = PreforkServer(app, host="127.0.0.1", port=0, workers=workers, preload=preload)
+    port = server.bind()
+    print(port, flush=True)
+    server.run()
+
+
+def load(port: int, args) -> float:
+    rng = random.Random(0)
+    queries = [" ".join(f"term{rng.randrange(args.terms)}" for _ in range(3)) for _ in range(200)]
+    done = []
+    deadline = time.monotonic() + args.seconds
+
+    def client(i):
+        n = 0
+        while time.monotonic() < deadline:
+            q = urllib.parse.quote_plus(queries[(i + n) % len(queries)])
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/search?query={q}") as r:
+                r.read()
+            n += 1
+        done.append(n)
+
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(done) / (time.monotonic() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--terms", type=int, default=50)
+    parser.add_argument("--postings", type=int, default=20000)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.workers[0], args)
+        return
+
+    report = {"cpus": os.cpu_count(), "clients": args.clients, "qps": {}}
+    repo_root = str(Path(__file__).resolve().parents[1])
+    for n in args.workers:
+        proc = subprocess.Popen([sys.executable, "-m", "benchmarks.prefork_load", "--serve", "--workers", str(n),
+                                 "--terms", str(args.terms), "--postings", str(args.postings)],
+                                cwd=repo_root, stdout=subprocess.PIPE, text=True)
+        try:
+            port = int(proc.stdout.readline())
+            load(port, argparse.Namespace(**{**vars(args), "seconds": 1.0}))  # warm up
+            report["qps"][n] = round(load(port, args), 1)
+        finally:
+            proc.send_signal(signal.SIGTERM)
+            proc.wait()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+End-to-end benchmark suite on a local synthetic dataset.
+
+Builds (or reuses) a `benchmarks.dataset` directory, then measures:
+- startup: time to load the providers and answer a first query, and the
+  peak RSS, in a fresh interpreter
+- the training queries replayed through `SearchController.get_top_100`
+  in process: per-query latency percentiles (first pass and warm passes)
+  and QPS with `--concurrency` client threads
+- with `--storage http`, the in-process replay reads the dataset through
+  `storage_backend.HTTPBackend` from a local Range-capable HTTP server
+  (`--storage-delay-ms` per request, `--readahead` windows) instead of
+  local files, as a stand-in for the bucket
+- the same queries against `search_frontend.py` over HTTP (`/search`),
+  started on the dataset with `IR_DATA_DIR`: time until /ready, latency,
+  QPS per concurrency level and the server's peak RSS
+
+The result cache is disabled, so every replay does the full work. The
+JSON report carries the git commit and parameters; with `--baseline` the
+ratio of every timing to the baseline report is added, for tracking
+regressions across commits.
+
+    python -m benchmarks.suite --data-dir /tmp/ir_bench --docs 100000 --out bench.json
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from benchmarks.dataset import build_dataset, load_queries
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+_STARTUP_SCRIPT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+from controllers.SearchController import SearchController
+from data_provider.data_provider import DataProvider
+t1 = time.perf_counter()
+root = sys.argv[1]
+dp = DataProvider(bucket_name=None, postings_subdir=f"{root}/postings_gcp", pr_subdir=f"{root}/pr",
+                  titles_subdir=f"{root}/id_to_title")
+sc = SearchController(bucket_name=None, data_provider=dp)
+t2 = time.perf_counter()
+sc.get_top_100(sys.argv[2])
+t3 = time.perf_counter()
+with open("/proc/self/status") as f:
+    hwm_kb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM"))
+print(json.dumps({"import_s": t1 - t0, "load_s": t2 - t1, "first_query_s": t3 - t2, "total_s": t3 - t0,
+                  "peak_rss_mb": hwm_kb / 1024}))
+"""
+
+
+def percentiles(latencies: List[float]) -> Dict[str, float]:
+    ms = np.asarray(latencies) * 1000
+    return {"n": len(ms), "mean_ms": float(ms.mean()), "p50_ms": float(np.percentile(ms, 50)),
+            "p90_ms": float(np.percentile(ms, 90)), "p99_ms": float(np.percentile(ms, 99)), "max_ms": float(ms.max())}
+
+
+def peak_rss_mb(pid: int) -> Optional[float]:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            return next(int(l.split()[1]) for l in f if l.startswith("VmHWM")) / 1024
+    except (OSError, StopIteration):
+        return None
+
+
+def replay(run: Callable[[str], object], queries: List[str], repeats: int) -> Dict:
+    """Run every query `repeats` times in order; latency of the first pass and of the others."""
+    cold, warm = [], []
+    for r in range(repeats):
+        for q in queries:
+            t0 = time.perf_counter()
+            run(q)
+            (cold if r == 0 else warm).append(time.perf_counter() - t0)
+    out = {"first_pass": percentiles(cold)}
+    if warm:
+        out["warm"] = percentiles(warm)
+    return out
+
+
+def throughput(run: Callable[[str], object], queries: List[str], clients: int, seconds: float) -> Dict:
+    """QPS and latency with `clients` threads issuing queries back to back."""
+    latencies: List[float] = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + seconds
+
+    def client(i):
+        n, mine = i, []
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            try:
+                run(queries[n % len(queries)])
+            except Exception as e:
+                errors.append(repr(e))
+            mine.append(time.perf_counter() - t0)
+            n += clients
+        with lock:
+            latencies.extend(mine)
+
+    t0 = time.monotonic()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    out = {"qps": len(latencies) / (time.monotonic() - t0), "errors": len(errors), **percentiles(latencies)}
+    return out
+
+
+def bench_startup(root: str, query: str) -> Dict:
+    out = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT, root, query],
+                         cwd=REPO_ROOT, check=True, capture_output=True, text=True)
+    return json.loads(out.stdout)
+
+
+def bench_in_process(root: str, queries: List[str], args) -> Dict:
+    from controllers.SearchController import SearchController
+    from data_provider.data_provider import DataProvider
+    server = None
+    if args.storage == "http":
+        from storage_backend import get_backend, serve_directory
+        server = serve_directory(root, delay=args.storage_delay_ms / 1000)
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        dp = DataProvider(bucket_name=url, readahead_bytes=args.readahead)
+    else:
+        dp = DataProvider(bucket_name=None, postings_subdir=f"{root}/postings_gcp", pr_subdir=f"{root}/pr",
+                          titles_subdir=f"{root}/id_to_title")
+    sc = SearchController(bucket_name=None, data_provider=dp)
+    run = lambda q: sc.get_top_100(q, k=100)
+    out = {"latency": replay(run, queries, args.repeats), "concurrency": {}}
+    for clients in args.concurrency:
+        out["concurrency"][clients] = throughput(run, queries, clients, args.seconds)
+    if server is not None:
+        backend = get_backend(url)
+        out["storage"] = {"requests": backend.requests, "bytes_read": backend.bytes_read}
+        server.shutdown()
+    dp.index_provider.close()
+    return out
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def bench_http(root: str, queries: List[str], args) -> Dict:
+    port = _free_port()
+    env = dict(os.environ, IR_DATA_DIR=str(Path(root).resolve()), IR_RESULT_CACHE_ENTRIES="0")
+    t0 = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "search_frontend.py", "--port", str(port),
+                             "--workers", str(args.server_workers)],
+                            cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    try:
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"search_frontend exited with {proc.returncode}")
+            try:
+                with urllib.request.urlopen(base + "/ready", timeout=1) as r:
+                    if r.status == 200:
+                        break
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                pass
+            time.sleep(0.05)
+        out = {"ready_s": time.perf_counter() - t0}
+
+        def run(q):
+            with urllib.request.urlopen(f"{base}/search?query={urllib.parse.quote_plus(q)}", timeout=60) as r:
+                return r.read()
+
+        out["latency"] = replay(run, queries, args.repeats)
+        out["concurrency"] = {}
+        for clients in args.concurrency:
+            out["concurrency"][clients] = throughput(run, queries, clients, args.seconds)
+        out["server_peak_rss_mb"] = peak_rss_mb(proc.pid)
+        return out
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def compare(report: Dict, baseline: Dict, path: str = "") -> Dict:
+    """Ratio current/baseline of every timing (keys ending in _s or _ms) and QPS present in both."""
+    out = {}
+    for key, value in report.items():
+        other = baseline.get(key) if isinstance(baseline, dict) else None
+        name = f"{path}.{key}" if path else str(key)
+        if isinstance(value, dict) and isinstance(other, dict):
+            out.update(compare(value, other, name))
+        elif (str(key).endswith(("_s", "_ms")) or key == "qps") and isinstance(value, (int, float)) \
+                and isinstance(other, (int, float)) and other:
+            out[name] = value / other
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--data-dir", default="/tmp/ir_bench")
+    parser.add_argument("--docs", type=int, default=20000)
+    parser.add_argument("--doc-len", type=int, default=150)
+    parser.add_argument("--vocab", type=int, default=50000)
+    parser.add_argument("--queries", default=str(REPO_ROOT / "queries_train.json"))
+    parser.add_argument("--repeats", type=int, default=3, help="passes over the queries for latency")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--seconds", type=float, default=5.0, help="duration of each throughput run")
+    parser.add_argument("--server-workers", type=int, default=1, help="pre-forked search_frontend workers")
+    parser.add_argument("--skip-http", action="store_true")
+    parser.add_argument("--storage", choices=("local", "http"), default="local",
+                        help="where the in-process replay reads the dataset from")
+    parser.add_argument("--storage-delay-ms", type=float, default=0.0, help="latency added per storage request")
+    parser.add_argument("--readahead", type=int, default=0, help="posting readahead window in bytes (http storage)")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    parser.add_argument("--out", default=None, help="write the JSON report here (default: stdout only)")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    dataset = build_dataset(args.data_dir, args.docs, args.doc_len, args.vocab, args.queries)
+    report = {
+        "commit": _git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "cpus": os.cpu_count(),
+        "params": {k: v for k, v in vars(args).items() if k not in ("baseline", "out")},
+        "dataset": dataset,
+        "startup": bench_startup(args.data_dir, queries[0]),
+        "controller": bench_in_process(args.data_dir, queries, args),
+    }
+    if not args.skip_http:
+        report["http"] = bench_http(args.data_dir, queries, args)
+    if args.baseline is not None:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            report["vs_baseline"] = compare(report, json.load(f))
+    text = json.dumps(report, indent=2)
+    if args.out is not None:
+        Path(args.out).write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""In-memory synthetic corpus with the `DataProvider` interface, for benchmarks."""
+from typing import Dict, List
+
+import numpy as np
+
+
+class SyntheticDataProvider:
+    """
+    Random postings, PageRank and titles held in NumPy arrays.
+
+    Term `term{i}` has roughly `postings_per_term` postings with Zipf-like
+    tfs. Everything is generated from `seed`, so every process that builds
+    the same provider sees the same corpus.
+    """
+
+    def __init__(self, n_terms: int = 50, postings_per_term: int = 20000, n_docs: int = 1_000_000, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.n_docs = n_docs
+        self.postings: Dict[str, tuple] = {}
+        for i in range(n_terms):
+            doc_ids = np.unique(rng.integers(0, n_docs, postings_per_term)).astype(np.uint32)
+            tfs = np.minimum(rng.zipf(2.0, len(doc_ids)), 2 ** 16 - 1).astype(np.uint16)
+            self.postings[f"term{i}"] = (doc_ids, tfs)
+        self.pagerank = rng.pareto(1.5, n_docs)
+
+    def terms(self) -> List[str]:
+        return list(self.postings)
+
+    def get_posting_list(self, terms, as_arrays=False):
+        empty = (np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16))
+        out = {t: self.postings.get(t, empty) for t in terms}
+        if as_arrays:
+            return out
+        return {t: list(zip(a[0].tolist(), a[1].tolist())) for t, a in out.items()}
+
+    def get_df(self, terms):
+        return {t: len(self.postings[t][0]) if t in self.postings else 0 for t in terms}
+
+    def get_term_bounds(self, terms):
+        return {}
+
+    def corpus_size(self):
+        return self.n_docs
+
+    def get_pagerank(self, doc_ids):
+        return {int(d): float(self.pagerank[int(d)]) for d in doc_ids}
+
+    def get_pagerank_array(self, doc_ids):
+        return self.pagerank[np.asarray(doc_ids, dtype=np.int64)]
+
+    def get_titles_from_docIDs(self, doc_ids):
+        return [(int(d), f"Article {int(d)}") for d in doc_ids]
+
+    def index_version(self):
+        return "synthetic"
+
+    def after_fork(self):
+        pass
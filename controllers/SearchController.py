@@ -1,30 +1,68 @@
-from typing import List, Dict, Tuple
+import logging
+import threading
+from collections import Counter
+from typing import List, Dict, Optional, Tuple
 
-from data_provider.data_provider import DataProvider
+import numpy as np
+
+from controllers.query_cache import QueryResultCache
+from data_provider.data_provider import DataProvider, ProviderNotReady
+from data_provider.pagerank_store import log_pagerank
 from text_processor.query_tokenize import QueryTokenize
+from ranker.array_accumulator import ArrayScoreAccumulator
 from ranker.bm25 import BM25
-from ranker.score_accumulator import ScoreAccumulator
+from ranker.max_score import MaxScore
+from ranker.top_k import TopK
+from telemetry.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
 
 class SearchController:
-    def __init__(self, bucket_name: str, query: str = "", weight_text: float = 0.8, weight_pagerank: float = 0.2):
+    def __init__(self, bucket_name: str, query: str = "", weight_text: float = 0.8, weight_pagerank: float = 0.2,
+                 data_provider: Optional[DataProvider] = None, result_cache: Optional[QueryResultCache] = None):
         # `query` parameter kept for backwards compatibility with tests
         # weights are configurable and stored on the controller; no hardcoded
         # values are used inside ranking methods.
-        self.data_provider = DataProvider(bucket_name=bucket_name)
+        # an already built (e.g. lazily loading) DataProvider can be injected
+        self.data_provider = data_provider if data_provider is not None else DataProvider(bucket_name=bucket_name)
         self.query_tk = QueryTokenize()
         self.ranker = BM25()
+        self.accumulator = ArrayScoreAccumulator()
         self.weight_text = float(weight_text)
         self.weight_pagerank = float(weight_pagerank)
+        # optional cache of final rankings, keyed on normalized tokens + weights
+        self.result_cache = result_cache
+        # per request thread: set when a PageRank lookup fell back to zero
+        self._local = threading.local()
         
         # backward compatibility aliases if needed by tests outside (though tests inject controller usually)
         self.weight_cosine = self.weight_text
 
 
     def query_to_tokens(self, query: str) -> List[str]:
-        return self.query_tk.tokenize(query)
+        with METRICS.stage("tokenize"):
+            return self.query_tk.tokenize(query)
 
     def tokens_df(self, tokens: List[str]) -> Dict[str, int]:
-        return self.data_provider.get_df(tokens)
+        with METRICS.stage("df"):
+            return self.data_provider.get_df(tokens)
+
+    def _posting_arrays(self, tokens: List[str]):
+        # posting I/O + decode; `IndexProvider` times the two separately
+        with METRICS.stage("postings"):
+            return self.data_provider.get_posting_list(tokens, as_arrays=True)
+
+    def _accumulate(self, postings, query_w, df_map, N):
+        with METRICS.stage("score"):
+            doc_ids, scores = self.accumulator.accumulate(postings=postings, query_w=query_w, df_map=df_map, N=N)
+        METRICS.postings_scored.inc(sum(len(p[0]) for p in postings.values()))
+        METRICS.candidates.observe(len(doc_ids))
+        return doc_ids, scores
+
+    def _titles(self, doc_ids: List[int]) -> List[tuple]:
+        with METRICS.stage("titles"):
+            return self.data_provider.get_titles_from_docIDs(doc_ids)
 
     def tokens_postings(self, tokens: List[str]):
         return self.data_provider.get_posting_list(tokens)
@@ -74,94 +112,107 @@ class SearchController:
         Compute final ranking scores (Text + PageRank).
         Returns a mapping doc_id -> score.
         """
-        # compute text-only scores (BM25 aggregation)
-        text_scores = self._compute_text_scores(query)
-        if not text_scores:
-            return {}
-
-        # fetch pagerank for the candidate set
-        doc_ids = list(text_scores.keys())
-        pr_scores = self._get_pagerank_scores(doc_ids)
+        doc_ids, combined = self.compute_ranking_arrays(query)
+        return dict(zip(doc_ids.tolist(), combined.tolist()))
 
-        # combine
-        combined = self._combine_scores(text_scores, pr_scores)
-        return combined
+    def compute_ranking_arrays(self, query: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Array form of `compute_ranking_scores`: (doc_ids, final scores),
+        candidates in first-seen order, ready for `TopK.from_arrays`.
+        """
+        doc_ids, scores = self.compute_text_score_arrays(query)
+        if len(doc_ids) == 0:
+            return doc_ids, scores.astype(np.float64)
+        return doc_ids, self._combine_scores(scores, self._log_pagerank(doc_ids))
 
-    def _compute_text_scores(self, query: str) -> Dict[int, float]:
-        """Compute text similarity scores between query and documents (BM25).
+    def compute_text_score_arrays(self, query: str):
+        """Compute aggregated BM25 scores term-at-a-time into NumPy buffers.
 
-        Returns dict doc_id -> score (float).
+        Returns (doc_ids, scores) arrays, candidates in first-seen order.
         """
-        doc_scores = self.compute_doc_scores(query)
+        tokens = self.query_to_tokens(query)
+        if not tokens:
+            return self.accumulator.accumulate({}, {}, {}, 0)
+        postings = self._posting_arrays(tokens)
         query_w = self.get_query_term_weights(query)
-        if not query_w or not doc_scores:
-            return {}
-        return ScoreAccumulator.aggregate_scores(query_w=query_w, doc_scores=doc_scores)
+        return self._accumulate(postings, query_w, self.tokens_df(tokens), self.corpus_size())
 
-    def _get_pagerank_scores(self, doc_ids: List[int]) -> Dict[int, float]:
-        """Fetch PageRank scores for the given doc ids. Always reads from disk/provider.
+    def _compute_text_scores(self, query: str) -> Dict[int, float]:
+        """Compute text similarity scores between query and documents (BM25).
 
-        Returns dict doc_id -> pagerank (float). Missing ids map to 0.0.
+        Returns dict doc_id -> score (float), the same values and order as
+        `ScoreAccumulator.aggregate_scores` over `compute_doc_scores`.
         """
-        if not doc_ids:
-            return {}
-        try:
-            pr = self.data_provider.get_pagerank(doc_ids)
-            # ensure keys are ints and values are floats
-            return {int(d): float(v) for d, v in pr.items()}
-        except Exception:
-            # on failure, return zeros for all docs
-            return {int(d): 0.0 for d in doc_ids}
+        doc_ids, scores = self.compute_text_score_arrays(query)
+        return dict(zip(doc_ids.tolist(), scores.tolist()))
 
-    def _combine_scores(self, text_scores: Dict[int, float], pr_scores: Dict[int, float]) -> Dict[int, float]:
-        """Combine text(BM25) and pagerank scores using controller weights.
-
-        No hardcoded weights here; uses `self.weight_text` and
-        `self.weight_pagerank` provided at construction.
+    def log_pagerank_prior(self, doc_ids: np.ndarray) -> Tuple[np.ndarray, bool]:
         """
-        if not text_scores:
-            return {}
+        Log10 PageRank prior (float32) of every candidate; PageRank is
+        power-law distributed. Providers precompute it at load time
+        (`get_log_pagerank_array`); for the others it is derived from the
+        raw scores here.
+
+        Returns (prior, degraded). A lookup that fails gives PageRank 0,
+        like a missing document, with degraded=True: a ranking built on
+        it must not be cached. A provider that is still loading raises
+        `ProviderNotReady` so the request can be retried.
+        """
+        with METRICS.stage("pagerank"):
+            try:
+                lookup = getattr(self.data_provider, "get_log_pagerank_array", None)
+                if lookup is not None:
+                    return np.asarray(lookup(doc_ids), dtype=np.float32), False
+                return log_pagerank(self.data_provider.get_pagerank_array(doc_ids)), False
+            except ProviderNotReady:
+                raise
+            except (LookupError, ValueError, OSError):
+                logger.warning("PageRank lookup failed, ranking without it", exc_info=True)
+                return log_pagerank(np.zeros(len(doc_ids))), True
+
+    def _log_pagerank(self, doc_ids: np.ndarray) -> np.ndarray:
+        """`log_pagerank_prior` that records a fallback for `_take_degraded`."""
+        log_pr, degraded = self.log_pagerank_prior(doc_ids)
+        if degraded:
+            self._local.degraded = True
+        return log_pr
+
+    def _take_degraded(self) -> bool:
+        """True if a PageRank lookup of this thread fell back to 0 since the last call; resets the flag."""
+        degraded = getattr(self._local, "degraded", False)
+        self._local.degraded = False
+        return degraded
 
-        import math
-
-        # 1. Normalize BM25/Text scores (Min-Max)
-        # ScoreAccumulator returns raw BM25 summation scores
-        c_vals = list(text_scores.values())
-        c_max = max(c_vals)
-        c_min = min(c_vals)
-        c_diff = c_max - c_min
-        if c_diff == 0:
-            c_diff = 1.0
-
-        # 2. Log-scale PageRank and normalize (Min-Max)
-        # PageRank is power-law distributed, so log-scale is essential.
-        epsilon = 1e-8
-        log_pr_vals = {}
-        # compute logs for all relevant docs
-        for did in text_scores:
-            val = pr_scores.get(did, 0.0)
-            # handle zero or extremely small PR
-            log_pr_vals[did] = math.log10(val if val > epsilon else epsilon)
-            
-        lp_vals = list(log_pr_vals.values())
-        lp_max = max(lp_vals)
-        lp_min = min(lp_vals)
-        lp_diff = lp_max - lp_min
-        if lp_diff == 0:
-            lp_diff = 1.0
-
-        combined: Dict[int, float] = {}
-        for did, raw_score in text_scores.items():
-            # Normalized BM25 [0, 1]
-            c_norm = (raw_score - c_min) / c_diff
-            
-            # Normalized Log-PR [0, 1]
-            lp_norm = (log_pr_vals[did] - lp_min) / lp_diff
-            
-            # Weighted combination
-            combined[did] = self.weight_text * c_norm + self.weight_pagerank * lp_norm
-
-        return combined
+    @staticmethod
+    def _score_ranges(scores: np.ndarray, log_pr: np.ndarray) -> Tuple[float, float, float, float]:
+        """(min, max) of the text scores and of the log PageRank, used for min-max normalization."""
+        return float(scores.min()), float(scores.max()), float(log_pr.min()), float(log_pr.max())
+
+    def _combine_scores(self, scores: np.ndarray, log_pr: np.ndarray,
+                        ranges: Optional[Tuple[float, float, float, float]] = None) -> np.ndarray:
+        """Combine text (BM25) scores and the log PageRank prior using controller weights.
+
+        Min-max normalizes both and fuses them with `self.weight_text` and
+        `self.weight_pagerank` in a few array operations. Returns float64
+        scores aligned with the inputs. `ranges` overrides the
+        normalization ranges taken from the candidates (sharded search
+        normalizes over the candidates of every shard).
+        """
+        with METRICS.stage("combine"):
+            if len(scores) == 0:
+                return np.empty(0, dtype=np.float64)
+            if ranges is None:
+                ranges = self._score_ranges(scores, log_pr)
+            c_min, c_max, lp_min, lp_max = ranges
+            c_diff = (c_max - c_min) or 1.0
+            lp_diff = (lp_max - lp_min) or 1.0
+            # w_t * (s - c_min) / c_diff + w_p * (lp - lp_min) / lp_diff
+            combined = np.subtract(scores, c_min, dtype=np.float64)
+            combined *= self.weight_text / c_diff
+            prior = np.subtract(log_pr, lp_min, dtype=np.float64)
+            prior *= self.weight_pagerank / lp_diff
+            combined += prior
+            return combined
 
 #===============================Not debugging======================
     @staticmethod
@@ -172,29 +223,149 @@ class SearchController:
         if not scores:
             return []
 
-        ranked = sorted(scores.items(),key=lambda item: item[1],reverse=True)
-
-        top_k = ranked[:k]
+        # bounded heap: O(n log k) instead of sorting every candidate
+        with METRICS.stage("sort"):
+            top_k = TopK.from_dict(scores, k)
 
         return [doc_id for doc_id, _ in top_k]
 
-    def get_top_k(self, query: str, k: int = 10) -> List[int]:
-        scores = self.compute_ranking_scores(query)
-        top10_docs = self.rank_top_k(scores, k)
-        return top10_docs
-
-    def get_top_100(self, query: str, k: int = 100) -> List[Tuple[int, str]]:
-        scores = self.compute_ranking_scores(query)
-        top100_docs = self.rank_top_k(scores, k)
-        res = self.data_provider.get_titles_from_docIDs(top100_docs)
-        return res
-
-
-
-
-
+    @staticmethod
+    def _rank_arrays(doc_ids: np.ndarray, scores: np.ndarray, k: int) -> List[int]:
+        """Array variant of `rank_top_k`, same order (ties by candidate order)."""
+        with METRICS.stage("sort"):
+            top_ids, _ = TopK.from_arrays(doc_ids, scores, k)
+        return top_ids.tolist()
 
+    def get_top_k_text(self, query: str, k: int = 10) -> List[int]:
+        """
+        Top-k doc IDs by BM25 text score alone, using MaxScore pruning.
 
+        Same result as `rank_top_k(self._compute_text_scores(query), k)`
+        without scoring every posting of every query term.
+        """
+        tokens = self.query_to_tokens(query)
+        if not tokens:
+            return []
+        postings = self._posting_arrays(tokens)
+        query_w = self.get_query_term_weights(query)
+        return [doc_id for doc_id, _ in self._max_score(postings, query_w, self.tokens_df(tokens), self.corpus_size(),
+                                                        k, self.data_provider.get_term_bounds(tokens))]
+
+    def _max_score(self, postings, query_w, df_map, N, k, bounds):
+        stats = {}
+        with METRICS.stage("max_score"):
+            top = MaxScore.top_k(postings=postings, query_w=query_w, df_map=df_map, N=N, k=k, bounds=bounds,
+                                 stats=stats)
+        METRICS.postings_scored.inc(stats.get("essential_postings", 0))
+        METRICS.candidates.observe(stats.get("scored", 0))
+        return top
+
+    def _cache_key(self, kind: str, tokens: List[str], k: int) -> str:
+        return QueryResultCache.make_key(tokens, kind=kind, k=k, k1=self.ranker.K1,
+                                         weight_text=self.weight_text, weight_pagerank=self.weight_pagerank)
+
+    def _cached(self, kind: str, query: str, k: int, compute):
+        """Return compute() through the result cache, when one is set."""
+        if self.result_cache is None:
+            return compute()
+        self.result_cache.set_version(self.data_provider.index_version())
+        key = self._cache_key(kind, self.query_to_tokens(query), k)
+        with METRICS.stage("result_cache"):
+            res = self.result_cache.get(key)
+        if res is None:
+            self._take_degraded()
+            res = compute()
+            # a ranking without PageRank must not outlive the failure
+            if not self._take_degraded():
+                self.result_cache.put(key, res)
+        return res
 
+    def get_top_k(self, query: str, k: int = 10) -> List[int]:
+        def compute():
+            if self.weight_pagerank == 0:
+                # min-max normalization keeps the BM25 order, so prune on it
+                return self.get_top_k_text(query, k)
+            return self._rank_arrays(*self.compute_ranking_arrays(query), k)
+        with METRICS.query("top_k"):
+            return list(self._cached("top_k", query, k, compute))
 
+    def get_top_100(self, query: str, k: int = 100) -> List[Tuple[int, str]]:
+        def compute():
+            top100_docs = self._rank_arrays(*self.compute_ranking_arrays(query), k)
+            return self._titles(top100_docs)
+        # the disk tier stores JSON, which turns tuples into lists
+        with METRICS.query("top_100"):
+            return [tuple(r) for r in self._cached("top_100", query, k, compute)]
+
+    def get_top_k_batch(self, queries: List[str], k: int = 10, with_titles: bool = False) -> List[List]:
+        """
+        Rank many queries at once, sharing the data reads between them.
 
+        The posting lists, df and bounds of the union of all query terms are
+        fetched and decoded once, every query is scored against those shared
+        arrays, and PageRank (and titles) are looked up in one call for all
+        candidates. Returns one result per query, equal to `get_top_k(q, k)`,
+        or to `get_top_100(q, k)` with `with_titles=True`.
+        """
+        with METRICS.query("batch"):
+            return self._top_k_batch(queries, k, with_titles)
+
+    def _top_k_batch(self, queries: List[str], k: int, with_titles: bool) -> List[List]:
+        kind = "top_100" if with_titles else "top_k"
+        tokens_by_q = [self.query_to_tokens(q) for q in queries]
+        results: List[Optional[List]] = [[] if not tokens else None for tokens in tokens_by_q]
+        keys: Dict[int, str] = {}
+        if self.result_cache is not None:
+            self.result_cache.set_version(self.data_provider.index_version())
+            for i, tokens in enumerate(tokens_by_q):
+                if tokens:
+                    keys[i] = self._cache_key(kind, tokens, k)
+                    with METRICS.stage("result_cache"):
+                        results[i] = self.result_cache.get(keys[i])
+        todo = [i for i, res in enumerate(results) if res is None]
+
+        union = list(dict.fromkeys(t for i in todo for t in tokens_by_q[i]))
+        if union:
+            postings = self._posting_arrays(union)
+            df_map = self.tokens_df(union)
+            N = self.corpus_size()
+        use_max_score = self.weight_pagerank == 0 and not with_titles
+        bounds = self.data_provider.get_term_bounds(union) if use_max_score and union else {}
+
+        self._take_degraded()
+        text: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        for i in todo:
+            tokens = tokens_by_q[i]
+            # same term order as a single-query fetch
+            q_postings = {t: postings[t] for t in tokens}
+            query_w = self.ranker.compute_query_weights(tf_counts=Counter(tokens), df_map=df_map, N=N)
+            if use_max_score:
+                top = self._max_score(q_postings, query_w, df_map, N, k, bounds)
+                results[i] = [doc_id for doc_id, _ in top]
+            else:
+                text[i] = self._accumulate(q_postings, query_w, df_map, N)
+
+        if text:
+            all_ids = np.unique(np.concatenate([doc_ids for doc_ids, _ in text.values()]))
+            log_pr = self._log_pagerank(all_ids)
+            for i, (doc_ids, scores) in text.items():
+                if len(doc_ids) == 0:
+                    results[i] = []
+                    continue
+                combined = self._combine_scores(scores, log_pr[np.searchsorted(all_ids, doc_ids)])
+                results[i] = self._rank_arrays(doc_ids, combined, k)
+
+        if with_titles and todo:
+            top_ids = list(dict.fromkeys(d for i in todo for d in results[i]))
+            titles = dict(self._titles(top_ids))
+            for i in todo:
+                results[i] = [(d, titles[d]) for d in results[i]]
+
+        if self.result_cache is not None:
+            degraded = self._take_degraded()
+            for i in todo:
+                if not (degraded and i in text):
+                    self.result_cache.put(keys[i], results[i])
+        if with_titles:
+            return [[tuple(r) for r in res] for res in results]
+        return [list(res) for res in results]
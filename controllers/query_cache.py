@@ -0,0 +1,281 @@
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# connections a forked process inherited; referenced so they are never closed there
+_INHERITED_CONNECTIONS = []
+
+
+class QueryResultCache:
+    """
+    LRU + TTL cache of ranked query results, with an optional SQLite tier.
+
+    Keys are built by `make_key` from the normalized query (tokens after
+    `QueryTokenize` with their counts) and the ranking parameters, so
+    queries that differ only in case, punctuation or stopwords share an
+    entry. Every entry also carries the index version it was computed on:
+    `set_version` drops the entries of any other version, in memory and on
+    disk. Values must be JSON serializable when `disk_path` is set; the
+    disk tier survives restarts and refills the memory tier on a hit.
+
+    The disk tier is kept off the query path's lock: reads use a
+    connection per thread (WAL mode, so they never wait for a write) and
+    writes are queued to a background thread that commits them in
+    batches. It holds at most `max_disk_entries` rows; the oldest (by
+    creation time) are deleted first.
+
+    SQLite connections must not cross `fork`: they are opened lazily per
+    process, and a forked worker drops the ones it inherited (`after_fork`,
+    also done on first use in a new process). A SQLite error (e.g.
+    "database is locked" with many workers on one file) only skips the
+    disk tier for that lookup or write; `disk_errors` counts them.
+    """
+
+    # rows written between two trims of the disk tier, as a fraction of its bound
+    TRIM_FRACTION = 0.1
+
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = 3600.0, disk_path: Optional[str] = None,
+                 max_disk_entries: int = 100000):
+        self.max_entries = int(max_entries)
+        self.ttl = ttl
+        self.version = ""
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self.disk_path = disk_path
+        self.max_disk_entries = int(max_disk_entries)
+        self.hits = self.disk_hits = self.misses = 0
+        self.evictions = self.expirations = self.disk_errors = 0
+        self._init_process()
+        if disk_path is not None:
+            self._create_schema()
+
+    def _create_schema(self) -> None:
+        # connections are opened per thread on first use; this one only creates the schema
+        try:
+            db = sqlite3.connect(self.disk_path, timeout=5.0)
+            try:
+                db.execute("PRAGMA journal_mode=WAL")
+                db.execute("CREATE TABLE IF NOT EXISTS results "
+                           "(key TEXT PRIMARY KEY, version TEXT, created REAL, value TEXT)")
+                db.execute("CREATE INDEX IF NOT EXISTS results_created ON results (created)")
+                db.commit()
+            finally:
+                db.close()
+        except sqlite3.Error:
+            logger.warning("query cache: cannot open %s, using the memory tier only", self.disk_path, exc_info=True)
+            self.disk_path = None
+
+    def _init_process(self) -> None:
+        # connections, the writer thread and the lock belong to one process
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._readers = threading.local()
+        self._connections = []
+        self._writes: "queue.Queue" = queue.Queue()
+        self._writer: Optional[threading.Thread] = None
+
+    def after_fork(self) -> None:
+        """
+        Reset the per-process state in a forked worker. The connections
+        inherited from the parent are abandoned, not closed: closing them
+        would act on the parent's SQLite state. The memory tier is kept.
+        """
+        if os.getpid() != self._pid:
+            _INHERITED_CONNECTIONS.extend(self._connections)
+            self._init_process()
+
+    @staticmethod
+    def make_key(tokens: Iterable[str], **params) -> str:
+        """
+        Key of a tokenized query and its ranking parameters.
+
+        Tokens are reduced to (token, count) pairs in first-seen order.
+        They are not sorted: the ranker sums and breaks ties in query-term
+        order, so reordered queries may rank differently.
+        """
+        counts: Dict[str, int] = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        return json.dumps([sorted(params.items()), list(counts.items())], separators=(",", ":"))
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    # ------------------------------------------------------------- disk tier
+
+    def _connect(self) -> sqlite3.Connection:
+        db = sqlite3.connect(self.disk_path, check_same_thread=False, timeout=5.0)
+        # WAL (set on the file at creation) lets reads run alongside a write
+        db.execute("PRAGMA synchronous=NORMAL")
+        with self._lock:
+            self._connections.append(db)
+        return db
+
+    def _reader(self) -> sqlite3.Connection:
+        self.after_fork()
+        db = getattr(self._readers, "db", None)
+        if db is None:
+            db = self._readers.db = self._connect()
+        return db
+
+    def _write(self, sql: str, params: tuple = ()) -> None:
+        """Queue a write for the background writer."""
+        self.after_fork()
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, args=(self._writes,),
+                                                    name="query-cache-writer", daemon=True)
+                    self._writer.start()
+        self._writes.put((sql, params))
+
+    def _disk_error(self, what: str) -> None:
+        logger.warning("query cache: SQLite %s failed, skipping the disk tier", what, exc_info=True)
+        with self._lock:
+            self.disk_errors += 1
+
+    def _write_loop(self, writes: "queue.Queue") -> None:
+        db = None
+        since_trim = 0
+        while True:
+            batch = [writes.get()]
+            # everything queued meanwhile goes into the same transaction
+            while True:
+                try:
+                    batch.append(writes.get_nowait())
+                except queue.Empty:
+                    break
+            ops = [op for op in batch if op is not None]
+            try:
+                if db is None:
+                    db = self._connect()
+                with db:
+                    for sql, params in ops:
+                        db.execute(sql, params)
+                    since_trim += len(ops)
+                    if since_trim >= max(1, int(self.max_disk_entries * self.TRIM_FRACTION)):
+                        since_trim = 0
+                        self._trim(db)
+            except sqlite3.Error:
+                # the batch is lost; the entries stay in the memory tier
+                self._disk_error("write")
+            for _ in batch:
+                writes.task_done()
+            if len(ops) < len(batch):
+                return
+
+    def _trim(self, db: sqlite3.Connection) -> None:
+        # keep the newest `max_disk_entries` rows
+        row = db.execute("SELECT created FROM results ORDER BY created DESC LIMIT 1 OFFSET ?",
+                         (self.max_disk_entries,)).fetchone()
+        if row is not None:
+            db.execute("DELETE FROM results WHERE created <= ?", (row[0],))
+
+    def flush(self) -> None:
+        """Wait until every queued disk write is committed."""
+        if self._writer is not None:
+            self._writes.join()
+
+    # ------------------------------------------------------------------ API
+
+    def set_version(self, version: str) -> None:
+        """Switch to index `version`, dropping every entry of other versions."""
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._entries.clear()
+        if self.disk_path is not None:
+            self._write("DELETE FROM results WHERE version != ?", (version,))
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._entries[key]
+                self.expirations += 1
+            version = self.version
+        row = None
+        if self.disk_path is not None:
+            try:
+                row = self._reader().execute("SELECT created, value FROM results WHERE key = ? AND version = ?",
+                                             (key, version)).fetchone()
+            except sqlite3.Error:
+                self._disk_error("read")
+            if row is not None:
+                if not self._expired(row[0], now):
+                    value = json.loads(row[1])
+                    with self._lock:
+                        self._insert(key, row[0], value)
+                        self.disk_hits += 1
+                    return value
+                self._write("DELETE FROM results WHERE key = ?", (key,))
+                with self._lock:
+                    self.expirations += 1
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self._insert(key, now, value)
+            version = self.version
+        if self.disk_path is not None:
+            self._write("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)",
+                        (key, version, now, json.dumps(value)))
+
+    def _insert(self, key: str, created: float, value: Any) -> None:
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self.disk_path is not None:
+            self._write("DELETE FROM results")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "disk_errors": self.disk_errors,
+            }
+
+    def close(self) -> None:
+        """Commit the queued writes and close the disk tier."""
+        if self._writer is not None:
+            self._writes.put(None)
+            self._writer.join()
+            self._writer = None
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for db in connections:
+            db.close()
+        self._readers = threading.local()
+        self.disk_path = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,28 +1,152 @@
-from typing import List
+import logging
+import os
+import resource
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 from .index_provider import IndexProvider
+from .segmented_index_provider import SegmentedIndexProvider
 from .pagerank_provider import PageRankProvider
 from .docID_to_title_provider import TitleProvider
 
+logger = logging.getLogger(__name__)
+
+
+class ProviderNotReady(RuntimeError):
+    """Raised when a provider is still loading (or failed to load)."""
+
+
+def _rss_mb() -> float:
+    # current resident set size; falls back to the peak where /proc is missing
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
 
 
 class DataProvider:
     """Compatibility wrapper that composes the three new providers.
     
     Loads data from GCS bucket.
+
+    The providers are loaded concurrently (`parallel=True`); each load is
+    mostly GCS download time. With `lazy=True` the constructor returns at
+    once and the loads continue in the background: every accessor waits
+    for the provider it needs, up to `wait_timeout` seconds (None waits
+    forever), then raises `ProviderNotReady`. `readiness()` reports the
+    state of each provider and `load_stats` its load time and the process
+    RSS growth while it loaded (loads overlap, so the deltas do too).
+
+    With `segmented=True` the index is a `SegmentedIndexProvider`: the base
+    index plus the delta segments listed in `{postings_subdir}/segments.json`.
+
+    `bucket_name` may also be an http:// URL or a memory:// name (see
+    `storage_backend`); `readahead_bytes` rounds remote posting reads up to
+    cached windows of that size.
+
+    `lexicon_dir`, `local_mirror_dir` and `cache_bytes` are passed to the
+    `IndexProvider` (the base index, when segmented).
     """
-    def __init__(self, bucket_name: str, postings_subdir: str = "postings_gcp", pr_subdir: str = "pr", titles_subdir: str = "id_to_title" ):
-        self.index_provider = IndexProvider(bucket_name=bucket_name, index_prefix=postings_subdir)
-        self.pagerank_provider = PageRankProvider(bucket_name=bucket_name, pr_subdir=pr_subdir)
-        self.title_provider = TitleProvider(bucket_name=bucket_name, titles_subdir=titles_subdir)
+    PROVIDERS = ("index", "pagerank", "titles")
+
+    def __init__(self, bucket_name: str, postings_subdir: str = "postings_gcp", pr_subdir: str = "pr", titles_subdir: str = "id_to_title",
+                 pr_store_dir: Optional[str] = None, titles_store_dir: Optional[str] = None,
+                 parallel: bool = True, lazy: bool = False, wait_timeout: Optional[float] = None,
+                 segmented: bool = False, max_deltas: int = 8, readahead_bytes: int = 0,
+                 lexicon_dir: Optional[str] = None, local_mirror_dir: Optional[str] = None,
+                 cache_bytes: int = 256 * 2 ** 20):
+        index_kwargs = dict(readahead_bytes=readahead_bytes, lexicon_dir=lexicon_dir,
+                            local_mirror_dir=local_mirror_dir, cache_bytes=cache_bytes)
+        if segmented:
+            index_factory = lambda: SegmentedIndexProvider(bucket_name, index_prefix=postings_subdir,
+                                                           max_deltas=max_deltas, **index_kwargs)
+        else:
+            index_factory = lambda: IndexProvider(bucket_name=bucket_name, index_prefix=postings_subdir,
+                                                  **index_kwargs)
+        factories = {
+            "index": index_factory,
+            "pagerank": lambda: PageRankProvider(bucket_name=bucket_name, pr_subdir=pr_subdir, store_dir=pr_store_dir),
+            "titles": lambda: TitleProvider(bucket_name=bucket_name, titles_subdir=titles_subdir, store_dir=titles_store_dir),
+        }
+        self.wait_timeout = wait_timeout
+        self.load_stats: Dict[str, Dict[str, float]] = {}
+        self._providers = {}
+        self._errors: Dict[str, BaseException] = {}
+        self._loaded = {name: threading.Event() for name in factories}
+
+        if parallel or lazy:
+            executor = ThreadPoolExecutor(max_workers=len(factories), thread_name_prefix="provider-load")
+            for name, factory in factories.items():
+                executor.submit(self._load, name, factory)
+            # lazy mode leaves the loads running in the background
+            executor.shutdown(wait=not lazy)
+        else:
+            for name, factory in factories.items():
+                self._load(name, factory)
+        if not lazy:
+            for name in factories:
+                if name in self._errors:
+                    raise self._errors[name]
+
+    def _load(self, name: str, factory) -> None:
+        t0, rss0 = time.perf_counter(), _rss_mb()
+        try:
+            self._providers[name] = factory()
+        except BaseException as e:
+            self._errors[name] = e
+            logger.exception("%s provider failed to load after %.2fs", name, time.perf_counter() - t0)
+        else:
+            rss = _rss_mb()
+            self.load_stats[name] = {"seconds": time.perf_counter() - t0, "rss_mb": rss, "rss_delta_mb": rss - rss0}
+            logger.info("%s provider loaded in %.2fs, rss %.0f MB (%+.0f MB)",
+                        name, self.load_stats[name]["seconds"], rss, rss - rss0)
+        finally:
+            self._loaded[name].set()
+
+    def _provider(self, name: str):
+        if not self._loaded[name].wait(self.wait_timeout):
+            raise ProviderNotReady(f"{name} provider is still loading")
+        if name in self._errors:
+            raise ProviderNotReady(f"{name} provider failed to load") from self._errors[name]
+        return self._providers[name]
+
+    @property
+    def index_provider(self) -> IndexProvider:
+        return self._provider("index")
 
+    @property
+    def pagerank_provider(self) -> PageRankProvider:
+        return self._provider("pagerank")
 
-    def get_posting_list(self, terms: List[str]):
+    @property
+    def title_provider(self) -> TitleProvider:
+        return self._provider("titles")
+
+    def readiness(self) -> Dict[str, str]:
+        """Map each provider to "loading", "ready" or "failed"."""
+        return {name: "failed" if name in self._errors else "ready" if self._loaded[name].is_set() else "loading"
+                for name in self.PROVIDERS}
+
+    def is_ready(self) -> bool:
+        return all(state == "ready" for state in self.readiness().values())
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Block until every provider finished loading; True if all succeeded."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for event in self._loaded.values():
+            if not event.wait(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                return False
+        return not self._errors
+
+    def get_posting_list(self, terms: List[str], as_arrays: bool = False):
         # expect a list of terms; protect against accidental string input
         if isinstance(terms, (str, bytes)):
             raise TypeError("terms must be a list of strings, not a single string")
         terms = list(terms)
-        return self.index_provider.get_posting_list(terms)
+        return self.index_provider.get_posting_list(terms, as_arrays=as_arrays)
 
     def get_pagerank(self, doc_ids: List[int]):
         # expect a list of document ids
@@ -31,6 +155,14 @@ class DataProvider:
         ids = list(doc_ids)
         return self.pagerank_provider.get_pagerank(ids)
 
+    def get_pagerank_array(self, doc_ids):
+        # vectorized lookup; doc_ids is an array or list of ints
+        return self.pagerank_provider.get_pagerank_array(doc_ids)
+
+    def get_log_pagerank_array(self, doc_ids):
+        # precomputed float32 log10 PageRank prior, aligned with doc_ids
+        return self.pagerank_provider.get_log_pagerank_array(doc_ids)
+
     def get_df(self, terms: List[str]):
         # expect a list of terms; protect against accidental string input
         if isinstance(terms, (str, bytes)):
@@ -38,6 +170,19 @@ class DataProvider:
         terms = list(terms)
         return self.index_provider.get_df(terms)
 
+    def get_term_bounds(self, terms: List[str]):
+        # expect a list of terms; protect against accidental string input
+        if isinstance(terms, (str, bytes)):
+            raise TypeError("terms must be a list of strings, not a single string")
+        return self.index_provider.get_term_bounds(list(terms))
+
+    def after_fork(self) -> None:
+        """Prepare a forked worker process; see `IndexProvider.after_fork`."""
+        self.index_provider.after_fork()
+
+    def index_version(self) -> str:
+        return self.index_provider.index_version
+
     def corpus_size(self) -> int:
         return self.index_provider.get_N()
 
@@ -1,28 +1,57 @@
 import pickle
-from typing import List, Tuple, Dict
-from google.cloud import storage
+from pathlib import Path
+from typing import List, Tuple, Dict, Optional
+
+from storage_backend import get_backend
+from .title_store import TITLE_STORE_FILES, TitleStore
 
 
 class TitleProvider:
     """
-    Provides fast access to document titles by document ID from GCS.
+    Provides fast access to document titles by document ID from GCS, or
+    from a local directory with the bucket layout when `bucket_name` is None.
+
+    With `store_dir`, titles are served from a memory-mapped `TitleStore`
+    in that directory. Missing store files are downloaded from the
+    `titles_subdir` of the bucket, or converted once from
+    `doc_id_to_title.pkl` when the bucket has no store.
     """
 
-    def __init__(self, bucket_name: str, titles_subdir: str = "id_to_title"):
-        self.bucket = storage.Client().bucket(bucket_name)
+    def __init__(self, bucket_name: Optional[str], titles_subdir: str = "id_to_title", store_dir: Optional[str] = None):
+        # local files when bucket_name is None, see `storage_backend`
+        self.backend = get_backend(bucket_name)
         self.titles_path = f"{titles_subdir}/doc_id_to_title.pkl"
+        self.store: Optional[TitleStore] = None
+        self._titles: Dict[int, str] = {}
+
+        if store_dir is not None:
+            if not TitleStore.exists(store_dir):
+                self._build_store(titles_subdir, store_dir)
+            self.store = TitleStore(store_dir)
+            return
+
+        # Normalize keys to int for consistent lookups
+        self._titles = {
+            int(doc_id): title for doc_id, title in self._load_pickle().items()
+        }
 
-        blob = self.bucket.blob(self.titles_path)
-        with blob.open("rb") as f:
+    def _load_pickle(self) -> dict:
+        with self.backend.open(self.titles_path, "rb") as f:
             data = pickle.load(f)
 
         if not isinstance(data, dict):
             raise ValueError("doc_id_to_title.pkl is not a dict")
+        return data
 
-        # Normalize keys to int for consistent lookups
-        self._titles: Dict[int, str] = {
-            int(doc_id): title for doc_id, title in data.items()
-        }
+    def _build_store(self, titles_subdir: str, store_dir: str) -> None:
+        Path(store_dir).mkdir(parents=True, exist_ok=True)
+        paths = [f"{titles_subdir}/{name}" for name in TITLE_STORE_FILES]
+        if all(self.backend.exists(p) for p in paths):
+            for p in paths:
+                self.backend.download(p, str(Path(store_dir) / Path(p).name))
+        else:
+            # the pickle is only needed once; let it go right after converting
+            TitleStore.convert(self._load_pickle(), store_dir)
 
     def get_titles_from_docIDs(self, doc_ids: List[int]) -> List[Tuple[int, str]]:
         """
@@ -30,12 +59,13 @@ class TitleProvider:
         """
         results: List[Tuple[int, str]] = []
 
+        if self.store is not None:
+            ids = [int(d) for d in doc_ids]
+            return list(zip(ids, self.store.get_titles(ids)))
+
         for doc_id in doc_ids:
             did = int(doc_id)
             title = self._titles.get(did, "")
             results.append((did, title))
 
         return results
-
-
-
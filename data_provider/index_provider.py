@@ -1,6 +1,22 @@
-from typing import List, Dict
+import os
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional
 
-from inverted_index_gcp import InvertedIndex
+from inverted_index_gcp import InvertedIndex, arrays_to_posting_list, decode_posting_arrays, get_storage
+from storage_backend import GCSBackend
+from telemetry.metrics import METRICS
+from .lexicon import LEXICON_META_FILE, Lexicon
+from .local_mirror import LocalMirror
+from .posting_cache import PostingListCache
+from .posting_fetcher import ConcurrentPostingFetcher
+from .reader_pool import PostingReaderPool
+from .singleflight import SingleFlight
+
+
+def _file_version(path) -> str:
+    st = os.stat(path)
+    return f"{st.st_mtime_ns:x}-{st.st_size:x}"
 
 
 class IndexProvider:
@@ -9,30 +25,170 @@ class IndexProvider:
 
     Index metadata (index.pkl + posting locations) is loaded once during
     initialization and kept in memory. Posting lists themselves are read
-    from disk on demand.
+    from disk on demand through a pool of open posting files and a single
+    storage client shared by all queries. All terms of a query are fetched
+    concurrently.
+
+    With `local_mirror_dir`, the index metadata and posting files are
+    mirrored to local disk (posting files in the background unless
+    `mirror_background=False`) and read through mmap; posting files that
+    are not mirrored yet are still read from GCS.
+
+    Decoded posting lists are kept in an LRU cache bounded by `cache_bytes`
+    (0 disables it), so popular terms skip both the read and the decode.
+    Concurrent requests for a term that is being read already wait for
+    that read instead of issuing their own (`SingleFlight`).
+
+    With `lexicon_dir`, the metadata is served from a memory-mapped
+    `Lexicon` instead of the unpickled index; it is built from index.pkl
+    on the first start if the directory holds no lexicon yet.
+
+    `bucket_name` may name any storage backend (see `storage_backend`);
+    remote posting reads are single ranged requests, rounded up to
+    `readahead_bytes` windows when it is set.
     """
 
-    def __init__(self, bucket_name: str, index_prefix: str = "postings_gcp"):
+    def __init__(self, bucket_name: str, index_prefix: str = "postings_gcp", max_open_files: int = 64, idle_timeout: float = 300.0,
+                 fetch_workers: int = 8, merge_gap: int = 0,
+                 local_mirror_dir: Optional[str] = None, mirror_background: bool = True,
+                 cache_bytes: int = 256 * 2 ** 20, lexicon_dir: Optional[str] = None, readahead_bytes: int = 0):
         self.bucket_name = bucket_name
         self.index_prefix = index_prefix
+
+        self.mirror: Optional[LocalMirror] = None
+        if local_mirror_dir is not None and isinstance(get_storage(bucket_name), GCSBackend):
+            self.mirror = LocalMirror(bucket_name, index_prefix, local_mirror_dir)
+            # metadata is needed right away, posting files can follow
+            self.mirror.sync(suffixes=(".pkl", ".pickle"))
         
-        # Load the index from GCS
-        self.index = InvertedIndex.read_index(self.index_prefix, "index", self.bucket_name)
+        # identifies the loaded index build; result caches are keyed on it
+        self.index_version: str = ""
+        if lexicon_dir is not None and Lexicon.exists(lexicon_dir):
+            self.index = Lexicon(lexicon_dir)
+            self.index_version = "lexicon:" + _file_version(Path(lexicon_dir) / LEXICON_META_FILE)
+        else:
+            index_path = f"{self.index_prefix}/index.pkl"
+            if self.mirror is not None and self.mirror.is_mirrored(index_path):
+                self.index = InvertedIndex.read_index(str(self.mirror.local_path(self.index_prefix)), "index")
+                self.index_version = "file:" + _file_version(self.mirror.local_path(index_path))
+            elif self.bucket_name is None:
+                self.index = InvertedIndex.read_index(self.index_prefix, "index")
+                self.index_version = "file:" + _file_version(Path(self.index_prefix) / "index.pkl")
+            else:
+                # Load the index from the bucket
+                self.index = InvertedIndex.read_index(self.index_prefix, "index", self.bucket_name)
+                self.index_version = get_storage(self.bucket_name).version(index_path)
+            if lexicon_dir is not None:
+                # one-time conversion, later starts map the lexicon directly
+                Lexicon.build(self.index, lexicon_dir)
+                self.index = Lexicon(lexicon_dir)
+                self.index_version = "lexicon:" + _file_version(Path(lexicon_dir) / LEXICON_META_FILE)
+
+        if self.mirror is not None:
+            if mirror_background:
+                self.mirror.sync_in_background(suffixes=(".bin",))
+            else:
+                self.mirror.sync(suffixes=(".bin",))
+
+        self._reader_args = dict(max_open_files=max_open_files, idle_timeout=idle_timeout,
+                                 fetch_workers=fetch_workers, merge_gap=merge_gap, readahead_bytes=readahead_bytes)
+        self._open_readers()
+        self.cache = PostingListCache(cache_bytes) if cache_bytes > 0 else None
 
         # corpus size (as provided by the course)
         self.N: int = 6_348_910
 
-    def get_posting_list(self, terms: List[str]) -> Dict[str, List]:
-        """Return posting lists for multiple terms as a dict term -> posting_list."""
+    def _open_readers(self) -> None:
+        args = self._reader_args
+        # posting file handles are reused across queries
+        self.reader_pool = PostingReaderPool(self.index_prefix, self.bucket_name,
+                                             max_open_files=args["max_open_files"], idle_timeout=args["idle_timeout"],
+                                             mirror=self.mirror, readahead_bytes=args["readahead_bytes"])
+        self.fetcher = ConcurrentPostingFetcher(self.reader_pool, max_workers=args["fetch_workers"],
+                                                merge_gap=args["merge_gap"])
+        self._local = threading.local()
+        # concurrent requests for the same term share one read
+        self.singleflight = SingleFlight()
+
+    def after_fork(self) -> None:
+        """
+        Re-create the per-process parts in a forked worker: fetch threads,
+        open storage handles and locks do not survive `fork`. The loaded
+        index, mirror maps and posting cache are kept and shared
+        copy-on-write with the parent.
+        """
+        self._open_readers()
+
+    def _load_postings(self, terms: List[str]) -> Dict[str, tuple]:
+        requests = {t: (self.index.posting_locs[t], self.index.posting_n_bytes(t)) for t in terms}
+        with METRICS.stage("posting_io"):
+            raw, self._local.fetch_stats = self.fetcher.fetch(requests)
+        METRICS.bytes_read.inc(self._local.fetch_stats["bytes"])
+        METRICS.posting_reads.inc(self._local.fetch_stats["reads"])
+        out = {}
+        with METRICS.stage("posting_decode"):
+            for t, b in raw.items():
+                out[t] = self.index.decode_posting_bytes(t, b)
+                if self.cache is not None:
+                    self.cache.put(t, out[t])
+        return out
+
+    def get_posting_list(self, terms: List[str], as_arrays: bool = False) -> Dict[str, List]:
+        """Return posting lists for multiple terms as a dict term -> posting_list.
+
+        With `as_arrays=True` each posting list is a (doc_ids, tfs) pair of
+        NumPy arrays (uint32, uint16) decoded straight from the packed bytes,
+        otherwise a list of (doc_id, tf) tuples.
+        """
         out: Dict[str, List] = {}
         if self.index is None:
             # Should not happen if initialized correctly, but as a safeguard
             return {t: [] for t in terms}
 
+        arrays_by_term = {}
+        if self.cache is not None:
+            for t in terms:
+                cached = self.cache.get(t)
+                if cached is not None:
+                    arrays_by_term[t] = cached
+
+        missing = [t for t in terms if t in self.index.posting_locs and t not in arrays_by_term]
+        self._local.fetch_stats = None
+        if missing:
+            arrays_by_term.update(self.singleflight.do_many(missing, self._load_postings))
+        if self._local.fetch_stats is None:
+            # nothing was read by this thread: all cached or read by another request
+            _, self._local.fetch_stats = self.fetcher.fetch({})
+
         for t in terms:
-            out[t] = self.index.read_a_posting_list(self.index_prefix, t, self.bucket_name)
+            arrays = arrays_by_term.get(t)
+            if arrays is None:
+                arrays = decode_posting_arrays(b'', 0)
+            out[t] = arrays if as_arrays else arrays_to_posting_list(*arrays)
         return out
 
+    def get_term_bounds(self, terms: List[str]) -> Dict[str, tuple]:
+        """Return term -> (block_last_doc_ids, block_max_tfs) for terms whose
+        pruning bounds were stored with the index."""
+        out = {}
+        for t in terms:
+            bounds = self.index.term_bounds(t)
+            if bounds is not None:
+                out[t] = bounds
+        return out
+
+    @property
+    def last_fetch_stats(self) -> Dict:
+        """Timing stats of the last `get_posting_list` call made by this thread."""
+        return getattr(self._local, "fetch_stats", {})
+
+    def close(self) -> None:
+        """Stop the fetch threads and close all pooled posting files."""
+        self.fetcher.close()
+        self.reader_pool.close()
+        if self.mirror is not None:
+            self.mirror.close()
+
     def get_N(self) -> int:
         return self.N
 
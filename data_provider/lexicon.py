@@ -0,0 +1,210 @@
+import argparse
+import json
+import mmap
+import os
+import pickle
+from bisect import bisect_left
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from inverted_index_gcp import (POSTING_FORMAT_RAW, TUPLE_SIZE, decode_block_postings,
+                                decode_posting_arrays)
+
+LEXICON_VERSION = 1
+LEXICON_META_FILE = "lexicon.json"
+LEXICON_TERMS_FILE = "terms.bin"
+# name -> dtype of every memory-mapped column
+LEXICON_ARRAYS = {
+    "term_offsets": np.uint64,   # n + 1 offsets into terms.bin
+    "df": np.uint32,
+    "term_total": np.uint64,
+    "n_bytes": np.uint64,        # byte length of the posting list
+    "loc_ptr": np.uint64,        # n + 1 offsets into loc_file / loc_offset
+    "loc_file": np.uint32,       # index into the file name table
+    "loc_offset": np.uint32,
+    "bound_ptr": np.uint64,      # n + 1 offsets into bound_last / bound_max_tf
+    "bound_last": np.uint32,
+    "bound_max_tf": np.uint32,
+}
+
+
+class _SortedTerms:
+    """Sequence view of the UTF-8 term table, for binary search."""
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return self._blob[self._offsets[i]:self._offsets[i + 1]]
+
+
+class _Column:
+    """Read-only, dict-like view of one per-term lexicon value."""
+
+    def __init__(self, lexicon, getter):
+        self._lexicon = lexicon
+        self._getter = getter
+
+    def __contains__(self, term):
+        return self._lexicon.term_id(term) is not None
+
+    def __getitem__(self, term):
+        tid = self._lexicon.term_id(term)
+        if tid is None:
+            raise KeyError(term)
+        return self._getter(tid)
+
+    def get(self, term, default=None):
+        tid = self._lexicon.term_id(term)
+        return default if tid is None else self._getter(tid)
+
+    def __len__(self):
+        return len(self._lexicon)
+
+    def __iter__(self):
+        terms = self._lexicon._terms
+        return (terms[i].decode("utf-8") for i in range(len(terms)))
+
+
+class Lexicon:
+    """
+    Memory-mapped replacement for the pickled `InvertedIndex` metadata.
+
+    Terms are kept sorted (by UTF-8 bytes) in one blob and found by binary
+    search; df, term totals, posting byte lengths, posting locations (CSR
+    arrays of file id + offset, file names stored once in a string table)
+    and pruning bounds are NumPy columns aligned with the term table.
+    Opening a lexicon only maps the files, so cold start does not depend on
+    the vocabulary size.
+
+    `df`, `term_total` and `posting_locs` behave like the `InvertedIndex`
+    attributes of the same name, and `posting_n_bytes`,
+    `decode_posting_bytes` and `term_bounds` match its methods, so
+    `IndexProvider` can use either one.
+    """
+
+    def __init__(self, lexicon_dir: str, lookup_cache_size: int = 65536):
+        lexicon_dir = Path(lexicon_dir)
+        with open(lexicon_dir / LEXICON_META_FILE, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != LEXICON_VERSION:
+            raise ValueError(f"unsupported lexicon version {meta.get('version')}")
+        self.files = meta["files"]
+        self.posting_format = meta["posting_format"]
+        for name in LEXICON_ARRAYS:
+            # plain ndarray views of the maps; np.memmap adds per-access overhead
+            setattr(self, "_" + name, np.load(lexicon_dir / f"{name}.npy", mmap_mode="r").view(np.ndarray))
+        with open(lexicon_dir / LEXICON_TERMS_FILE, "rb") as f:
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        # offsets as Python ints: binary search indexes them on every probe
+        self._terms = _SortedTerms(blob, memoryview(self._term_offsets).cast("B").cast("Q"))
+        self.term_id = lru_cache(maxsize=lookup_cache_size)(self._find)
+
+        self.df = _Column(self, lambda i: int(self._df[i]))
+        self.term_total = _Column(self, lambda i: int(self._term_total[i]))
+        self.posting_locs = _Column(self, self._locs)
+
+    @staticmethod
+    def exists(lexicon_dir: str) -> bool:
+        return (Path(lexicon_dir) / LEXICON_META_FILE).exists()
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    def _find(self, term: str) -> Optional[int]:
+        key = term.encode("utf-8")
+        i = bisect_left(self._terms, key)
+        if i < len(self._terms) and self._terms[i] == key:
+            return i
+        return None
+
+    def _locs(self, tid: int):
+        lo, hi = int(self._loc_ptr[tid]), int(self._loc_ptr[tid + 1])
+        return [(self.files[int(f)], int(o)) for f, o in zip(self._loc_file[lo:hi], self._loc_offset[lo:hi])]
+
+    def posting_n_bytes(self, w) -> int:
+        tid = self.term_id(w)
+        return 0 if tid is None else int(self._n_bytes[tid])
+
+    def decode_posting_bytes(self, w, b):
+        if self.posting_format == POSTING_FORMAT_RAW:
+            return decode_posting_arrays(b, self.df.get(w, 0))
+        return decode_block_postings(b)
+
+    def term_bounds(self, w):
+        tid = self.term_id(w)
+        if tid is None:
+            return None
+        lo, hi = int(self._bound_ptr[tid]), int(self._bound_ptr[tid + 1])
+        if lo == hi:
+            return None
+        return self._bound_last[lo:hi], self._bound_max_tf[lo:hi]
+
+    @staticmethod
+    def build(index, lexicon_dir: str) -> None:
+        """Write the lexicon of an `InvertedIndex` into `lexicon_dir`."""
+        lexicon_dir = Path(lexicon_dir)
+        lexicon_dir.mkdir(parents=True, exist_ok=True)
+        posting_format = getattr(index, "posting_format", POSTING_FORMAT_RAW)
+        bounds = getattr(index, "posting_bounds", {})
+        terms = sorted(index.posting_locs, key=lambda w: w.encode("utf-8"))
+
+        files, file_ids = [], {}
+        cols = {name: [] for name in ("df", "term_total", "n_bytes", "loc_file", "loc_offset",
+                                      "bound_last", "bound_max_tf")}
+        term_offsets, loc_ptr, bound_ptr = [0], [0], [0]
+        with open(lexicon_dir / (LEXICON_TERMS_FILE + ".part"), "wb") as f:
+            for w in terms:
+                b = w.encode("utf-8")
+                f.write(b)
+                term_offsets.append(term_offsets[-1] + len(b))
+                df = int(index.df.get(w, 0))
+                cols["df"].append(df)
+                cols["term_total"].append(int(index.term_total.get(w, 0)))
+                cols["n_bytes"].append(df * TUPLE_SIZE if posting_format == POSTING_FORMAT_RAW
+                                       else int(index.posting_n_bytes(w)))
+                for f_name, offset in index.posting_locs[w]:
+                    if f_name not in file_ids:
+                        file_ids[f_name] = len(files)
+                        files.append(f_name)
+                    cols["loc_file"].append(file_ids[f_name])
+                    cols["loc_offset"].append(offset)
+                loc_ptr.append(len(cols["loc_file"]))
+                if w in bounds:
+                    cols["bound_last"].extend(np.asarray(bounds[w][0]).tolist())
+                    cols["bound_max_tf"].extend(np.asarray(bounds[w][1]).tolist())
+                bound_ptr.append(len(cols["bound_last"]))
+
+        arrays = dict(cols, term_offsets=term_offsets, loc_ptr=loc_ptr, bound_ptr=bound_ptr)
+        for name, dtype in LEXICON_ARRAYS.items():
+            tmp = lexicon_dir / f"{name}.npy.part"
+            with open(tmp, "wb") as f:
+                np.save(f, np.asarray(arrays[name], dtype=dtype))
+            os.replace(tmp, lexicon_dir / f"{name}.npy")
+        os.replace(lexicon_dir / (LEXICON_TERMS_FILE + ".part"), lexicon_dir / LEXICON_TERMS_FILE)
+        # the meta file goes last: its presence marks a complete lexicon
+        with open(lexicon_dir / LEXICON_META_FILE, "w", encoding="utf-8") as f:
+            json.dump({"version": LEXICON_VERSION, "posting_format": posting_format,
+                       "n_terms": len(terms), "files": files}, f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a pickled InvertedIndex into a memory-mapped lexicon.")
+    parser.add_argument("index_path", help="local path of index.pkl")
+    parser.add_argument("lexicon_dir", help="output directory for the lexicon")
+    args = parser.parse_args()
+    with open(args.index_path, "rb") as f:
+        index = pickle.load(f)
+    Lexicon.build(index, args.lexicon_dir)
+    print(f"wrote {len(index.posting_locs)} terms to {args.lexicon_dir}")
+
+
+if __name__ == "__main__":
+    main()
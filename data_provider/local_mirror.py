@@ -0,0 +1,135 @@
+import base64
+import hashlib
+import mmap
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from inverted_index_gcp import get_bucket
+
+try:
+    import google_crc32c
+except ImportError:  # pragma: no cover - optional, md5 is used when available
+    google_crc32c = None
+
+
+class LocalMirror:
+    """
+    Local-disk mirror of the files under a bucket prefix (e.g. `postings_gcp/`).
+
+    `sync` downloads every file whose local copy is missing or has the wrong
+    size, verifies its md5/crc32c checksum against the blob metadata and only
+    then moves it into place, so a file is either fully mirrored or absent.
+    Mirrored files are memory-mapped and `view` hands out zero-copy
+    `memoryview` slices; it returns None for files that are not mirrored
+    yet, letting callers fall back to GCS.
+    """
+
+    def __init__(self, bucket_name: str, prefix: str, local_dir: str, suffixes=(".bin", ".pkl", ".pickle"),
+                 verify_existing: bool = False):
+        self._bucket = get_bucket(bucket_name)
+        self.prefix = prefix.rstrip("/")
+        self.local_dir = Path(local_dir)
+        self.suffixes = tuple(suffixes)
+        self.verify_existing = verify_existing
+
+        self._ready = set()
+        self._maps: Dict[str, mmap.mmap] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"downloaded": 0, "verified": 0, "failed": 0, "bytes": 0, "seconds": 0.0}
+
+    def local_path(self, remote_path: str) -> Path:
+        return self.local_dir / remote_path
+
+    def is_mirrored(self, remote_path: str) -> bool:
+        return remote_path in self._ready
+
+    @staticmethod
+    def _checksum_ok(path: Path, blob) -> bool:
+        if blob.md5_hash:
+            h = hashlib.md5()
+            expected = base64.b64decode(blob.md5_hash)
+        elif blob.crc32c and google_crc32c is not None:
+            h = google_crc32c.Checksum()
+            expected = base64.b64decode(blob.crc32c)
+        else:
+            # nothing to compare against, the size check has to do
+            return True
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                h.update(chunk)
+        return h.digest() == expected
+
+    def _sync_blob(self, blob) -> None:
+        dst = self.local_path(blob.name)
+        if dst.exists() and dst.stat().st_size == blob.size:
+            if not self.verify_existing or self._checksum_ok(dst, blob):
+                self._ready.add(blob.name)
+                self.stats["verified"] += 1
+                return
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(dst.name + ".part")
+        blob.download_to_filename(str(tmp))
+        if tmp.stat().st_size != blob.size or not self._checksum_ok(tmp, blob):
+            tmp.unlink()
+            self.stats["failed"] += 1
+            return
+        os.replace(tmp, dst)
+        self._ready.add(blob.name)
+        self.stats["downloaded"] += 1
+        self.stats["bytes"] += blob.size
+
+    def sync(self, suffixes=None) -> Dict:
+        """Mirror all files under the prefix that end with one of `suffixes`."""
+        suffixes = tuple(suffixes or self.suffixes)
+        t0 = time.perf_counter()
+        blobs = self._bucket.client.list_blobs(self._bucket, prefix=f"{self.prefix}/")
+        for blob in blobs:
+            if blob.name.endswith(suffixes):
+                self._sync_blob(blob)
+        self.stats["seconds"] += time.perf_counter() - t0
+        return self.stats
+
+    def sync_in_background(self, suffixes=None) -> threading.Thread:
+        """Run `sync` on a daemon thread; reads fall back to GCS meanwhile."""
+        self._thread = threading.Thread(target=self.sync, args=(suffixes,), name="local-mirror", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def wait(self, timeout: float = None) -> bool:
+        """Block until a background sync is done. Returns True when finished."""
+        if self._thread is not None:
+            self._thread.join(timeout)
+            return not self._thread.is_alive()
+        return True
+
+    def _map(self, remote_path: str) -> mmap.mmap:
+        m = self._maps.get(remote_path)
+        if m is None:
+            with self._lock:
+                m = self._maps.get(remote_path)
+                if m is None:
+                    with open(self.local_path(remote_path), "rb") as f:
+                        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                    self._maps[remote_path] = m
+        return m
+
+    def view(self, remote_path: str, offset: int, length: int) -> Optional[memoryview]:
+        """Zero-copy slice of a mirrored file, or None if it is not mirrored."""
+        if remote_path not in self._ready:
+            return None
+        return memoryview(self._map(remote_path))[offset:offset + length]
+
+    def close(self) -> None:
+        with self._lock:
+            for m in self._maps.values():
+                try:
+                    m.close()
+                except BufferError:
+                    # decoded arrays still reference the mapping; the OS
+                    # releases it once they are gone
+                    pass
+            self._maps.clear()
@@ -1,32 +1,71 @@
 import pickle
-from typing import Dict, List
-from google.cloud import storage
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from storage_backend import get_backend
+from .pagerank_store import LOG_PR_EPSILON, PR_IDS_FILE, PR_SCORES_FILE, PageRankStore, log_pagerank, lookup_sorted
 
 
 class PageRankProvider:
     """
-    Provides access to PageRank scores for documents from GCS.
+    Provides access to PageRank scores for documents from GCS, or from a
+    local directory with the bucket layout when `bucket_name` is None.
+
+    With `store_dir`, scores are served from a memory-mapped
+    `PageRankStore` in that directory. Missing store files are downloaded
+    from the `pr_subdir` of the bucket, or converted once from
+    `pagerank.pkl` when the bucket has no store.
+
+    The ranking prior, log10 PageRank, is precomputed at load time as a
+    float32 array aligned with the sorted doc ids (`get_log_pagerank_array`).
+    With a store, the ids stay the uint32 memmap and are searched in that
+    dtype (`find_sorted`), so a per-query lookup only touches their pages.
     """
 
-    def __init__(self, bucket_name: str, pr_subdir: str = "pr"):
-        self.bucket = storage.Client().bucket(bucket_name)
+    def __init__(self, bucket_name: Optional[str], pr_subdir: str = "pr", store_dir: Optional[str] = None):
+        # local files when bucket_name is None, see `storage_backend`
+        self.backend = get_backend(bucket_name)
         self.pr_path = f"{pr_subdir}/pagerank.pkl"
-        
+        self.store: Optional[PageRankStore] = None
+        self._pagerank: Dict[int, float] = {}
+
+        if store_dir is not None:
+            if not PageRankStore.exists(store_dir):
+                self._build_store(pr_subdir, store_dir)
+            self.store = PageRankStore(store_dir)
+            self._ids, self._log_pr = self.store.doc_ids, self.store.log_scores
+            return
+
+        # normalize keys to int and values to float
+        self._pagerank = {
+            int(doc_id): float(score)
+            for doc_id, score in self._load_pickle().items()
+        }
+        self._ids = np.fromiter(self._pagerank, dtype=np.int64, count=len(self._pagerank))
+        self._ids.sort()
+        self._log_pr = log_pagerank([self._pagerank[d] for d in self._ids.tolist()])
+
+    def _load_pickle(self) -> dict:
         # Load from GCS
         # Note: blob.open requires google-cloud-storage >= 1.38.0
         # If older, we might need download_as_bytes -> io.BytesIO
-        blob = self.bucket.blob(self.pr_path)
-        with blob.open("rb") as f:
+        with self.backend.open(self.pr_path, "rb") as f:
             data = pickle.load(f)
 
         if not isinstance(data, dict):
             raise ValueError("pagerank.pkl is not a dict")
+        return data
 
-        # normalize keys to int and values to float
-        self._pagerank: Dict[int, float] = {
-            int(doc_id): float(score)
-            for doc_id, score in data.items()
-        }
+    def _build_store(self, pr_subdir: str, store_dir: str) -> None:
+        Path(store_dir).mkdir(parents=True, exist_ok=True)
+        paths = [f"{pr_subdir}/{name}" for name in (PR_IDS_FILE, PR_SCORES_FILE)]
+        if all(self.backend.exists(p) for p in paths):
+            for p in paths:
+                self.backend.download(p, str(Path(store_dir) / Path(p).name))
+        else:
+            PageRankStore.convert(self._load_pickle(), store_dir)
 
     def get_pagerank(self, doc_ids: List[int]) -> Dict[int, float]:
         """
@@ -36,8 +75,22 @@ class PageRankProvider:
         """
         out: Dict[int, float] = {}
 
+        if self.store is not None:
+            ids = [int(d) for d in doc_ids]
+            return dict(zip(ids, self.store.get_pagerank(ids).tolist()))
+
         for doc_id in doc_ids:
             did = int(doc_id)
             out[did] = self._pagerank.get(did, 0.0)
 
         return out
+
+    def get_pagerank_array(self, doc_ids) -> np.ndarray:
+        """Vectorized variant of `get_pagerank`: float64 scores aligned with `doc_ids`."""
+        if self.store is not None:
+            return self.store.get_pagerank(doc_ids)
+        return np.fromiter((self._pagerank.get(int(d), 0.0) for d in doc_ids), dtype=np.float64)
+
+    def get_log_pagerank_array(self, doc_ids) -> np.ndarray:
+        """Precomputed log10 PageRank (float32) aligned with `doc_ids`; log10(LOG_PR_EPSILON) when missing."""
+        return lookup_sorted(self._ids, self._log_pr, doc_ids, default=np.log10(LOG_PR_EPSILON))
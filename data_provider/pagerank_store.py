@@ -0,0 +1,117 @@
+import argparse
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+PR_IDS_FILE = "pagerank_ids.npy"
+PR_SCORES_FILE = "pagerank_scores.npy"
+# PageRank below this is raised to it before taking the log (log10 = -8)
+LOG_PR_EPSILON = 1e-8
+
+
+def log_pagerank(scores) -> np.ndarray:
+    """Ranking prior: log10 PageRank as float32, floored at LOG_PR_EPSILON."""
+    return np.log10(np.maximum(np.asarray(scores, dtype=np.float64), LOG_PR_EPSILON)).astype(np.float32)
+
+
+def find_sorted(sorted_ids: np.ndarray, doc_ids) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Positions of `doc_ids` in the ascending `sorted_ids` and a mask of the
+    ids found there (positions of unknown ids are valid but meaningless).
+
+    The search runs in the dtype of `sorted_ids`: with mismatched dtypes
+    numpy converts the whole sorted array on every call, which for a
+    memory-mapped store reads every page of the file. Ids outside that
+    dtype's range cannot be present and are dropped first.
+    """
+    q = np.asarray(doc_ids, dtype=np.int64)
+    idx = np.zeros(len(q), dtype=np.intp)
+    found = np.zeros(len(q), dtype=bool)
+    if len(sorted_ids) == 0 or len(q) == 0:
+        return idx, found
+    info = np.iinfo(sorted_ids.dtype)
+    valid = (q >= info.min) & (q <= info.max)
+    qv = q[valid].astype(sorted_ids.dtype)
+    pos = np.searchsorted(sorted_ids, qv)
+    pos_c = np.minimum(pos, len(sorted_ids) - 1)
+    idx[valid] = pos_c
+    found[valid] = (pos < len(sorted_ids)) & (sorted_ids[pos_c] == qv)
+    return idx, found
+
+
+def lookup_sorted(sorted_ids: np.ndarray, values: np.ndarray, doc_ids, default: float = 0.0) -> np.ndarray:
+    """`values` of `doc_ids` given ids sorted ascending and aligned values; `default` for unknown ids."""
+    idx, found = find_sorted(sorted_ids, doc_ids)
+    out = np.full(len(idx), default, dtype=values.dtype if values.dtype.kind == "f" else np.float64)
+    out[found] = values[idx[found]]
+    return out
+
+
+class PageRankStore:
+    """
+    Compact, memory-mapped PageRank scores.
+
+    Two `.npy` files: doc ids sorted ascending (uint32) and their scores
+    (float32). Both are opened with `mmap_mode='r'`, so start-up is
+    instant and every worker process maps the same read-only pages
+    instead of holding its own dict.
+
+    The log-scaled ranking prior (`log_pagerank`) is computed once when the
+    store is opened and kept as a float32 array aligned with the doc ids.
+    """
+
+    def __init__(self, store_dir: str):
+        store_dir = Path(store_dir)
+        self.doc_ids = np.load(store_dir / PR_IDS_FILE, mmap_mode="r")
+        self.scores = np.load(store_dir / PR_SCORES_FILE, mmap_mode="r")
+        if len(self.doc_ids) != len(self.scores):
+            raise ValueError("PageRank id and score arrays differ in length")
+        self.log_scores = log_pagerank(self.scores)
+
+    @staticmethod
+    def exists(store_dir: str) -> bool:
+        return all((Path(store_dir) / f).exists() for f in (PR_IDS_FILE, PR_SCORES_FILE))
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def get_pagerank(self, doc_ids: Iterable[int]) -> np.ndarray:
+        """Vectorized lookup; returns float64 scores, 0.0 for unknown ids."""
+        return lookup_sorted(self.doc_ids, self.scores, doc_ids).astype(np.float64, copy=False)
+
+    def get_log_pagerank(self, doc_ids: Iterable[int]) -> np.ndarray:
+        """Vectorized lookup of the float32 log prior; unknown ids get the floor, log10(LOG_PR_EPSILON)."""
+        return lookup_sorted(self.doc_ids, self.log_scores, doc_ids, default=np.log10(LOG_PR_EPSILON))
+
+    @staticmethod
+    def convert(data: Dict, store_dir: str) -> None:
+        """Write a doc_id -> score dict (as in pagerank.pkl) as a store."""
+        store_dir = Path(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        ids = np.fromiter((int(d) for d in data.keys()), dtype=np.int64, count=len(data))
+        scores = np.fromiter((float(s) for s in data.values()), dtype=np.float64, count=len(data))
+        order = np.argsort(ids, kind="stable")
+        for name, arr in ((PR_IDS_FILE, ids[order].astype(np.uint32)),
+                          (PR_SCORES_FILE, scores[order].astype(np.float32))):
+            tmp = store_dir / (name + ".part")
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, store_dir / name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert pagerank.pkl into a memory-mapped PageRank store.")
+    parser.add_argument("pickle_path", help="local path of pagerank.pkl")
+    parser.add_argument("store_dir", help="output directory for the .npy files")
+    args = parser.parse_args()
+    with open(args.pickle_path, "rb") as f:
+        data = pickle.load(f)
+    PageRankStore.convert(data, args.store_dir)
+    print(f"wrote {len(data)} PageRank scores to {args.store_dir}")
+
+
+if __name__ == "__main__":
+    main()
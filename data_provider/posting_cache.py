@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+
+class PostingListCache:
+    """
+    Thread-safe LRU cache of decoded posting lists, bounded by bytes.
+
+    Values are tuples of NumPy arrays (doc_ids, tfs) and are charged by
+    their `nbytes`. Cached arrays are made read-only since they are shared
+    between requests. Pinned keys are never evicted and may be pinned before
+    they are first inserted. Values larger than the whole budget are not
+    cached unless pinned.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 2 ** 20):
+        if max_bytes < 0:
+            raise ValueError("max_bytes must be non-negative")
+        self.max_bytes = int(max_bytes)
+        self._entries: "OrderedDict[Hashable, Tuple[tuple, int]]" = OrderedDict()
+        self._pinned = set()
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _size(value: tuple) -> int:
+        return sum(a.nbytes for a in value)
+
+    def get(self, key: Hashable) -> Optional[tuple]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: Hashable, value: tuple) -> None:
+        size = self._size(value)
+        for a in value:
+            if isinstance(a, np.ndarray):
+                a.setflags(write=False)
+        with self._lock:
+            if size > self.max_bytes and key not in self._pinned:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            self._evict()
+
+    def _evict(self) -> None:
+        # caller holds self._lock; walk from least to most recently used
+        if self.current_bytes <= self.max_bytes:
+            return
+        for key in list(self._entries):
+            if self.current_bytes <= self.max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            _, size = self._entries.pop(key)
+            self.current_bytes -= size
+            self.evictions += 1
+
+    def pin(self, key: Hashable) -> None:
+        with self._lock:
+            self._pinned.add(key)
+
+    def unpin(self, key: Hashable) -> None:
+        with self._lock:
+            self._pinned.discard(key)
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "pinned": len(self._pinned),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
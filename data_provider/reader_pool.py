@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Iterator, Tuple
+
+from inverted_index_gcp import BLOCK_SIZE, _open, get_storage
+from storage_backend import ReadaheadBackend
+
+
+def iter_ranges(locs, n_bytes: int) -> Iterator[Tuple[str, int, int]]:
+    """
+    Split a posting list of `n_bytes` stored at `locs` into the
+    (file_name, offset, length) reads that `MultiFileReader.read` performs.
+    """
+    for f_name, offset in locs:
+        if n_bytes <= 0:
+            break
+        n_read = min(n_bytes, BLOCK_SIZE - offset)
+        yield f_name, offset, n_read
+        n_bytes -= n_read
+
+
+class _PooledFile:
+    __slots__ = ("f", "lock", "last_used", "in_use", "retired")
+
+    def __init__(self, f):
+        self.f = f
+        # a file object has a single cursor, so seek+read must be atomic
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        self.in_use = 0
+        self.retired = False
+
+
+class PostingReaderPool:
+    """
+    Long-lived, thread-safe pool of open posting files.
+
+    Holds one storage client for the lifetime of the pool and keeps file/blob
+    handles open across queries. At most `max_open_files` handles are kept
+    (least recently used ones are closed first) and handles that were not
+    used for `idle_timeout` seconds are closed lazily on the next access.
+
+    `read(locs, n_bytes)` has the same contract as `MultiFileReader.read`, so
+    the pool can be passed to `InvertedIndex` wherever a reader is expected.
+
+    Remote files (a bucket, see `storage_backend`) are not held open: each
+    range is one `read_range` request of exactly that range, rounded up to
+    `readahead_bytes` windows (cached) when it is set.
+
+    With a `LocalMirror`, files that are already mirrored are served as
+    zero-copy `memoryview`s over their memory map; other files are still
+    read from the bucket.
+    """
+
+    def __init__(self, base_dir: str, bucket_name: str = None, max_open_files: int = 64, idle_timeout: float = 300.0,
+                 mirror=None, readahead_bytes: int = 0):
+        if max_open_files <= 0:
+            raise ValueError("max_open_files must be positive")
+        self._bucket = get_storage(bucket_name)
+        if self._bucket is not None and readahead_bytes > 0:
+            self._bucket = ReadaheadBackend(self._bucket, readahead_bytes)
+        self._base_dir = Path(base_dir) if self._bucket is None else base_dir
+        self.max_open_files = int(max_open_files)
+        self.idle_timeout = float(idle_timeout)
+        self.mirror = mirror
+
+        self._files: "OrderedDict[str, _PooledFile]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+        # counters, useful to verify that handles are actually reused
+        self.opened = 0
+        self.reused = 0
+        self.closed = 0
+
+    def _path(self, f_name: str) -> str:
+        if self._bucket is None:
+            return str(self._base_dir / f_name)
+        return f"{self._base_dir}/{f_name}"
+
+    def _close(self, pf: _PooledFile) -> None:
+        try:
+            pf.f.close()
+        finally:
+            self.closed += 1
+
+    def _retire(self, path: str) -> None:
+        # caller holds self._lock
+        pf = self._files.pop(path)
+        pf.retired = True
+        if pf.in_use == 0:
+            self._close(pf)
+
+    def _sweep_idle(self, now: float) -> None:
+        # caller holds self._lock
+        if now - self._last_sweep < min(self.idle_timeout, 30.0):
+            return
+        self._last_sweep = now
+        idle = [p for p, pf in self._files.items()
+                if pf.in_use == 0 and now - pf.last_used > self.idle_timeout]
+        for p in idle:
+            self._retire(p)
+
+    def _acquire(self, path: str) -> _PooledFile:
+        with self._lock:
+            self._sweep_idle(time.monotonic())
+            pf = self._files.get(path)
+            if pf is None:
+                pf = _PooledFile(_open(path, 'rb', self._bucket))
+                self._files[path] = pf
+                self.opened += 1
+                while len(self._files) > self.max_open_files:
+                    self._retire(next(iter(self._files)))
+            else:
+                self._files.move_to_end(path)
+                self.reused += 1
+            pf.in_use += 1
+            return pf
+
+    def _release(self, pf: _PooledFile) -> None:
+        with self._lock:
+            pf.in_use -= 1
+            pf.last_used = time.monotonic()
+            if pf.retired and pf.in_use == 0:
+                self._close(pf)
+
+    def read_range(self, f_name: str, offset: int, length: int) -> bytes:
+        """Read `length` bytes at `offset` of the posting file `f_name`."""
+        path = self._path(f_name)
+        if self.mirror is not None:
+            view = self.mirror.view(path, offset, length)
+            if view is not None:
+                return view
+        if self._bucket is not None:
+            return self._bucket.read_range(path, offset, length)
+        pf = self._acquire(path)
+        try:
+            with pf.lock:
+                pf.f.seek(offset)
+                return pf.f.read(length)
+        finally:
+            self._release(pf)
+
+    def read(self, locs, n_bytes: int) -> bytes:
+        ranges = list(iter_ranges(locs, n_bytes))
+        if self._bucket is not None and self.mirror is None:
+            # remote parts are fetched concurrently
+            parts = self._bucket.read_ranges([(self._path(f), offset, length) for f, offset, length in ranges])
+        else:
+            parts = [self.read_range(f_name, offset, length) for f_name, offset, length in ranges]
+        # a single part is returned as is to keep mirrored reads zero-copy
+        return parts[0] if len(parts) == 1 else b''.join(parts)
+
+    def open_files(self) -> int:
+        with self._lock:
+            return len(self._files)
+
+    def close(self) -> None:
+        with self._lock:
+            for p in list(self._files):
+                self._retire(p)
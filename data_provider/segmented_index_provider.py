@@ -0,0 +1,450 @@
+import io
+import json
+import logging
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from indexing.spimi import DOC_IDS_FILE, SpimiIndexBuilder
+from inverted_index_gcp import (POSTING_FORMAT_RAW, _exists, _open, arrays_to_posting_list, decode_posting_arrays,
+                                get_storage)
+from .index_provider import IndexProvider
+from .posting_cache import PostingListCache
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILE = "segments.json"
+TOMBSTONES_FILE = "tombstones.npy"
+
+
+class _Segment:
+    __slots__ = ("name", "provider", "tombstones", "doc_ids")
+
+    def __init__(self, name: str, provider: IndexProvider, tombstones: np.ndarray, doc_ids: Optional[np.ndarray]):
+        self.name = name
+        self.provider = provider
+        self.tombstones = tombstones
+        # ids of the documents the segment holds; None for an index written without a list
+        self.doc_ids = doc_ids
+
+
+class _Snapshot:
+    """An immutable view of the segment set; queries use one from start to end."""
+
+    def __init__(self, generation: int, base: _Segment, deltas: List[_Segment], n_docs: int):
+        self.generation = generation
+        self.n_docs = n_docs
+        self.base = base
+        self.deltas = deltas
+        self.segments = [base] + deltas
+        # doc ids deleted by any later segment, per segment
+        self.deleted_after = []
+        for i in range(len(self.segments)):
+            later = [s.tombstones for s in self.segments[i + 1:]]
+            self.deleted_after.append(np.unique(np.concatenate(later)) if later else np.empty(0, dtype=np.int64))
+        self.has_tombstones = any(len(d) for d in self.deleted_after)
+
+
+def _drop(doc_ids: np.ndarray, tfs: np.ndarray, deleted: np.ndarray):
+    if len(deleted) == 0 or len(doc_ids) == 0:
+        return doc_ids, tfs
+    idx = np.minimum(np.searchsorted(deleted, doc_ids), len(deleted) - 1)
+    keep = deleted[idx] != doc_ids
+    return doc_ids[keep], tfs[keep]
+
+
+class SegmentedIndexProvider:
+    """
+    LSM-style index: the immutable base segment plus small delta segments.
+
+    A delta segment is a regular index directory (written by
+    `SpimiIndexBuilder`) holding the postings of added or updated documents,
+    plus `tombstones.npy`: the doc ids it deletes or replaces in all older
+    segments. `segments.json` under `index_prefix` lists the base and the
+    deltas, oldest first; without it the index is the base alone.
+
+    Posting lists are merged at read time: every segment's list minus the
+    doc ids tombstoned by later segments, concatenated in doc id order.
+    The merge work grows with the number of deltas, so once there are more
+    than `max_deltas` a background compaction merges them into one; it
+    writes a new segment and swaps the segment set atomically, queries keep
+    running on the previous set meanwhile. `compact(include_base=True)`
+    also folds everything into a new base. Merge time per call and totals
+    are recorded in `merge_stats` / `last_merge_stats`.
+
+    Readers poll the manifest at most every `refresh_interval` seconds (on
+    the next read after it elapsed), so serving processes pick up segments
+    published by another process, and every pre-forked worker converges on
+    the same generation (and so the same `index_version`). None disables
+    polling.
+
+    Writes (`add_documents`, `compact`) must all come from one process, the
+    indexer: the manifest is updated read-modify-write, and `_write_lock`
+    only serializes threads of that process. Serving workers only read.
+
+    `get_N` is the live document count, kept in the manifest as `n_docs`:
+    `add_documents` adds the ids that were not live before and subtracts
+    the deleted ids that were. Liveness comes from each segment's
+    `doc_ids.npy` (written by `SpimiIndexBuilder` and by compaction). A
+    base without one starts from its `get_N()` and cannot tell its own
+    documents apart, so there an id counts as previously live only if it
+    is passed in `deleted` (replace a base document by passing its id in
+    both `docs` and `deleted`).
+
+    Exposes the `IndexProvider` methods used by `DataProvider`.
+    """
+
+    def __init__(self, bucket_name: Optional[str], index_prefix: str = "postings_gcp", max_deltas: int = 8,
+                 cache_bytes: int = 256 * 2 ** 20, refresh_interval: Optional[float] = 5.0, **base_kwargs):
+        self.bucket_name = bucket_name
+        self.index_prefix = index_prefix
+        self.max_deltas = int(max_deltas)
+        self.refresh_interval = refresh_interval
+        self._base_kwargs = dict(base_kwargs, cache_bytes=cache_bytes)
+        self._bucket = get_storage(bucket_name)
+        # merged lists, keyed by (generation, term) so a swap never serves stale data
+        self.cache = PostingListCache(cache_bytes) if cache_bytes > 0 else None
+        self._write_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._last_refresh = 0.0
+        self._compacting = threading.Lock()
+        self._compaction: Optional[threading.Thread] = None
+        self._local = threading.local()
+        self.merge_stats = {"calls": 0, "merged_terms": 0, "merge_s": 0.0, "max_merge_s": 0.0, "compactions": 0}
+        self._snapshot: Optional[_Snapshot] = None
+        self._segments: Dict[str, _Segment] = {}
+        self._retired: List[_Segment] = []
+        self.refresh()
+
+    # ------------------------------------------------------------- storage
+
+    def _path(self, *parts: str) -> str:
+        return "/".join([self.index_prefix, *[p for p in parts if p]])
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with _open(self._path(MANIFEST_FILE), "rb", self._bucket) as f:
+                return json.loads(f.read().decode("utf-8"))
+        except FileNotFoundError:
+            return {"generation": 0, "base": "", "deltas": []}
+        except Exception as e:
+            # GCS raises NotFound for a missing manifest
+            if type(e).__name__ == "NotFound":
+                return {"generation": 0, "base": "", "deltas": []}
+            raise
+
+    def _write_manifest(self, manifest: Dict) -> None:
+        with _open(self._path(MANIFEST_FILE), "wb", self._bucket) as f:
+            f.write(json.dumps(manifest).encode("utf-8"))
+
+    def _write_tombstones(self, segment: str, doc_ids: Iterable[int]) -> None:
+        buf = io.BytesIO()
+        np.save(buf, np.unique(np.asarray(list(doc_ids), dtype=np.int64)))
+        with _open(self._path(segment, TOMBSTONES_FILE), "wb", self._bucket) as f:
+            f.write(buf.getvalue())
+
+    def _open_segment(self, name: str, is_base: bool) -> _Segment:
+        if name in self._segments:
+            return self._segments[name]
+        if not name:
+            kwargs = self._base_kwargs
+        else:
+            # merged lists are cached here; a compacted base is read directly
+            kwargs = {"cache_bytes": self._base_kwargs["cache_bytes"] if is_base else 0}
+        provider = IndexProvider(self.bucket_name, index_prefix=self._path(name), **kwargs)
+        tombstones = np.empty(0, dtype=np.int64)
+        if not is_base:
+            with _open(self._path(name, TOMBSTONES_FILE), "rb", self._bucket) as f:
+                tombstones = np.load(io.BytesIO(f.read())).astype(np.int64)
+        doc_ids = None
+        if _exists(self._path(name, DOC_IDS_FILE), self._bucket):
+            with _open(self._path(name, DOC_IDS_FILE), "rb", self._bucket) as f:
+                doc_ids = np.load(io.BytesIO(f.read())).astype(np.int64)
+        segment = self._segments[name] = _Segment(name, provider, tombstones, doc_ids)
+        return segment
+
+    def refresh(self) -> bool:
+        """Load the current segment set from the manifest; True if it changed."""
+        with self._refresh_lock:
+            return self._refresh()
+
+    def _refresh(self) -> bool:
+        # caller holds self._refresh_lock
+        self._last_refresh = time.monotonic()
+        manifest = self._read_manifest()
+        if self._snapshot is not None and manifest["generation"] == self._snapshot.generation:
+            return False
+        base = self._open_segment(manifest["base"], is_base=True)
+        deltas = [self._open_segment(name, is_base=False) for name in manifest["deltas"]]
+        n_docs = manifest.get("n_docs")
+        if n_docs is None:
+            # no document added or deleted yet (or a manifest written before the count)
+            n_docs = len(base.doc_ids) if base.doc_ids is not None else base.provider.get_N()
+        self._snapshot = _Snapshot(manifest["generation"], base, deltas, int(n_docs))
+        # segments merged away are closed one refresh later, once queries
+        # still running on the previous snapshot have finished with them
+        for segment in self._retired:
+            segment.provider.close()
+        live = {s.name for s in self._snapshot.segments}
+        self._retired = [s for n, s in self._segments.items() if n not in live]
+        self._segments = {n: s for n, s in self._segments.items() if n in live}
+        logger.info("index generation %d: base %r + %d deltas", manifest["generation"], manifest["base"] or "/",
+                    len(deltas))
+        return True
+
+    # -------------------------------------------------------------- writes
+
+    def add_documents(self, docs: Iterable[Tuple[int, str]], deleted: Iterable[int] = ()) -> str:
+        """
+        Write a delta segment that adds (or replaces) `docs` (doc_id, text)
+        and deletes the `deleted` doc ids, then publish it. Returns its name.
+        """
+        docs = list(docs)
+        deleted = list(deleted)
+        with self._write_lock:
+            self.refresh()
+            manifest = self._read_manifest()
+            n_docs = manifest.get("n_docs", self._snapshot.n_docs) + self._count_change(
+                self._snapshot, [d for d, _ in docs], deleted)
+            generation = manifest["generation"] + 1
+            name = f"delta_{generation:05}"
+            builder = SpimiIndexBuilder(self._path(name), bucket_name=self.bucket_name, workers=1,
+                                        posting_format=POSTING_FORMAT_RAW)
+            builder.build(docs)
+            self._write_tombstones(name, [d for d, _ in docs] + deleted)
+            manifest.update(generation=generation, deltas=manifest["deltas"] + [name], n_docs=n_docs)
+            self._write_manifest(manifest)
+            self.refresh()
+        if len(self._snapshot.deltas) > self.max_deltas:
+            self.compact_in_background()
+        return name
+
+    @staticmethod
+    def _live(snap: _Snapshot, doc_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(live, known) masks of `doc_ids` in `snap`; known is False where a segment has no doc list."""
+        live = np.zeros(len(doc_ids), dtype=bool)
+        known = np.ones(len(doc_ids), dtype=bool)
+        resolved = np.zeros(len(doc_ids), dtype=bool)
+        # the newest segment that holds or deletes an id decides
+        for seg in reversed(snap.segments):
+            if seg.doc_ids is None:
+                touched = ~resolved if seg is snap.base else ~resolved & np.isin(doc_ids, seg.tombstones)
+                known[touched] = False
+                resolved |= touched
+                continue
+            held = ~resolved & np.isin(doc_ids, seg.doc_ids)
+            live |= held
+            resolved |= held | np.isin(doc_ids, seg.tombstones)
+        return live, known
+
+    def _count_change(self, snap: _Snapshot, added: List[int], deleted: List[int]) -> int:
+        """Change of the live document count when `added` are (re)written and `deleted` removed."""
+        ids = np.unique(np.asarray(added + deleted, dtype=np.int64))
+        live, known = self._live(snap, ids)
+        before = np.where(known, live, np.isin(ids, np.asarray(deleted, dtype=np.int64)))
+        after = np.isin(ids, np.asarray(added, dtype=np.int64))
+        return int(after.sum()) - int(before.sum())
+
+    @staticmethod
+    def _merged_doc_ids(snap: _Snapshot, segments: List[_Segment]) -> Optional[np.ndarray]:
+        """Doc ids left in `segments` after later tombstones, as in their merged postings; None if unknown."""
+        if any(seg.doc_ids is None for seg in segments):
+            return None
+        parts = [np.setdiff1d(seg.doc_ids, snap.deleted_after[snap.segments.index(seg)]) for seg in segments]
+        return np.unique(np.concatenate(parts))
+
+    def _merged_segment_postings(self, snap: _Snapshot, segments: List[_Segment], terms: List[str]):
+        """Yield (term, doc_ids, tfs) of `terms` merged over `segments`."""
+        for i in range(0, len(terms), 256):
+            chunk = terms[i:i + 256]
+            merged = self._merge(snap, chunk, segments)
+            for t in chunk:
+                doc_ids, tfs = merged[t]
+                if len(doc_ids):
+                    yield t, doc_ids, tfs
+
+    def compact(self, include_base: bool = False) -> Optional[str]:
+        """
+        Merge all current deltas (and the base with `include_base`) into one
+        new segment and publish it. Deltas added meanwhile are kept on top.
+        Returns the new segment name, or None if there was nothing to merge.
+        """
+        with self._compacting:
+            snap = self._snapshot
+            sources = snap.segments if include_base else snap.deltas
+            if len(sources) < (1 if include_base else 2):
+                return None
+            t0 = time.perf_counter()
+            with self._write_lock:
+                # reserve a generation for the segment name; deltas added
+                # while merging get later ones
+                manifest = self._read_manifest()
+                generation = manifest["generation"] = manifest["generation"] + 1
+                self._write_manifest(manifest)
+            name = f"{'base' if include_base else 'delta'}_{generation:05}"
+            terms = sorted(set().union(*[self._segment_terms(s) for s in sources]))
+            builder = SpimiIndexBuilder(self._path(name), bucket_name=self.bucket_name, workers=1,
+                                        posting_format=POSTING_FORMAT_RAW)
+            # merge against the snapshot taken above, restricted to the sources
+            builder.write_postings(self._merged_segment_postings(snap, sources, terms))
+            doc_ids = self._merged_doc_ids(snap, sources)
+            if doc_ids is not None:
+                builder.write_doc_ids(doc_ids)
+            if not include_base:
+                self._write_tombstones(name, np.concatenate([s.tombstones for s in sources]).tolist())
+
+            with self._write_lock:
+                manifest = self._read_manifest()
+                merged = {s.name for s in snap.deltas}
+                newer = [d for d in manifest["deltas"] if d not in merged]
+                if include_base:
+                    manifest.update(base=name, deltas=newer)
+                else:
+                    manifest.update(deltas=[name] + newer)
+                manifest["generation"] += 1
+                self._write_manifest(manifest)
+                self.refresh()
+            self.merge_stats["compactions"] += 1
+            logger.info("compacted %d segments into %s (%d terms) in %.1fs", len(sources), name, len(terms),
+                        time.perf_counter() - t0)
+            return name
+
+    def compact_in_background(self, include_base: bool = False) -> threading.Thread:
+        """Run `compact` on a background thread (at most one at a time)."""
+        if self._compaction is not None and self._compaction.is_alive():
+            return self._compaction
+        self._compaction = threading.Thread(target=self.compact, kwargs={"include_base": include_base},
+                                            name="index-compaction", daemon=True)
+        self._compaction.start()
+        return self._compaction
+
+    @staticmethod
+    def _segment_terms(segment: _Segment):
+        # iterating posting_locs yields the terms, for InvertedIndex and Lexicon alike
+        return set(segment.provider.index.posting_locs)
+
+    # --------------------------------------------------------------- reads
+
+    def _merge(self, snap: _Snapshot, terms: List[str], segments: Optional[List[_Segment]] = None):
+        segments = snap.segments if segments is None else segments
+        per_segment = []
+        positions = [snap.segments.index(seg) for seg in segments]
+        for seg in segments:
+            present = [t for t in terms if t in seg.provider.index.posting_locs]
+            per_segment.append(seg.provider.get_posting_list(present, as_arrays=True) if present else {})
+        t0 = time.perf_counter()
+        out = {}
+        for t in terms:
+            parts = []
+            for pos, lists in zip(positions, per_segment):
+                if t in lists:
+                    parts.append(_drop(*lists[t], snap.deleted_after[pos]))
+            if len(parts) == 1:
+                out[t] = parts[0]
+            elif parts:
+                doc_ids = np.concatenate([p[0] for p in parts]).astype(np.uint32)
+                tfs = np.concatenate([p[1] for p in parts]).astype(np.uint16)
+                order = np.argsort(doc_ids, kind="stable")
+                out[t] = doc_ids[order], tfs[order]
+            else:
+                out[t] = decode_posting_arrays(b'', 0)
+        elapsed = time.perf_counter() - t0
+        st = self.merge_stats
+        st["calls"] += 1
+        st["merged_terms"] += len(terms)
+        st["merge_s"] += elapsed
+        st["max_merge_s"] = max(st["max_merge_s"], elapsed)
+        self._local.merge_stats = {"terms": len(terms), "segments": len(segments), "merge_s": elapsed}
+        return out
+
+    def _current(self) -> _Snapshot:
+        """The snapshot for a read, refreshed first when `refresh_interval` has elapsed."""
+        if self.refresh_interval is not None and time.monotonic() - self._last_refresh >= self.refresh_interval:
+            # one reader polls, the others keep using the current snapshot
+            if self._refresh_lock.acquire(blocking=False):
+                try:
+                    self._refresh()
+                except Exception:
+                    logger.exception("index refresh failed, serving generation %d", self._snapshot.generation)
+                finally:
+                    self._refresh_lock.release()
+        return self._snapshot
+
+    def _get_arrays(self, terms: List[str]) -> Dict[str, tuple]:
+        snap = self._current()
+        if not snap.deltas:
+            return snap.base.provider.get_posting_list(terms, as_arrays=True)
+        out, missing = {}, []
+        for t in dict.fromkeys(terms):
+            cached = self.cache.get((snap.generation, t)) if self.cache is not None else None
+            if cached is not None:
+                out[t] = cached
+            else:
+                missing.append(t)
+        if missing:
+            merged = self._merge(snap, missing)
+            for t, arrays in merged.items():
+                out[t] = arrays
+                if self.cache is not None:
+                    self.cache.put((snap.generation, t), arrays)
+        return out
+
+    def get_posting_list(self, terms: List[str], as_arrays: bool = False) -> Dict[str, List]:
+        arrays = self._get_arrays(terms)
+        if as_arrays:
+            return {t: arrays[t] for t in terms}
+        return {t: arrays_to_posting_list(*arrays[t]) for t in terms}
+
+    def get_df(self, terms: List[str]) -> Dict[str, int]:
+        snap = self._current()
+        if not snap.deltas:
+            return snap.base.provider.get_df(terms)
+        # exact df needs the merged lists; they are cached for the query that follows
+        arrays = self._get_arrays(terms)
+        return {t: len(arrays[t][0]) for t in terms}
+
+    def get_term_bounds(self, terms: List[str]) -> Dict[str, tuple]:
+        # stored base bounds stay valid upper bounds after deletions, but not
+        # for terms with postings in a delta
+        snap = self._current()
+        untouched = [t for t in terms if not any(t in d.provider.index.posting_locs for d in snap.deltas)]
+        return snap.base.provider.get_term_bounds(untouched)
+
+    @property
+    def last_fetch_stats(self) -> Dict:
+        return self._snapshot.base.provider.last_fetch_stats
+
+    @property
+    def last_merge_stats(self) -> Dict:
+        """Merge timing of the last read made by this thread."""
+        return getattr(self._local, "merge_stats", {})
+
+    @property
+    def index_version(self) -> str:
+        snap = self._current()
+        return f"{snap.base.provider.index_version}+g{snap.generation}"
+
+    @property
+    def mirror(self):
+        return self._snapshot.base.provider.mirror
+
+    def get_N(self) -> int:
+        """Live document count (see the class docstring)."""
+        return self._current().n_docs
+
+    def after_fork(self) -> None:
+        self._local = threading.local()
+        self._refresh_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._compacting = threading.Lock()
+        self._compaction = None
+        for segment in self._segments.values():
+            segment.provider.after_fork()
+
+    def close(self) -> None:
+        if self._compaction is not None:
+            self._compaction.join()
+        for segment in [*self._segments.values(), *self._retired]:
+            segment.provider.close()
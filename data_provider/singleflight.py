@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, Iterable, List
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    In-flight de-duplication of concurrent loads ("singleflight").
+
+    When several threads ask for the same key at once, only the first one
+    (the leader) runs the load; the others wait for it and share its
+    result, or its exception. Nothing is kept once the load finishes, so
+    this complements a cache rather than replacing one.
+
+    Per-key accounting (loads, coalesced callers, load time and time spent
+    waiting) is kept for the `max_tracked_keys` most recently used keys.
+    """
+
+    def __init__(self, max_tracked_keys: int = 10000):
+        self.max_tracked_keys = int(max_tracked_keys)
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._key_stats: "OrderedDict[Hashable, Dict[str, float]]" = OrderedDict()
+        self.loads = 0
+        self.coalesced = 0
+
+    def _account(self, key: Hashable, field: str, seconds: float, count: str) -> None:
+        # caller holds self._lock
+        st = self._key_stats.pop(key, None)
+        if st is None:
+            st = {"loads": 0, "coalesced": 0, "load_s": 0.0, "wait_s": 0.0}
+        st[count] += 1
+        st[field] += seconds
+        self._key_stats[key] = st
+        while len(self._key_stats) > self.max_tracked_keys:
+            self._key_stats.popitem(last=False)
+
+    def do(self, key: Hashable, fn: Callable[[], object]):
+        """Run fn() once for all concurrent callers of `key`."""
+        return self.do_many([key], lambda keys: {key: fn()})[key]
+
+    def do_many(self, keys: Iterable[Hashable], fn: Callable[[List[Hashable]], Dict]) -> Dict:
+        """
+        Load several keys at once. `fn(keys)` is called with the keys no
+        other thread is loading and must return a dict key -> value (missing
+        keys map to None); keys already in flight are waited for.
+        """
+        leading, following = {}, {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    leading[key] = self._calls[key] = _Call()
+                else:
+                    following[key] = call
+
+        out = {}
+        if leading:
+            t0 = time.perf_counter()
+            try:
+                results = fn(list(leading))
+            except BaseException as e:
+                results, error = {}, e
+            else:
+                error = None
+            elapsed = time.perf_counter() - t0
+            with self._lock:
+                self.loads += len(leading)
+                for key, call in leading.items():
+                    call.result, call.error = results.get(key), error
+                    del self._calls[key]
+                    self._account(key, "load_s", elapsed, "loads")
+                    call.done.set()
+            if error is not None:
+                raise error
+            out.update((key, call.result) for key, call in leading.items())
+
+        for key, call in following.items():
+            t0 = time.perf_counter()
+            call.done.wait()
+            with self._lock:
+                self.coalesced += 1
+                self._account(key, "wait_s", time.perf_counter() - t0, "coalesced")
+            if call.error is not None:
+                raise call.error
+            out[key] = call.result
+        return out
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    def key_stats(self, key: Hashable) -> Dict[str, float]:
+        with self._lock:
+            return dict(self._key_stats.get(key, {}))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {"loads": self.loads, "coalesced": self.coalesced, "in_flight": len(self._calls),
+                    "tracked_keys": len(self._key_stats)}
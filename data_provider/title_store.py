@@ -0,0 +1,91 @@
+import argparse
+import os
+import pickle
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from .pagerank_store import find_sorted
+
+TITLES_BLOB_FILE = "titles.bin"
+TITLE_OFFSETS_FILE = "title_offsets.npy"
+TITLE_IDS_FILE = "title_ids.npy"
+TITLE_STORE_FILES = (TITLES_BLOB_FILE, TITLE_OFFSETS_FILE, TITLE_IDS_FILE)
+
+
+class TitleStore:
+    """
+    Compact, memory-mapped document titles.
+
+    All titles are concatenated into one UTF-8 blob; `title_offsets.npy`
+    (uint64, n + 1 entries) delimits them and `title_ids.npy` (uint32) holds
+    the matching doc ids sorted ascending. Everything is memory-mapped, so
+    a lookup only touches the pages of the requested titles.
+    """
+
+    def __init__(self, store_dir: str):
+        store_dir = Path(store_dir)
+        self.doc_ids = np.load(store_dir / TITLE_IDS_FILE, mmap_mode="r")
+        self.offsets = np.load(store_dir / TITLE_OFFSETS_FILE, mmap_mode="r")
+        blob_path = store_dir / TITLES_BLOB_FILE
+        # np.memmap cannot map an empty file
+        self.blob = np.memmap(blob_path, dtype=np.uint8, mode="r") if blob_path.stat().st_size else np.empty(0, np.uint8)
+        if len(self.offsets) != len(self.doc_ids) + 1:
+            raise ValueError("title offsets do not match title ids")
+
+    @staticmethod
+    def exists(store_dir: str) -> bool:
+        return all((Path(store_dir) / f).exists() for f in TITLE_STORE_FILES)
+
+    def __len__(self) -> int:
+        return len(self.doc_ids)
+
+    def get_titles(self, doc_ids: Iterable[int]) -> List[str]:
+        """Batched lookup; returns titles aligned with `doc_ids`, "" when unknown."""
+        q = np.asarray(doc_ids if isinstance(doc_ids, np.ndarray) else list(doc_ids), dtype=np.int64)
+        if len(q) == 0 or len(self.doc_ids) == 0:
+            return [""] * len(q)
+        idx, found = find_sorted(self.doc_ids, q)
+        starts = self.offsets[idx].tolist()
+        ends = self.offsets[idx + 1].tolist()
+        return [bytes(self.blob[s:e]).decode("utf-8") if ok else ""
+                for s, e, ok in zip(starts, ends, found.tolist())]
+
+    @staticmethod
+    def convert(data: Dict, store_dir: str) -> None:
+        """Write a doc_id -> title dict (as in doc_id_to_title.pkl) as a store."""
+        store_dir = Path(store_dir)
+        store_dir.mkdir(parents=True, exist_ok=True)
+        items = sorted((int(d), t) for d, t in data.items())
+        offsets = np.zeros(len(items) + 1, dtype=np.uint64)
+        tmp_blob = store_dir / (TITLES_BLOB_FILE + ".part")
+        with open(tmp_blob, "wb") as f:
+            pos = 0
+            for i, (_, title) in enumerate(items):
+                b = str(title).encode("utf-8")
+                f.write(b)
+                pos += len(b)
+                offsets[i + 1] = pos
+        ids = np.fromiter((d for d, _ in items), dtype=np.int64, count=len(items)).astype(np.uint32)
+        for name, arr in ((TITLE_OFFSETS_FILE, offsets), (TITLE_IDS_FILE, ids)):
+            tmp = store_dir / (name + ".part")
+            with open(tmp, "wb") as f:
+                np.save(f, arr)
+            os.replace(tmp, store_dir / name)
+        os.replace(tmp_blob, store_dir / TITLES_BLOB_FILE)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert doc_id_to_title.pkl into a memory-mapped title store.")
+    parser.add_argument("pickle_path", help="local path of doc_id_to_title.pkl")
+    parser.add_argument("store_dir", help="output directory for the store files")
+    args = parser.parse_args()
+    with open(args.pickle_path, "rb") as f:
+        data = pickle.load(f)
+    TitleStore.convert(data, args.store_dir)
+    print(f"wrote {len(data)} titles to {args.store_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+Single-machine SPIMI index builder.
+
+Streams a document dump, tokenizes it with the `QueryTokenize` rules on a
+process pool, keeps postings in compact NumPy batches until `memory_mb` is
+reached, spills them as sorted runs, and k-way merges the runs into the
+`postings_gcp` layout: `{bucket_id}_NNN.bin` posting files, per-bucket
+`{bucket_id}_posting_locs.pickle` (+ bytes/bounds) and `index.pkl`.
+`doc_ids.npy` lists the ids of the indexed documents (sorted int64).
+
+    python -m indexing.spimi wiki_*.jsonl.gz out/postings_gcp --workers 8 --memory-mb 4096
+
+With `--shard I --num-shards N` only the documents with doc_id % N == I are
+indexed, and `shard.json` records the shard and its document count, for
+the document-partitioned serving in `serving.sharding`.
+"""
+import argparse
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
+import json
+import logging
+import mmap
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from collections import Counter
+from contextlib import ExitStack, closing
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from inverted_index_gcp import (POSTING_DTYPE, POSTING_FORMAT_BLOCK_V1, POSTING_FORMAT_RAW, TF_MASK, InvertedIndex,
+                                MultiFileWriter, _open, compute_posting_bounds, encode_block_postings, get_storage)
+
+logger = logging.getLogger(__name__)
+
+NUM_BUCKETS = 124
+SHARD_META_FILE = "shard.json"
+DOC_IDS_FILE = "doc_ids.npy"
+# rough Python overhead of one batch-local term string, for the memory cap
+_TERM_OVERHEAD = 80
+
+
+def token2bucket_id(token: str) -> int:
+    return int(hashlib.blake2b(token.encode("utf-8"), digest_size=5).hexdigest(), 16) % NUM_BUCKETS
+
+
+def shard_of(doc_id: int, num_shards: int) -> int:
+    """Shard holding `doc_id` when the corpus is partitioned by doc id."""
+    return doc_id % num_shards
+
+
+def iter_documents(paths: Iterable[str], id_field: str = "id", text_field: str = "text") -> Iterator[Tuple[int, str]]:
+    """
+    Stream (doc_id, text) pairs from JSON-lines files (optionally gzipped)
+    or Parquet files (read in row batches; needs pyarrow).
+    """
+    for path in paths:
+        if path.endswith(".parquet"):
+            import pyarrow.parquet as pq
+            for batch in pq.ParquetFile(path).iter_batches(columns=[id_field, text_field]):
+                cols = batch.to_pydict()
+                yield from zip(cols[id_field], cols[text_field])
+            continue
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    doc = json.loads(line)
+                    yield int(doc[id_field]), doc.get(text_field) or ""
+
+
+_tokenizer = None
+
+
+def _tokenize_batch(batch: List[Tuple[int, str]]):
+    """
+    Tokenize a batch of documents. Returns the batch vocabulary and the
+    (term index, doc_id, tf) postings as arrays, plus the token count.
+    """
+    global _tokenizer
+    if _tokenizer is None:
+        from text_processor.query_tokenize import QueryTokenize
+        _tokenizer = QueryTokenize()
+    vocab: Dict[str, int] = {}
+    term_idx, doc_ids, tfs = [], [], []
+    n_tokens = 0
+    for doc_id, text in batch:
+        tokens = _tokenizer.tokenize(text)
+        n_tokens += len(tokens)
+        for w, cnt in Counter(tokens).items():
+            term_idx.append(vocab.setdefault(w, len(vocab)))
+            doc_ids.append(doc_id)
+            tfs.append(cnt)
+    return (list(vocab), np.array(term_idx, dtype=np.int32), np.array(doc_ids, dtype=np.uint32),
+            np.minimum(np.array(tfs, dtype=np.int64), TF_MASK).astype(np.uint16), n_tokens)
+
+
+class _Run:
+    """A sorted run on disk: term table + per-term posting counts + postings."""
+    ARRAYS = ("term_offsets", "counts", "doc_ids", "tfs")
+
+    def __init__(self, run_dir: Path):
+        self.dir = run_dir
+        with open(run_dir / "terms.bin", "rb") as f:
+            self.blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else b""
+        for name in self.ARRAYS:
+            setattr(self, name, np.load(run_dir / f"{name}.npy", mmap_mode="r").view(np.ndarray))
+        self.starts = np.concatenate([[0], np.cumsum(self.counts, dtype=np.int64)])
+
+    @staticmethod
+    def write(run_dir: Path, terms: List[str], counts: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray) -> None:
+        run_dir.mkdir(parents=True)
+        encoded = [t.encode("utf-8") for t in terms]
+        with open(run_dir / "terms.bin", "wb") as f:
+            f.write(b"".join(encoded))
+        offsets = np.concatenate([[0], np.cumsum([len(b) for b in encoded], dtype=np.uint64)]).astype(np.uint64)
+        for name, arr in zip(_Run.ARRAYS, (offsets, counts, doc_ids, tfs)):
+            np.save(run_dir / f"{name}.npy", arr)
+
+    def __iter__(self) -> Iterator[Tuple[str, int]]:
+        offsets = memoryview(self.term_offsets).cast("B").cast("Q")
+        for i in range(len(offsets) - 1):
+            yield self.blob[offsets[i]:offsets[i + 1]].decode("utf-8"), i
+
+    def postings(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        lo, hi = int(self.starts[i]), int(self.starts[i + 1])
+        return self.doc_ids[lo:hi], self.tfs[lo:hi]
+
+
+class SpimiIndexBuilder:
+    """
+    Bounded-memory index builder (single-pass in-memory indexing).
+
+    Postings are buffered as the NumPy batches the tokenizer workers return;
+    once their estimated size exceeds `memory_mb` they are sorted by
+    (term, doc_id) and spilled as a run. `build` merges all runs and writes
+    the posting files with vectorized packing, in `posting_format`.
+    """
+
+    def __init__(self, out_dir: str, bucket_name: Optional[str] = None, workers: int = 0, memory_mb: int = 1024,
+                 batch_docs: int = 1000, posting_format: int = POSTING_FORMAT_RAW, tmp_dir: Optional[str] = None,
+                 progress_every: float = 10.0):
+        self.out_dir = out_dir
+        self.bucket_name = bucket_name
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.memory_bytes = int(memory_mb) * 2 ** 20
+        self.batch_docs = int(batch_docs)
+        self.posting_format = posting_format
+        self.tmp_dir = tmp_dir
+        self.progress_every = float(progress_every)
+        self._batches = []
+        self._buffered = 0
+        self._doc_ids: List[np.ndarray] = []
+        self.stats = {"docs": 0, "tokens": 0, "postings": 0, "runs": 0, "terms": 0, "bytes_written": 0}
+
+    # ------------------------------------------------------------ inversion
+
+    def _add_batch(self, result) -> None:
+        vocab, term_idx, doc_ids, tfs, n_tokens = result
+        self._batches.append((vocab, term_idx, doc_ids, tfs))
+        self._buffered += term_idx.nbytes + doc_ids.nbytes + tfs.nbytes + _TERM_OVERHEAD * len(vocab)
+        self.stats["tokens"] += n_tokens
+        self.stats["postings"] += len(doc_ids)
+
+    def _spill(self, runs_dir: Path) -> None:
+        if not self._batches:
+            return
+        vocab: Dict[str, int] = {}
+        term_ids = []
+        for batch_vocab, term_idx, _, _ in self._batches:
+            ids = np.array([vocab.setdefault(w, len(vocab)) for w in batch_vocab], dtype=np.int64)
+            term_ids.append(ids[term_idx])
+        terms = sorted(vocab)
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[[vocab[t] for t in terms]] = np.arange(len(terms))
+
+        term_rank = rank[np.concatenate(term_ids)]
+        doc_ids = np.concatenate([b[2] for b in self._batches])
+        tfs = np.concatenate([b[3] for b in self._batches])
+        order = np.lexsort((doc_ids, term_rank))
+        counts = np.bincount(term_rank, minlength=len(terms)).astype(np.uint32)
+        _Run.write(runs_dir / f"run_{self.stats['runs']:05}", terms, counts, doc_ids[order], tfs[order])
+        self.stats["runs"] += 1
+        self._batches, self._buffered = [], 0
+
+    def _log_progress(self, t0: float, phase: str) -> None:
+        elapsed = time.perf_counter() - t0
+        logger.info("%s: %d docs (%.0f docs/s, %.0f tokens/s), %d postings, %d runs", phase, self.stats["docs"],
+                    self.stats["docs"] / elapsed if elapsed else 0.0,
+                    self.stats["tokens"] / elapsed if elapsed else 0.0, self.stats["postings"], self.stats["runs"])
+
+    def invert(self, docs: Iterable[Tuple[int, str]], runs_dir: Path) -> None:
+        """Tokenize `docs` and spill them as sorted runs into `runs_dir`."""
+        def batches():
+            it = iter(docs)
+            while True:
+                batch = list(itertools.islice(it, self.batch_docs))
+                if not batch:
+                    return
+                self.stats["docs"] += len(batch)
+                self._doc_ids.append(np.array([d for d, _ in batch], dtype=np.int64))
+                yield batch
+
+        t0 = last = time.perf_counter()
+        with ExitStack() as stack:
+            if self.workers > 1:
+                pool = stack.enter_context(Pool(self.workers))
+                results = pool.imap(_tokenize_batch, batches(), chunksize=1)
+            else:
+                results = map(_tokenize_batch, batches())
+            for result in results:
+                self._add_batch(result)
+                if self._buffered >= self.memory_bytes:
+                    self._spill(runs_dir)
+                if time.perf_counter() - last >= self.progress_every:
+                    last = time.perf_counter()
+                    self._log_progress(t0, "inverting")
+        self._spill(runs_dir)
+        self._log_progress(t0, "inverted")
+
+    # ---------------------------------------------------------------- merge
+
+    @staticmethod
+    def _merge_runs(runs: List[_Run]) -> Iterator[Tuple[str, np.ndarray, np.ndarray]]:
+        def entries(n, run):
+            for term, i in run:
+                yield term, n, i
+
+        merged = heapq.merge(*[entries(n, run) for n, run in enumerate(runs)])
+        for term, group in itertools.groupby(merged, key=lambda x: x[0]):
+            parts = [runs[n].postings(i) for _, n, i in group]
+            doc_ids = np.concatenate([p[0] for p in parts])
+            tfs = np.concatenate([p[1] for p in parts])
+            if len(parts) > 1 and not (np.diff(doc_ids.astype(np.int64)) > 0).all():
+                order = np.argsort(doc_ids, kind="stable")
+                doc_ids, tfs = doc_ids[order], tfs[order]
+            yield term, doc_ids, tfs
+
+    def _encode(self, doc_ids: np.ndarray, tfs: np.ndarray) -> bytes:
+        if self.posting_format == POSTING_FORMAT_BLOCK_V1:
+            return encode_block_postings(doc_ids, tfs)
+        return np.rec.fromarrays([doc_ids, tfs], dtype=POSTING_DTYPE).tobytes()
+
+    def merge(self, runs_dir: Path) -> InvertedIndex:
+        """Merge the runs in `runs_dir` into the posting files and index metadata."""
+        t0 = time.perf_counter()
+        runs = [_Run(p) for p in sorted(runs_dir.iterdir())]
+        index = self.write_postings(self._merge_runs(runs))
+        logger.info("merged %d runs into %d terms in %.1fs", len(runs), self.stats["terms"], time.perf_counter() - t0)
+        return index
+
+    def write_postings(self, postings: Iterable[Tuple[str, np.ndarray, np.ndarray]]) -> InvertedIndex:
+        """
+        Write (term, doc_ids, tfs) posting lists, given in term order, as the
+        posting files and metadata of an index in `out_dir`.
+        """
+        index = InvertedIndex()
+        index.posting_format = self.posting_format
+        per_bucket = [dict(locs={}, bytes={}, bounds={}) for _ in range(NUM_BUCKETS)]
+        if self.bucket_name is None:
+            Path(self.out_dir).mkdir(parents=True, exist_ok=True)
+
+        last = time.perf_counter()
+        with ExitStack() as stack:
+            writers = {}
+            for term, doc_ids, tfs in postings:
+                bucket_id = token2bucket_id(term)
+                if bucket_id not in writers:
+                    writers[bucket_id] = stack.enter_context(
+                        closing(MultiFileWriter(self.out_dir, bucket_id, self.bucket_name)))
+                b = self._encode(doc_ids, tfs)
+                # file names are stored relative to out_dir, as the readers expect
+                locs = [(Path(f_name).name, offset) for f_name, offset in writers[bucket_id].write(b)]
+                bounds = compute_posting_bounds(doc_ids, tfs)
+
+                index.df[term] = len(doc_ids)
+                index.term_total[term] = int(tfs.sum(dtype=np.int64))
+                index.posting_locs[term] = locs
+                index.posting_bounds[term] = bounds
+                if self.posting_format != POSTING_FORMAT_RAW:
+                    index.posting_bytes[term] = len(b)
+                meta = per_bucket[bucket_id]
+                meta["locs"][term], meta["bytes"][term], meta["bounds"][term] = locs, len(b), bounds
+                self.stats["terms"] += 1
+                self.stats["bytes_written"] += len(b)
+                if time.perf_counter() - last >= self.progress_every:
+                    last = time.perf_counter()
+                    logger.info("merging: %d terms, %.1f MB written", self.stats["terms"],
+                                self.stats["bytes_written"] / 2 ** 20)
+
+        bucket = get_storage(self.bucket_name)
+        for bucket_id, meta in enumerate(per_bucket):
+            if not meta["locs"]:
+                continue
+            files = {"posting_locs": meta["locs"], "posting_bounds": meta["bounds"]}
+            if self.posting_format != POSTING_FORMAT_RAW:
+                files["posting_bytes"] = meta["bytes"]
+            for name, data in files.items():
+                path = (str(Path(self.out_dir) / f"{bucket_id}_{name}.pickle") if bucket is None
+                        else f"{self.out_dir}/{bucket_id}_{name}.pickle")
+                with _open(path, "wb", bucket) as f:
+                    pickle.dump(data, f)
+        index._write_globals(self.out_dir, "index", self.bucket_name)
+        return index
+
+    def write_doc_ids(self, doc_ids) -> None:
+        """Write the ids of the indexed documents as `DOC_IDS_FILE` in `out_dir`."""
+        bucket = get_storage(self.bucket_name)
+        path = (str(Path(self.out_dir) / DOC_IDS_FILE) if bucket is None
+                else f"{self.out_dir}/{DOC_IDS_FILE}")
+        buf = io.BytesIO()
+        np.save(buf, np.unique(np.asarray(doc_ids, dtype=np.int64)))
+        with _open(path, "wb", bucket) as f:
+            f.write(buf.getvalue())
+
+    def build(self, docs: Iterable[Tuple[int, str]]) -> InvertedIndex:
+        """Invert `docs` and write the full index; returns its metadata."""
+        t0 = time.perf_counter()
+        runs_dir = Path(tempfile.mkdtemp(prefix="spimi_runs_", dir=self.tmp_dir))
+        try:
+            self.invert(docs, runs_dir)
+            index = self.merge(runs_dir)
+            self.write_doc_ids(np.concatenate(self._doc_ids) if self._doc_ids else [])
+        finally:
+            shutil.rmtree(runs_dir, ignore_errors=True)
+        elapsed = time.perf_counter() - t0
+        self.stats["seconds"] = elapsed
+        self.stats["docs_per_s"] = self.stats["docs"] / elapsed if elapsed else 0.0
+        return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the inverted index from a document dump, without Spark.")
+    parser.add_argument("inputs", nargs="+", help="JSON-lines (.jsonl, .jsonl.gz) or Parquet files")
+    parser.add_argument("out_dir", help="output directory (or prefix inside --bucket-name), e.g. postings_gcp")
+    parser.add_argument("--bucket-name", default=None, help="write into this GCS bucket instead of local disk")
+    parser.add_argument("--workers", type=int, default=0, help="tokenizer processes (0 = one per core)")
+    parser.add_argument("--memory-mb", type=int, default=1024, help="postings buffered before a run is spilled")
+    parser.add_argument("--batch-docs", type=int, default=1000)
+    parser.add_argument("--block-format", action="store_true", help="write POSTING_FORMAT_BLOCK_V1 posting lists")
+    parser.add_argument("--tmp-dir", default=None, help="where sorted runs are spilled")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--shard", type=int, default=None, help="index only this doc id shard")
+    parser.add_argument("--num-shards", type=int, default=1)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    builder = SpimiIndexBuilder(args.out_dir, bucket_name=args.bucket_name, workers=args.workers,
+                                memory_mb=args.memory_mb, batch_docs=args.batch_docs, tmp_dir=args.tmp_dir,
+                                posting_format=POSTING_FORMAT_BLOCK_V1 if args.block_format else POSTING_FORMAT_RAW)
+    docs = iter_documents(args.inputs, args.id_field, args.text_field)
+    if args.shard is not None:
+        docs = ((d, text) for d, text in docs if shard_of(d, args.num_shards) == args.shard)
+    builder.build(docs)
+    if args.shard is not None:
+        meta = {"shard": args.shard, "num_shards": args.num_shards, "docs": builder.stats["docs"]}
+        bucket = get_storage(args.bucket_name)
+        with _open(f"{args.out_dir}/{SHARD_META_FILE}", "wb", bucket) as f:
+            f.write(json.dumps(meta).encode("utf-8"))
+    print(json.dumps(builder.stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,47 @@
+import os
 import pickle
 import itertools
+import struct
 from collections import Counter, defaultdict
 from contextlib import closing
 from pathlib import Path
-from google.cloud import storage
+import numpy as np
+from storage_backend import LocalBackend, StorageBackend, gcs_client, get_backend
 
 def get_bucket(bucket_name):
     """
     Returns a GCS bucket object.
     """
-    return storage.Client().bucket(bucket_name)
+    return gcs_client().bucket(bucket_name)
+
+def get_storage(bucket_name):
+    """
+    Returns the storage backend for `bucket_name` (a GCS bucket name, an
+    http:// URL or a memory:// name, see `storage_backend`), or None for 
+    local files.
+    """
+    return None if bucket_name is None else get_backend(bucket_name)
 
 def _open(path, mode, bucket=None):
     """
-    Opens a file locally or from GCS.
+    Opens a file locally, from a storage backend or from a GCS bucket.
     """
     if bucket is None:
         return open(path, mode)
+    if isinstance(bucket, StorageBackend):
+        return bucket.open(path, mode)
     return bucket.blob(path).open(mode)
 
+def _exists(path, bucket=None):
+    """
+    Whether `path` exists locally, in a storage backend or in a GCS bucket.
+    """
+    if bucket is None:
+        return os.path.exists(path)
+    if isinstance(bucket, StorageBackend):
+        return bucket.exists(path)
+    return bucket.blob(path).exists()
+
 # Let's start with a small block size of 30 bytes just to test things out. 
 BLOCK_SIZE = 1999998
 
@@ -26,7 +49,7 @@ class MultiFileWriter:
     """ Sequential binary writer to multiple files of up to BLOCK_SIZE each. """
     def __init__(self, base_dir, name, bucket_name=None):
         self._name = name
-        self._bucket = None if bucket_name is None else get_bucket(bucket_name)
+        self._bucket = get_storage(bucket_name)
         if self._bucket is None:
             self._base_dir = Path(base_dir)
             self._file_gen = (_open(str(self._base_dir / f'{name}_{i:03}.bin'), 
@@ -59,31 +82,31 @@ class MultiFileWriter:
         self._f.close()
 
 class MultiFileReader:
-    """ Sequential binary reader of multiple files of up to BLOCK_SIZE each. """
+    """ Sequential binary reader of multiple files of up to BLOCK_SIZE each. 
+        Every part is fetched with one ranged read (`read_range`) instead of 
+        seek-then-read on a file object.
+    """
     def __init__(self, base_dir, bucket_name=None):
-        self._bucket = None if bucket_name is None else get_bucket(bucket_name)
+        self._bucket = get_storage(bucket_name)
         self._base_dir = Path(base_dir) if self._bucket is None else base_dir
-        self._open_files = {}
+        self._storage = LocalBackend() if self._bucket is None else self._bucket
 
     def read(self, locs, n_bytes):
-        b = []
+        ranges = []
         for f_name, offset in locs:
+            if n_bytes <= 0:
+                break
             if self._bucket is None:
                 f_name = str(self._base_dir / f_name)
             else:
                 f_name = f"{self._base_dir}/{f_name}"
-            if f_name not in self._open_files:
-                self._open_files[f_name] = _open(f_name, 'rb', self._bucket)
-            f = self._open_files[f_name]
-            f.seek(offset)
             n_read = min(n_bytes, BLOCK_SIZE - offset)
-            b.append(f.read(n_read))
+            ranges.append((f_name, offset, n_read))
             n_bytes -= n_read
-        return b''.join(b)
+        return b''.join(self._storage.read_ranges(ranges))
   
     def close(self):
-        for f in self._open_files.values():
-            f.close()
+        pass
 
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
@@ -92,6 +115,173 @@ class MultiFileReader:
 TUPLE_SIZE = 6       # We're going to pack the doc_id and tf values in this 
                      # many bytes.
 TF_MASK = 2 ** 16 - 1 # Masking the 16 low bits of an integer
+# A packed posting viewed as a NumPy record: 4 bytes doc_id followed by 2 bytes 
+# tf, both big-endian, exactly as written by `write_a_posting_list`.
+POSTING_DTYPE = np.dtype([('doc_id', '>u4'), ('tf', '>u2')])
+
+
+def decode_posting_arrays(b, n):
+    """ Decodes `n` packed postings from the buffer `b` (bytes, bytearray or 
+        memoryview) into a (doc_ids:uint32[n], tfs:uint16[n]) pair of arrays 
+        without any per-posting Python work.
+    """
+    if n <= 0:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16)
+    records = np.frombuffer(b, dtype=POSTING_DTYPE, count=n)
+    return records['doc_id'].astype(np.uint32), records['tf'].astype(np.uint16)
+
+
+def arrays_to_posting_list(doc_ids, tfs):
+    """ Converts decoded posting arrays back to a [(doc_id:int, tf:int), ...] 
+        list for callers that still expect tuples.
+    """
+    return list(zip(doc_ids.tolist(), tfs.tolist()))
+
+
+# On-disk posting formats. Indexes pickled before `posting_format` existed are
+# POSTING_FORMAT_RAW: fixed 6-byte (doc_id, tf) tuples.
+POSTING_FORMAT_RAW = 0
+# Blocks of up to BLOCK_POSTINGS postings with doc ids sorted and gap-encoded.
+# A posting list starts with a 4-byte block count and a directory holding one
+# header per block (n, first_doc_id, last_doc_id, gap_bits, tf_bits, max_tf),
+# followed by the block payloads: the n-1 gaps and the n tf values, each 
+# section bit-packed with its own width and padded to a whole byte. The
+# directory alone locates every payload, so blocks can be skipped (or decoded)
+# without touching the others.
+POSTING_FORMAT_BLOCK_V1 = 1
+BLOCK_POSTINGS = 128
+BLOCK_COUNT = struct.Struct('>I')
+BLOCK_HEADER = struct.Struct('>HIIBBI')
+BLOCK_HEADER_DTYPE = np.dtype([('n', '>u2'), ('first', '>u4'), ('last', '>u4'),
+                               ('gap_bits', 'u1'), ('tf_bits', 'u1'), ('max_tf', '>u4')])
+
+
+def _bit_width(max_value):
+    return int(max_value).bit_length()
+
+
+def _pack_bits(values, bits):
+    """ Packs non-negative ints into `bits` bits each, MSB first, byte padded. """
+    if bits == 0 or len(values) == 0:
+        return b''
+    shifts = np.arange(bits - 1, -1, -1, dtype=np.uint64)
+    bitmat = (values.astype(np.uint64)[:, None] >> shifts) & np.uint64(1)
+    return np.packbits(bitmat.astype(np.uint8).ravel()).tobytes()
+
+
+def _section_len(count, bits):
+    return (count * bits + 7) // 8
+
+
+def encode_block_postings(doc_ids, tfs):
+    """ Encodes a posting list (arrays or sequences of doc ids and tfs) in 
+        POSTING_FORMAT_BLOCK_V1. Postings are sorted by doc id first.
+    """
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    tfs = np.asarray(tfs, dtype=np.int64)
+    order = np.argsort(doc_ids, kind='stable')
+    doc_ids, tfs = doc_ids[order], tfs[order]
+    headers, payloads = [], []
+    for start in range(0, len(doc_ids), BLOCK_POSTINGS):
+        d = doc_ids[start:start + BLOCK_POSTINGS]
+        t = tfs[start:start + BLOCK_POSTINGS]
+        gaps = np.diff(d)
+        gap_bits = _bit_width(gaps.max()) if len(gaps) else 0
+        max_tf = int(t.max())
+        tf_bits = _bit_width(max_tf)
+        headers.append(BLOCK_HEADER.pack(len(d), int(d[0]), int(d[-1]), gap_bits, tf_bits, max_tf))
+        payloads.append(_pack_bits(gaps, gap_bits))
+        payloads.append(_pack_bits(t, tf_bits))
+    return BLOCK_COUNT.pack(len(headers)) + b''.join(headers) + b''.join(payloads)
+
+
+def read_block_headers(b):
+    """ Reads the block directory of a POSTING_FORMAT_BLOCK_V1 posting list.
+        Returns (headers, gap_offsets, tf_offsets): a structured array with 
+        fields n, first, last, gap_bits, tf_bits and max_tf, and the byte 
+        offsets of every block's gap and tf sections in `b`.
+    """
+    if len(b) < BLOCK_COUNT.size:
+        return np.empty(0, dtype=BLOCK_HEADER_DTYPE), np.empty(0, np.int64), np.empty(0, np.int64)
+    n_blocks = BLOCK_COUNT.unpack_from(b, 0)[0]
+    headers = np.frombuffer(b, dtype=BLOCK_HEADER_DTYPE, count=n_blocks, offset=BLOCK_COUNT.size)
+    n = headers['n'].astype(np.int64)
+    gap_len = ((n - 1) * headers['gap_bits'] + 7) // 8
+    tf_len = (n * headers['tf_bits'] + 7) // 8
+    block_len = gap_len + tf_len
+    payload_start = BLOCK_COUNT.size + n_blocks * BLOCK_HEADER.size
+    gap_offsets = payload_start + np.concatenate(([0], np.cumsum(block_len)[:-1])).astype(np.int64)
+    return headers, gap_offsets, gap_offsets + gap_len
+
+
+def _unpack_into(buf, out, out_starts, offsets, counts, bits):
+    """ Unpacks bit-packed sections into `out[out_starts[i]:out_starts[i] + 
+        counts[i]]`. Sections of the same (count, bits) shape are unpacked 
+        together: every value is read from the 5 bytes that cover it (widths
+        are at most 32 bits) and shifted into place.
+    """
+    keys = counts.astype(np.int64) * 64 + bits
+    for key in np.unique(keys):
+        count, width = int(key // 64), int(key % 64)
+        if count == 0:
+            continue
+        sel = np.nonzero(keys == key)[0]
+        dst = (out_starts[sel][:, None] + np.arange(count)).ravel()
+        if width == 0:
+            out[dst] = 0
+            continue
+        local_bits = np.arange(count, dtype=np.int64) * width
+        byte_pos = offsets[sel][:, None] + (local_bits >> 3)
+        # gather the covering bytes into the low 5 bytes of big-endian words
+        window = np.zeros((len(sel), count, 8), dtype=np.uint8)
+        for i in range(5):
+            window[:, :, 3 + i] = buf[byte_pos + i]
+        words = window.view('>u8')[:, :, 0]
+        shift = (40 - width - (local_bits & 7)).astype(np.uint64)
+        out[dst] = ((words >> shift) & np.uint64((1 << width) - 1)).ravel()
+
+
+def decode_block_postings(b):
+    """ Decodes a POSTING_FORMAT_BLOCK_V1 posting list into a 
+        (doc_ids:uint32, tfs:uint32) pair of arrays.
+    """
+    headers, gap_offsets, tf_offsets = read_block_headers(b)
+    if len(headers) == 0:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+    # pad so the 5-byte window of the last value never runs past the end
+    buf = np.concatenate((np.frombuffer(b, dtype=np.uint8), np.zeros(5, dtype=np.uint8)))
+    n = headers['n'].astype(np.int64)
+    starts = np.concatenate(([0], np.cumsum(n)[:-1]))
+    total = int(n.sum())
+
+    # deltas hold the first posting of each block as its distance from the 
+    # previous block's last doc id, so one cumsum restores every doc id
+    deltas = np.empty(total, dtype=np.int64)
+    first = headers['first'].astype(np.int64)
+    last = headers['last'].astype(np.int64)
+    deltas[starts] = first - np.concatenate(([0], last[:-1]))
+    _unpack_into(buf, deltas, starts + 1, gap_offsets, n - 1, headers['gap_bits'])
+    tfs = np.empty(total, dtype=np.uint32)
+    _unpack_into(buf, tfs, starts, tf_offsets, n, headers['tf_bits'])
+    return np.cumsum(deltas).astype(np.uint32), tfs
+
+
+def compute_posting_bounds(doc_ids, tfs):
+    """ Per-block tf bounds of a posting list, used for dynamic pruning.
+        The list is split into blocks of BLOCK_POSTINGS postings in doc id 
+        order; returns (block_last_doc_ids:uint32, block_max_tfs:uint32).
+        BM25 (with b=0) grows with tf, so the largest tf of a block bounds the 
+        score of every posting in it once idf and query weight are known.
+    """
+    doc_ids = np.asarray(doc_ids, dtype=np.int64)
+    tfs = np.asarray(tfs, dtype=np.int64)
+    if len(doc_ids) == 0:
+        return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint32)
+    order = np.argsort(doc_ids, kind='stable')
+    doc_ids, tfs = doc_ids[order], tfs[order]
+    starts = np.arange(0, len(doc_ids), BLOCK_POSTINGS)
+    ends = np.minimum(starts + BLOCK_POSTINGS, len(doc_ids)) - 1
+    return doc_ids[ends].astype(np.uint32), np.maximum.reduceat(tfs, starts).astype(np.uint32)
 
 
 class InvertedIndex:  
@@ -116,6 +306,13 @@ class InvertedIndex:
         # the number of bytes from the beginning of the file where the posting list
         # starts. 
         self.posting_locs = defaultdict(list)
+        # on-disk layout of the posting files, see POSTING_FORMAT_* above
+        self.posting_format = POSTING_FORMAT_RAW
+        # byte length of each posting list; only needed for formats where it 
+        # cannot be derived from df
+        self.posting_bytes = {}
+        # per-block tf bounds of each posting list, see `compute_posting_bounds`
+        self.posting_bounds = {}
 
         for doc_id, tokens in docs.items():
             self.add_doc(doc_id, tokens)
@@ -136,14 +333,14 @@ class InvertedIndex:
             (1) `name`.pkl containing the global term stats (e.g. df).
         """
         #### GLOBAL DICTIONARIES ####
-        bucket = None if bucket_name is None else get_bucket(bucket_name)
+        bucket = get_storage(bucket_name)
         if bucket is None:
             path = str(Path(base_dir) / f'{name}.pkl')
         else:
             path = f"{base_dir}/{name}.pkl"
     def _write_globals(self, base_dir, name, bucket_name):
         path = str(Path(base_dir) / f'{name}.pkl')
-        bucket = None if bucket_name is None else get_bucket(bucket_name)
+        bucket = get_storage(bucket_name)
         with _open(path, 'wb', bucket) as f:
             pickle.dump(self, f)
 
@@ -155,49 +352,92 @@ class InvertedIndex:
         del state['_posting_list']
         return state
 
+    def posting_arrays_iter(self, base_dir, bucket_name=None):
+        """ A generator that reads one posting list from disk at a time and 
+            yields a (word:str, (doc_ids, tfs)) tuple of arrays.
+        """
+        with closing(MultiFileReader(base_dir, bucket_name)) as reader:
+            for w, locs in self.posting_locs.items():
+                b = reader.read(locs, self.posting_n_bytes(w))
+                yield w, self.decode_posting_bytes(w, b)
+
     def posting_lists_iter(self, base_dir, bucket_name=None):
         """ A generator that reads one posting list from disk and yields 
             a (word:str, [(doc_id:int, tf:int), ...]) tuple.
         """
-        with closing(MultiFileReader(base_dir, bucket_name)) as reader:
-            for w, locs in self.posting_locs.items():
-                b = reader.read(locs, self.df[w] * TUPLE_SIZE)
-                posting_list = []
-                for i in range(self.df[w]):
-                    doc_id = int.from_bytes(b[i*TUPLE_SIZE:i*TUPLE_SIZE+4], 'big')
-                    tf = int.from_bytes(b[i*TUPLE_SIZE+4:(i+1)*TUPLE_SIZE], 'big')
-                    posting_list.append((doc_id, tf))
-                yield w, posting_list
+        for w, arrays in self.posting_arrays_iter(base_dir, bucket_name):
+            yield w, arrays_to_posting_list(*arrays)
 
     def read_a_posting_list(self, base_dir, w, bucket_name=None):
-        posting_list = []
         if not w in self.posting_locs:
-            return posting_list
-        with closing(MultiFileReader(base_dir, bucket_name)) as reader:
-            locs = self.posting_locs[w]
-            b = reader.read(locs, self.df[w] * TUPLE_SIZE)
-            for i in range(self.df[w]):
-                doc_id = int.from_bytes(b[i*TUPLE_SIZE:i*TUPLE_SIZE+4], 'big')
-                tf = int.from_bytes(b[i*TUPLE_SIZE+4:(i+1)*TUPLE_SIZE], 'big')
-                posting_list.append((doc_id, tf))
-        return posting_list
+            return []
+        return arrays_to_posting_list(
+            *self.read_a_posting_list_arrays(base_dir, w, bucket_name))
+
+    def posting_n_bytes(self, w):
+        """ Number of bytes the posting list of `w` occupies on disk. Raises
+            KeyError when a block-format index has no length recorded for 
+            `w` (its `_posting_bytes` files were never loaded).
+        """
+        if getattr(self, 'posting_format', POSTING_FORMAT_RAW) == POSTING_FORMAT_RAW:
+            return self.df[w] * TUPLE_SIZE
+        if w not in self.posting_bytes:
+            raise KeyError(f"no posting length recorded for {w!r} in a block-format index")
+        return self.posting_bytes[w]
+
+    def decode_posting_bytes(self, w, b):
+        """ Decodes the raw bytes of the posting list of `w` into arrays. """
+        if getattr(self, 'posting_format', POSTING_FORMAT_RAW) == POSTING_FORMAT_RAW:
+            return decode_posting_arrays(b, self.df[w])
+        return decode_block_postings(b)
+
+    def term_bounds(self, w):
+        """ (block_last_doc_ids, block_max_tfs) of `w`, or None when the index
+            was written without bounds.
+        """
+        return getattr(self, 'posting_bounds', {}).get(w)
+
+    def read_a_posting_list_arrays(self, base_dir, w, bucket_name=None, reader=None):
+        """ Reads the posting list of `w` and returns it as a pair of arrays
+            (doc_ids:uint32, tfs:uint16). Unknown terms yield empty arrays.
+            A long-lived `reader` (anything with a `read(locs, n_bytes)` 
+            method) can be passed in; it is used as is and left open.
+        """
+        if not w in self.posting_locs:
+            return decode_posting_arrays(b'', 0)
+        locs = self.posting_locs[w]
+        if reader is not None:
+            b = reader.read(locs, self.posting_n_bytes(w))
+        else:
+            with closing(MultiFileReader(base_dir, bucket_name)) as reader:
+                b = reader.read(locs, self.posting_n_bytes(w))
+        return self.decode_posting_bytes(w, b)
 
     @staticmethod
-    def write_a_posting_list(b_w_pl, base_dir, bucket_name=None):
+    def write_a_posting_list(b_w_pl, base_dir, bucket_name=None, posting_format=POSTING_FORMAT_RAW):
         posting_locs = defaultdict(list)
+        posting_bytes = {}
+        bounds = {}
         bucket_id, list_w_pl = b_w_pl
         
         with closing(MultiFileWriter(base_dir, bucket_id, bucket_name)) as writer:
             for w, pl in list_w_pl: 
                 # convert to bytes
-                b = b''.join([(doc_id << 16 | (tf & TF_MASK)).to_bytes(TUPLE_SIZE, 'big')
-                              for doc_id, tf in pl])
+                if posting_format == POSTING_FORMAT_BLOCK_V1:
+                    b = encode_block_postings([doc_id for doc_id, _ in pl], [tf for _, tf in pl])
+                    posting_bytes[w] = len(b)
+                else:
+                    # same bytes as (doc_id << 16 | (tf & TF_MASK)).to_bytes(TUPLE_SIZE, 'big')
+                    b = np.rec.fromarrays([np.array([doc_id for doc_id, _ in pl], dtype=np.uint32),
+                                           np.array([tf & TF_MASK for _, tf in pl], dtype=np.uint16)],
+                                          dtype=POSTING_DTYPE).tobytes()
                 # write to file(s)
                 locs = writer.write(b)
                 # save file locations to index
                 posting_locs[w].extend(locs)
+                bounds[w] = compute_posting_bounds([doc_id for doc_id, _ in pl], [tf for _, tf in pl])
             
-            bucket = None if bucket_name is None else get_bucket(bucket_name)
+            bucket = get_storage(bucket_name)
             if bucket is None:
                 path = str(Path(base_dir) / f'{bucket_id}_posting_locs.pickle')
             else:
@@ -205,16 +445,84 @@ class InvertedIndex:
             
             with _open(path, 'wb', bucket) as f:
                 pickle.dump(posting_locs, f)
+
+            # block formats also need the byte length of every posting list
+            if posting_format != POSTING_FORMAT_RAW:
+                with _open(path.replace('_posting_locs.pickle', '_posting_bytes.pickle'), 'wb', bucket) as f:
+                    pickle.dump(posting_bytes, f)
+            # score bounds for dynamic pruning live next to the locations
+            with _open(path.replace('_posting_locs.pickle', '_posting_bounds.pickle'), 'wb', bucket) as f:
+                pickle.dump(bounds, f)
         return bucket_id
 
+    def read_posting_metadata(self, base_dir, bucket_ids, bucket_name=None):
+        """ Merges the per-bucket files that `write_a_posting_list` wrote for
+            `bucket_ids` into this index: `{bucket_id}_posting_locs.pickle`
+            into `posting_locs` and, for block formats, 
+            `{bucket_id}_posting_bytes.pickle` into `posting_bytes`, which 
+            also sets `posting_format`. All buckets must share one format.
+            `{bucket_id}_posting_bounds.pickle`, when present, goes into 
+            `posting_bounds`, the block bounds used for dynamic pruning.
+        """
+        bucket = get_storage(bucket_name)
+        formats = set()
+        for bucket_id in bucket_ids:
+            if bucket is None:
+                path = str(Path(base_dir) / f'{bucket_id}_posting_locs.pickle')
+            else:
+                path = f"{base_dir}/{bucket_id}_posting_locs.pickle"
+            with _open(path, 'rb', bucket) as f:
+                self.posting_locs.update(pickle.load(f))
+            bytes_path = path.replace('_posting_locs.pickle', '_posting_bytes.pickle')
+            if _exists(bytes_path, bucket):
+                with _open(bytes_path, 'rb', bucket) as f:
+                    self.posting_bytes.update(pickle.load(f))
+                formats.add(POSTING_FORMAT_BLOCK_V1)
+            else:
+                formats.add(POSTING_FORMAT_RAW)
+            bounds_path = path.replace('_posting_locs.pickle', '_posting_bounds.pickle')
+            if _exists(bounds_path, bucket):
+                with _open(bounds_path, 'rb', bucket) as f:
+                    self.posting_bounds.update(pickle.load(f))
+        if len(formats) > 1:
+            raise ValueError(f"buckets under {base_dir} mix raw and block posting formats")
+        if formats:
+            self.posting_format = formats.pop()
+
+    def convert_posting_format(self, src_base_dir, dst_base_dir, name='index', bucket_name=None,
+                               posting_format=POSTING_FORMAT_BLOCK_V1):
+        """ Rewrites all posting lists of this index into `dst_base_dir` using
+            `posting_format` and writes the matching `name`.pkl there. The 
+            source files are left untouched, so the old index stays readable.
+            Returns the converted InvertedIndex.
+        """
+        converted = InvertedIndex()
+        converted.df = self.df
+        converted.term_total = self.term_total
+        converted.posting_format = posting_format
+        with closing(MultiFileWriter(dst_base_dir, f'{name}_v{posting_format}', bucket_name)) as writer:
+            for w, (doc_ids, tfs) in self.posting_arrays_iter(src_base_dir, bucket_name):
+                if posting_format == POSTING_FORMAT_BLOCK_V1:
+                    b = encode_block_postings(doc_ids, tfs)
+                else:
+                    b = np.rec.fromarrays([doc_ids, tfs], dtype=POSTING_DTYPE).tobytes()
+                converted.posting_bytes[w] = len(b)
+                converted.posting_bounds[w] = compute_posting_bounds(doc_ids, tfs)
+                # keep locations relative to dst_base_dir like the reader expects
+                locs = [(Path(f_name).name, offset) for f_name, offset in writer.write(b)]
+                converted.posting_locs[w].extend(locs)
+        if posting_format == POSTING_FORMAT_RAW:
+            converted.posting_bytes = {}
+        converted._write_globals(dst_base_dir, name, bucket_name)
+        return converted
 
     @staticmethod
     def read_index(base_dir, name, bucket_name=None):
-        bucket = None if bucket_name is None else get_bucket(bucket_name)
+        bucket = get_storage(bucket_name)
         if bucket is None:
             path = str(Path(base_dir) / f'{name}.pkl')
         else:
             path = f"{base_dir}/{name}.pkl"
-        bucket = None if bucket_name is None else get_bucket(bucket_name)
+        bucket = get_storage(bucket_name)
         with _open(path, 'rb', bucket) as f:
             return pickle.load(f)
\ No newline at end of file
@@ -1,8 +1,31 @@
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 import math
 
+import numpy as np
+
 
 class BM25:
+    # BM25 parameters (b=0 assuming no length normalization info available)
+    K1 = 1.5
+
+    @staticmethod
+    def idf(df: int, N: int) -> float:
+        """Standard idf = log2(N / df); 0.0 for terms that match nothing."""
+        if N <= 0 or df <= 0:
+            return 0.0
+        return math.log2(N / df)
+
+    @staticmethod
+    def term_scores(tfs, idf: float, k1: Optional[float] = None):
+        """
+        Vectorized BM25 term scores for an array of tf values, performing the
+        same float operations, in the same order, as `compute`. `k1`
+        overrides `K1` (parameter sweeps).
+        """
+        tf_val = np.asarray(tfs, dtype=np.float64)
+        k1 = BM25.K1 if k1 is None else k1
+        return (tf_val * (k1 + 1)) / (tf_val + k1) * idf
+
     @staticmethod
     def compute(postings: Dict[str, List[Tuple[int, int]]], df_map: Dict[str, int], N: int) -> Dict[int, Dict[str, float]]:
         """
@@ -31,8 +54,7 @@ class BM25:
                 # standard idf = log2(N / df)
                 idf = math.log2(N / df) if df > 0 else 0.0
             
-            # BM25 parameters (b=0 assuming no length normalization info available)
-            k1 = 1.5
+            k1 = BM25.K1
 
             for doc_id, tf in posting_list:
                 try:
@@ -0,0 +1,199 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from inverted_index_gcp import BLOCK_POSTINGS, compute_posting_bounds
+from .bm25 import BM25
+
+# Relative slack added to every upper bound, so float rounding in the bound
+# arithmetic can never prune a document that belongs in the top-k.
+BOUND_SLACK = 1e-9
+
+
+class _Term:
+    __slots__ = ("term", "order", "qw", "idf", "doc_ids", "tfs", "positions", "block_last", "block_tf", "block_ub",
+                 "ub")
+
+
+class MaxScore:
+    """
+    Exact top-k BM25 retrieval with MaxScore / block-max pruning.
+
+    Each term gets an upper bound on its contribution (query weight * idf *
+    BM25 of its largest tf) and every block of BLOCK_POSTINGS postings gets
+    the same bound over the block's largest tf. A threshold is seeded by
+    exactly scoring the highest-tf postings of the blocks with the largest
+    stored bounds; terms whose bounds add up to less than the threshold are
+    non-essential, so only documents from the essential (rare, high-idf)
+    lists are candidates. The non-essential lists are then probed with
+    binary search, from the largest bound down, and candidates are dropped
+    as soon as their block-max bound falls below the threshold.
+
+    The postings arrive fully fetched and decoded (they are shared with the
+    posting cache and the other ranking paths), so pruning saves scoring
+    work only: common terms are never accumulated over, but their I/O and
+    decode cost is unchanged.
+
+    Documents are processed in vectorized batches rather than one at a
+    time, since per-posting Python loops would cost more than the pruning
+    saves. Scores are summed in query-term order with the same float
+    operations as `BM25.compute` + `ScoreAccumulator.aggregate_scores`, and
+    ties keep the order in which those would insert documents, so the
+    result equals `SearchController.rank_top_k` over the full text scores.
+    """
+
+    @staticmethod
+    def _prepare(postings, query_w, df_map, N, bounds) -> List[_Term]:
+        terms = []
+        for order, (term, arrays) in enumerate(postings.items()):
+            if term not in query_w or arrays is None or len(arrays[0]) == 0:
+                continue
+            doc_ids = np.asarray(arrays[0], dtype=np.int64)
+            tfs = np.asarray(arrays[1])
+            t = _Term()
+            t.term = term
+            t.order = order
+            t.qw = float(query_w[term])
+            t.idf = BM25.idf(int(df_map.get(term, len(doc_ids))), N)
+            if len(doc_ids) > 1 and not (np.diff(doc_ids) > 0).all():
+                t.positions = np.argsort(doc_ids, kind="stable")
+                doc_ids, tfs = doc_ids[t.positions], tfs[t.positions]
+            else:
+                t.positions = None
+            t.doc_ids, t.tfs = doc_ids, tfs
+
+            tb = (bounds or {}).get(term)
+            if tb is None:
+                tb = compute_posting_bounds(doc_ids, tfs)
+            t.block_last = np.asarray(tb[0], dtype=np.int64)
+            t.block_tf = np.asarray(tb[1], dtype=np.int64)
+            t.block_ub = np.maximum(t.qw * BM25.term_scores(t.block_tf, t.idf), 0.0) * (1 + BOUND_SLACK)
+            t.ub = float(t.block_ub.max())
+            terms.append(t)
+        return terms
+
+    @staticmethod
+    def _seed_docs(t: _Term, k: int) -> np.ndarray:
+        """The ~k highest-tf doc ids of `t`, looking only inside the blocks with the largest max tf."""
+        n_blocks = len(t.block_tf)
+        if n_blocks != -(-len(t.doc_ids) // BLOCK_POSTINGS):
+            # bounds from a different blocking: scan the whole list
+            tfs, doc_ids = t.tfs, t.doc_ids
+        else:
+            n_top = min(n_blocks, -(-k // BLOCK_POSTINGS) + 1)
+            blocks = np.argpartition(-t.block_tf, n_top - 1)[:n_top]
+            pos = (blocks[:, None] * BLOCK_POSTINGS + np.arange(BLOCK_POSTINGS)).ravel()
+            pos = pos[pos < len(t.doc_ids)]
+            tfs, doc_ids = t.tfs[pos], t.doc_ids[pos]
+        m = min(k, len(tfs))
+        return doc_ids[np.argpartition(-tfs.astype(np.int64), m - 1)[:m]]
+
+    @staticmethod
+    def _lookup(t: _Term, docs: np.ndarray):
+        """Return (present mask, posting index) of `docs` in the term's list."""
+        idx = np.searchsorted(t.doc_ids, docs)
+        idx_c = np.minimum(idx, len(t.doc_ids) - 1)
+        present = (idx < len(t.doc_ids)) & (t.doc_ids[idx_c] == docs)
+        return present, idx_c
+
+    @staticmethod
+    def _contribution(t: _Term, docs: np.ndarray) -> np.ndarray:
+        present, idx = MaxScore._lookup(t, docs)
+        contrib = t.qw * BM25.term_scores(t.tfs[idx], t.idf)
+        return np.where(present, contrib, 0.0)
+
+    @staticmethod
+    def _block_bound(t: _Term, docs: np.ndarray) -> np.ndarray:
+        blk = np.searchsorted(t.block_last, docs)
+        inside = blk < len(t.block_last)
+        return np.where(inside, t.block_ub[np.minimum(blk, len(t.block_ub) - 1)], 0.0)
+
+    @staticmethod
+    def _exact_scores(terms: List[_Term], sum_order: List[_Term], docs: np.ndarray) -> np.ndarray:
+        # same summation order as ScoreAccumulator: 0.0 + each query term in turn
+        scores = np.zeros(len(docs), dtype=np.float64)
+        for t in sum_order:
+            scores = scores + MaxScore._contribution(t, docs)
+        return scores
+
+    @staticmethod
+    def _rank(terms: List[_Term], docs: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        # ties are broken by first insertion into BM25.compute's dict: the
+        # first term (in postings order) holding the doc, then its position
+        first_term = np.full(len(docs), len(terms), dtype=np.int64)
+        first_pos = np.zeros(len(docs), dtype=np.int64)
+        for t in sorted(terms, key=lambda t: t.order, reverse=True):
+            present, idx = MaxScore._lookup(t, docs)
+            first_term[present] = t.order
+            first_pos[present] = idx[present] if t.positions is None else t.positions[idx[present]]
+        top = np.lexsort((first_pos, first_term, -scores))[:k]
+        return list(zip(docs[top].tolist(), scores[top].tolist()))
+
+    @staticmethod
+    def top_k(postings: Dict[str, Tuple[np.ndarray, np.ndarray]], query_w: Dict[str, float], df_map: Dict[str, int],
+              N: int, k: int = 100, bounds: Optional[Dict[str, tuple]] = None,
+              stats: Optional[Dict] = None) -> List[Tuple[int, float]]:
+        """
+        Return the top-k [(doc_id, score), ...] by aggregated BM25 score.
+
+        Parameters:
+        - postings: dict term -> (doc_ids, tfs) arrays, in query-token order
+        - query_w: dict term -> query weight, as built by the controller
+        - df_map: dict term -> document frequency
+        - N: corpus size
+        - bounds: optional dict term -> (block_last_doc_ids, block_max_tfs)
+          as stored in the index; computed from the postings when missing
+        - stats: optional dict that is filled with pruning counters
+        """
+        if N <= 0 or k <= 0 or not postings or not query_w:
+            return []
+        terms = MaxScore._prepare(postings, query_w, df_map, N, bounds)
+        if not terms:
+            return []
+        q_order = {term: i for i, term in enumerate(query_w)}
+        sum_order = sorted(terms, key=lambda t: q_order[t.term])
+
+        # 1. seed the threshold with the exact scores of each term's best
+        # postings; any real documents give a valid (lower) threshold
+        seeds = np.unique(np.concatenate([MaxScore._seed_docs(t, k) for t in terms]))
+        seed_scores = MaxScore._exact_scores(terms, sum_order, seeds)
+        theta = float(np.partition(seed_scores, len(seeds) - k)[len(seeds) - k]) if len(seeds) >= k else -np.inf
+
+        # 2. split terms into non-essential (bounds sum below theta) and essential
+        by_ub = sorted(terms, key=lambda t: t.ub)
+        n_non_essential, acc = 0, 0.0
+        for t in by_ub:
+            if acc + t.ub >= theta:
+                break
+            acc += t.ub
+            n_non_essential += 1
+        # the seed docs reach theta, so at least one term is always essential
+        n_non_essential = min(n_non_essential, len(by_ub) - 1)
+        non_essential, essential = by_ub[:n_non_essential], by_ub[n_non_essential:]
+
+        # 3. candidates come from essential lists only; probe the rest lazily
+        docs = np.unique(np.concatenate([t.doc_ids for t in essential]))
+        partial = np.zeros(len(docs), dtype=np.float64)
+        for t in essential:
+            partial += MaxScore._contribution(t, docs)
+        remaining = [MaxScore._block_bound(t, docs) for t in non_essential]
+        rest = np.sum(remaining, axis=0) if remaining else np.zeros(len(docs))
+        for t in reversed(non_essential):
+            keep = (partial + rest) * (1 + BOUND_SLACK) >= theta
+            docs, partial, rest = docs[keep], partial[keep], rest[keep]
+            rest = rest - MaxScore._block_bound(t, docs)
+            partial = partial + MaxScore._contribution(t, docs)
+        keep = (partial + np.maximum(rest, 0.0)) * (1 + BOUND_SLACK) >= theta
+        docs = docs[keep]
+
+        # 4. exact scores and ordering for the survivors
+        scores = MaxScore._exact_scores(terms, sum_order, docs)
+        if stats is not None:
+            stats.update({
+                "postings": int(sum(len(t.doc_ids) for t in terms)),
+                "essential_postings": int(sum(len(t.doc_ids) for t in essential)),
+                "essential_terms": len(essential),
+                "threshold": theta,
+                "scored": int(len(docs)),
+            })
+        return MaxScore._rank(terms, docs, scores, k)
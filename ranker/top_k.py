@@ -0,0 +1,46 @@
+import heapq
+from operator import itemgetter
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+class TopK:
+    """
+    Top-k selection without sorting the whole candidate set.
+
+    Both methods return the same order as
+    `sorted(..., key=score, reverse=True)[:k]`: highest score first, ties
+    kept in their original (insertion / array) order.
+    """
+
+    @staticmethod
+    def from_dict(scores: Dict[int, float], k: int) -> List[Tuple[int, float]]:
+        """
+        Bounded-heap selection over a doc_id -> score dict, O(n log k).
+
+        `heapq.nlargest` is documented to be equivalent to
+        `sorted(iterable, key=key, reverse=True)[:k]`, ties included.
+        """
+        if not scores or k <= 0:
+            return []
+        return heapq.nlargest(k, scores.items(), key=itemgetter(1))
+
+    @staticmethod
+    def from_arrays(doc_ids: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        `argpartition` selection over parallel (doc_ids, scores) arrays,
+        O(n + k log k). Returns the selected (doc_ids, scores) arrays.
+        """
+        n = len(scores)
+        if n == 0 or k <= 0:
+            return doc_ids[:0], scores[:0]
+        if k < n:
+            # every candidate tied with the k-th score is kept, so the stable
+            # sort below can break ties by original position
+            kth = np.partition(scores, n - k)[n - k]
+            idx = np.nonzero(scores >= kth)[0]
+        else:
+            idx = np.arange(n)
+        order = idx[np.argsort(-scores[idx], kind="stable")][:k]
+        return doc_ids[order], scores[order]
@@ -1,6 +1,19 @@
-from flask import Flask, request, jsonify
+import logging
+import os
+import sys
+import tempfile
+
+if __name__ == '__main__' and '--startup-profile' in sys.argv[1:]:
+    # profile a fresh interpreter instead of loading everything here first
+    from telemetry.startup import main as startup_profile
+    sys.exit(startup_profile([a for a in sys.argv[1:] if a != '--startup-profile']))
+
+from flask import Flask, Response, request, jsonify
 
 from controllers.SearchController import SearchController
+from controllers.query_cache import QueryResultCache
+from data_provider.data_provider import DataProvider, ProviderNotReady
+from telemetry.metrics import METRICS
 
 
 class MyFlaskApp(Flask):
@@ -12,7 +25,85 @@ app.config['JSONIFY_PRETTYPRINT_REGULAR'] = False
 
 
 BUCKET_NAME = "ir-maor-2025-bucket"
-controller = SearchController(bucket_name=BUCKET_NAME)
+# a local directory with the bucket layout (postings_gcp/, pr/, id_to_title/)
+# to serve instead of the bucket, e.g. a dataset from benchmarks.dataset
+DATA_DIR = os.environ.get("IR_DATA_DIR")
+# optional local directories for the memory-mapped structures: the lexicon
+# (built from index.pkl on the first start), the posting mirror, and the
+# PageRank and title stores
+LEXICON_DIR = os.environ.get("IR_LEXICON_DIR")
+LOCAL_MIRROR_DIR = os.environ.get("IR_LOCAL_MIRROR_DIR")
+PR_STORE_DIR = os.environ.get("IR_PR_STORE_DIR")
+TITLES_STORE_DIR = os.environ.get("IR_TITLES_STORE_DIR")
+# decoded posting list cache per process, in MB (0 disables it)
+POSTING_CACHE_MB = int(os.environ.get("IR_POSTING_CACHE_MB", "256"))
+# seconds a query waits for a provider that is still loading before a 503
+READY_WAIT_SECONDS = 5.0
+# directory where pre-forked workers share their metrics (a temporary one if unset)
+METRICS_DIR = os.environ.get("IR_METRICS_DIR")
+# largest k accepted by /batch_search
+MAX_BATCH_K = 1000
+# result cache: entries kept in memory, their lifetime, and the SQLite file
+# that keeps them across restarts (None for memory only)
+RESULT_CACHE_ENTRIES = int(os.environ.get("IR_RESULT_CACHE_ENTRIES", "10000"))  # 0 disables it
+RESULT_CACHE_TTL = 3600.0
+RESULT_CACHE_PATH = os.environ.get("IR_RESULT_CACHE_PATH")
+
+logging.basicConfig(level=logging.INFO)
+# providers load in the background so the server binds its port right away
+provider_options = dict(lazy=True, wait_timeout=READY_WAIT_SECONDS, lexicon_dir=LEXICON_DIR,
+                        local_mirror_dir=LOCAL_MIRROR_DIR, pr_store_dir=PR_STORE_DIR,
+                        titles_store_dir=TITLES_STORE_DIR, cache_bytes=POSTING_CACHE_MB * 2 ** 20)
+if DATA_DIR is None:
+    data_provider = DataProvider(bucket_name=BUCKET_NAME, **provider_options)
+else:
+    data_provider = DataProvider(bucket_name=None, postings_subdir=f"{DATA_DIR}/postings_gcp", pr_subdir=f"{DATA_DIR}/pr",
+                                 titles_subdir=f"{DATA_DIR}/id_to_title", **provider_options)
+result_cache = None
+if RESULT_CACHE_ENTRIES > 0:
+    result_cache = QueryResultCache(max_entries=RESULT_CACHE_ENTRIES, ttl=RESULT_CACHE_TTL, disk_path=RESULT_CACHE_PATH)
+controller = SearchController(bucket_name=BUCKET_NAME, data_provider=data_provider, result_cache=result_cache)
+
+
+def _cache_gauges():
+    out = {}
+    if result_cache is not None:
+        out.update({(("cache", "result"), ("field", k)): v for k, v in result_cache.stats().items()})
+    index = data_provider.index_provider if data_provider.readiness()["index"] == "ready" else None
+    if index is not None and getattr(index, "cache", None) is not None:
+        out.update({(("cache", "posting"), ("field", k)): v for k, v in index.cache.stats().items()})
+    return out
+
+
+METRICS.gauge("ir_cache", "Result and posting cache counters and sizes.", _cache_gauges)
+METRICS.gauge("ir_provider_ready", "1 once a data provider is loaded.",
+              lambda: {(("provider", name),): int(state == "ready") for name, state in data_provider.readiness().items()})
+
+
+@app.route("/ready")
+def ready():
+    ''' Readiness probe: 200 once every data structure is loaded, 503 before.
+        The body maps each provider to "loading", "ready" or "failed" and
+        carries the load time/memory of the providers loaded so far.
+    '''
+    body = {"providers": data_provider.readiness(), "load_stats": dict(data_provider.load_stats)}
+    return jsonify(body), (200 if data_provider.is_ready() else 503)
+
+
+@app.route("/cache_stats")
+def cache_stats():
+    ''' Hit/miss counters and hit rate of the query result cache. '''
+    return jsonify(result_cache.stats() if result_cache is not None else {})
+
+
+@app.route("/metrics")
+def metrics():
+    ''' Prometheus metrics: per-stage and per-query latency
+        histograms, candidate set sizes, postings scored, posting bytes
+        read, and cache counters. With pre-forked workers the counters and
+        histograms are summed over all workers, and gauges carry a `pid`
+        label. '''
+    return Response(METRICS.render(), mimetype="text/plain; version=0.0.4")
 
 
 @app.route("/search")
@@ -38,13 +129,97 @@ def search():
     if len(query) == 0:
       return jsonify(res)
     # BEGIN SOLUTION
-    res = controller.get_top_100(query, k=100)
+    try:
+        res = controller.get_top_100(query, k=100)
+    except ProviderNotReady as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
     # END SOLUTION
     return jsonify(res)
 
+@app.route("/batch_search", methods=["POST"])
+def batch_search():
+    ''' Runs many queries in one request. The posting lists of all their
+        terms are read once and shared, and PageRank/titles are looked up in
+        one call, so this is much faster than calling /search in a loop.
+
+        Expects a JSON body like {"queries": ["hello world", ...], "k": 100}
+        (k is optional, default 100).
+    Returns:
+    --------
+        list with one entry per query, in request order; each entry is a
+        list of up to k (wiki_id, title) tuples, like /search. A body that
+        is not such an object, or a k outside 1..MAX_BATCH_K, gets a 400.
+    '''
+    body = request.get_json(silent=True)
+    if not isinstance(body, dict):
+        return jsonify({"error": "expected a JSON object body"}), 400
+    queries = body.get("queries", [])
+    if not isinstance(queries, list) or not all(isinstance(q, str) for q in queries):
+        return jsonify({"error": "queries must be a list of strings"}), 400
+    k = body.get("k", 100)
+    # bool is an int subclass, but {"k": true} is not a result count
+    if not isinstance(k, int) or isinstance(k, bool) or not 1 <= k <= MAX_BATCH_K:
+        return jsonify({"error": f"k must be an integer between 1 and {MAX_BATCH_K}"}), 400
+    try:
+        res = controller.get_top_k_batch(queries, k=k, with_titles=True)
+    except ProviderNotReady as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    return jsonify(res)
+
 def run(**options):
     app.run(**options)
 
+def preload():
+    ''' Load every data structure before the workers are forked, so that
+        they share it instead of each loading its own copy. '''
+    if not data_provider.wait_ready():
+        raise RuntimeError(f"data providers failed to load: {data_provider.readiness()}")
+    mirror = data_provider.index_provider.mirror
+    if mirror is not None:
+        mirror.wait()
+
+
+def post_fork():
+    ''' Re-create what does not survive the fork in each worker: storage
+        connections and fetch threads, and the SQLite connections and
+        writer thread of the result cache. '''
+    data_provider.after_fork()
+    if result_cache is not None:
+        result_cache.after_fork()
+
+
+def run_prefork(host='0.0.0.0', port=8080, workers=0):
+    ''' Production mode: a supervisor loads the data once and pre-forks
+        `workers` server processes (0 = one per core). SIGHUP restarts the
+        workers one by one, SIGTERM stops them gracefully. '''
+    from serving.prefork import PreforkServer
+    metrics_dir = METRICS_DIR or tempfile.mkdtemp(prefix="ir_metrics_")
+    METRICS.clear_directory(metrics_dir)
+
+    def worker_init():
+        post_fork()
+        # every worker's /metrics answers for all of them
+        METRICS.enable_multiprocess(metrics_dir)
+
+    PreforkServer(app, host=host, port=port, workers=workers,
+                  preload=preload, post_fork=worker_init, worker_exit=METRICS.dump).run()
+
+
 if __name__ == '__main__':
-    # run the Flask RESTful API, make the server publicly available (host='0.0.0.0') on port 8080
-    app.run(host='0.0.0.0', port=8080, debug=True)
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the search engine frontend.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="pre-fork this many worker processes (0 = one per core); "
+                             "without it, run the single-process Flask development server")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--debug", action="store_true",
+                        help="run the development server with the Flask debugger and reloader (never in production)")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="report the import and provider load times of a fresh start and exit "
+                             "(see telemetry.startup; --json for JSON)")
+    args = parser.parse_args()
+    if args.workers is None:
+        # run the Flask RESTful API, make the server publicly available (host='0.0.0.0') on port 8080
+        app.run(host='0.0.0.0', port=args.port, debug=args.debug)
+    else:
+        run_prefork(port=args.port, workers=args.workers)
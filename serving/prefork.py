@@ -0,0 +1,179 @@
+import errno
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Callable, Dict, Optional
+
+from werkzeug.serving import make_server
+
+logger = logging.getLogger(__name__)
+
+
+class PreforkServer:
+    """
+    Pre-forking supervisor for the Flask/WSGI app.
+
+    The supervisor binds the listening socket, runs `preload()` (load the
+    index, lexicon, PageRank and titles) and then forks `workers` processes
+    that all accept on that socket. Everything loaded before the fork is
+    shared with the workers: memory-mapped stores through the page cache,
+    Python objects copy-on-write (`gc.freeze()` keeps the collector from
+    touching, and so copying, the preloaded objects). Each worker calls
+    `post_fork()` to re-create what does not survive a fork (threads,
+    storage connections) and then serves one request at a time, so N
+    workers use N cores for the GIL-bound scoring. `worker_exit()` runs in
+    a worker that stops gracefully (e.g. to flush its metrics).
+
+    Signals to the supervisor:
+    - SIGHUP: graceful rolling restart, one worker at a time; a
+      replacement is started before the old worker is asked to stop
+    - SIGTERM / SIGINT: graceful shutdown; workers finish the request they
+      are serving and exit, and are killed after `graceful_timeout`
+    Workers that die unexpectedly are replaced.
+    """
+
+    def __init__(self, app, host: str = "0.0.0.0", port: int = 8080, workers: int = 0,
+                 preload: Optional[Callable[[], None]] = None, post_fork: Optional[Callable[[], None]] = None,
+                 worker_exit: Optional[Callable[[], None]] = None, graceful_timeout: float = 30.0, backlog: int = 128):
+        self.app = app
+        self.host = host
+        self.port = int(port)
+        self.workers = int(workers) if workers > 0 else (os.cpu_count() or 1)
+        self.preload = preload
+        self.post_fork = post_fork
+        self.worker_exit = worker_exit
+        self.graceful_timeout = float(graceful_timeout)
+        self.backlog = int(backlog)
+        self.socket: Optional[socket.socket] = None
+        self._children: Dict[int, float] = {}
+        self._stopping = False
+        self._restart_requested = False
+
+    def bind(self) -> int:
+        """Bind the listening socket (port 0 picks a free port); returns the port."""
+        sock = socket.socket(socket.AF_INET6 if ":" in self.host else socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(self.backlog)
+        # idle workers must not block in accept() when another one won the connection
+        sock.setblocking(False)
+        self.socket = sock
+        self.port = sock.getsockname()[1]
+        return self.port
+
+    # ---------------------------------------------------------------- worker
+
+    def _serve_worker(self) -> None:
+        stop = []
+        signal.signal(signal.SIGTERM, lambda *_: stop.append(True))
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        if self.post_fork is not None:
+            self.post_fork()
+        server = make_server(self.host, self.port, self.app, fd=self.socket.fileno())
+        server.timeout = 0.5
+        while not stop:
+            # returns after one request, or after `timeout` to re-check `stop`
+            server.handle_request()
+        if self.worker_exit is not None:
+            self.worker_exit()
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._serve_worker()
+            except BaseException:
+                logger.exception("worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                os._exit(code)
+        self._children[pid] = time.monotonic()
+        logger.info("started worker %d", pid)
+        return pid
+
+    # ------------------------------------------------------------ supervisor
+
+    def _reap(self, block: bool = False) -> Optional[int]:
+        try:
+            pid, status = os.waitpid(-1, 0 if block else os.WNOHANG)
+        except ChildProcessError:
+            return None
+        if pid == 0:
+            return None
+        if self._children.pop(pid, None) is not None:
+            logger.info("worker %d exited with status %d", pid, os.waitstatus_to_exitcode(status))
+        return pid
+
+    def _rolling_restart(self) -> None:
+        for old in list(self._children):
+            self._spawn()
+            os.kill(old, signal.SIGTERM)
+            deadline = time.monotonic() + self.graceful_timeout
+            while old in self._children and time.monotonic() < deadline and not self._stopping:
+                self._reap() or time.sleep(0.05)
+            if old in self._children:
+                self._kill(old)
+
+    def _kill(self, pid: int) -> None:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _shutdown(self) -> None:
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        deadline = time.monotonic() + self.graceful_timeout
+        while self._children and time.monotonic() < deadline:
+            self._reap() or time.sleep(0.05)
+        for pid in list(self._children):
+            self._kill(pid)
+            self._reap(block=True)
+
+    def run(self) -> None:
+        """Bind, preload, fork the workers and supervise them until SIGTERM/SIGINT."""
+        if self.socket is None:
+            self.bind()
+        if self.preload is not None:
+            t0 = time.perf_counter()
+            self.preload()
+            logger.info("preloaded in %.2fs", time.perf_counter() - t0)
+        # move everything loaded so far out of the collector's reach, so the
+        # workers do not copy those pages by touching their GC headers
+        gc.collect()
+        gc.freeze()
+
+        def request_stop(*_):
+            self._stopping = True
+
+        def request_restart(*_):
+            self._restart_requested = True
+
+        signal.signal(signal.SIGTERM, request_stop)
+        signal.signal(signal.SIGINT, request_stop)
+        signal.signal(signal.SIGHUP, request_restart)
+        logger.info("listening on %s:%d with %d workers", self.host, self.port, self.workers)
+        try:
+            while not self._stopping:
+                while len(self._children) < self.workers and not self._stopping:
+                    self._spawn()
+                if self._restart_requested:
+                    self._restart_requested = False
+                    self._rolling_restart()
+                try:
+                    if self._reap() is None:
+                        time.sleep(0.1)
+                except OSError as e:
+                    if e.errno != errno.EINTR:
+                        raise
+        finally:
+            self._shutdown()
+            self.socket.close()
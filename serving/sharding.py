@@ -0,0 +1,455 @@
+"""
+Document-partitioned sharding: shard workers and a scatter-gather coordinator.
+
+The corpus is split by doc id (`indexing.spimi.shard_of`) into N shards,
+each with its own index slice (`python -m indexing.spimi ... --shard I
+--num-shards N`). A shard worker runs the usual `SearchController`
+pipeline over its slice; the coordinator fans every query out to all
+workers over HTTP and merges their top-k lists.
+
+BM25 needs corpus-wide statistics, so a query takes up to three rounds:
+1. `/shard/stats`: each shard's df of the query terms and its document
+   count, summed into global df and N
+2. `/shard/score` (unless a text-only top-k is asked for): each shard scores
+   its candidates with the global df/N and reports the min/max of the text
+   scores and log PageRank, which are merged into the global min-max
+   normalization ranges
+3. `/shard/rank`: each shard ranks its candidates with the global df/N
+   (and ranges) and returns its top-k, which the coordinator merges
+Scores are computed with the same float operations as on a single node,
+and ties are broken by (first query term containing the doc, doc id),
+the insertion order a single node uses, so the merged ranking equals the
+single-node one.
+
+Shards that fail or miss the deadline of a round are left out: the result
+is marked partial and lists the missing shards. Fewer than `min_shards`
+answering shards raises `ShardsUnavailable`.
+
+    python -m serving.sharding worker --index-dir shards/0 --port 9001
+    python -m serving.sharding coordinator --shards http://127.0.0.1:9001,http://127.0.0.1:9002
+"""
+import argparse
+import heapq
+import json
+import logging
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import requests
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+from controllers.SearchController import SearchController
+from indexing.spimi import SHARD_META_FILE
+from inverted_index_gcp import _open, get_storage
+from ranker.max_score import MaxScore
+from ranker.top_k import TopK
+
+logger = logging.getLogger(__name__)
+
+
+class ShardsUnavailable(RuntimeError):
+    """Raised when fewer than `min_shards` shards answered a query."""
+
+
+class _GlobalStatsProvider:
+    """
+    DataProvider view of one shard that reports the corpus-wide df and N
+    of the query being served (set per thread) instead of the shard's own.
+    """
+
+    def __init__(self, base, corpus_size: Optional[int] = None):
+        self._base = base
+        self._corpus_size = corpus_size
+        self._local = threading.local()
+
+    def set_stats(self, df: Optional[Dict[str, int]], N: Optional[int]) -> None:
+        self._local.df, self._local.N = df, N
+
+    def local_corpus_size(self) -> int:
+        return self._corpus_size if self._corpus_size is not None else self._base.corpus_size()
+
+    def get_df(self, terms: List[str]) -> Dict[str, int]:
+        df = getattr(self._local, "df", None)
+        if df is None:
+            return self._base.get_df(terms)
+        return {t: int(df.get(t, 0)) for t in terms}
+
+    def corpus_size(self) -> int:
+        N = getattr(self._local, "N", None)
+        return self.local_corpus_size() if N is None else N
+
+    def __getattr__(self, name):
+        return getattr(self._base, name)
+
+
+class ShardService:
+    """
+    Query side of one shard worker: local statistics, candidate scoring
+    and ranking with global statistics. `corpus_size` is the number of
+    documents in the shard (from `shard.json`); by default the data
+    provider's `corpus_size()`.
+
+    Scored candidates are kept for the `max_scored` most recent
+    (query, df, N) so the rank round does not score them again.
+    """
+
+    def __init__(self, data_provider, shard_id: int = 0, corpus_size: Optional[int] = None, max_scored: int = 256):
+        self.shard_id = shard_id
+        self.data_provider = _GlobalStatsProvider(data_provider, corpus_size)
+        self.max_scored = int(max_scored)
+        self._controllers: Dict[Tuple[float, float], SearchController] = {}
+        self._scored: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _controller(self, weight_text: float = 0.8, weight_pagerank: float = 0.2) -> SearchController:
+        key = (float(weight_text), float(weight_pagerank))
+        with self._lock:
+            if key not in self._controllers:
+                self._controllers[key] = SearchController(bucket_name=None, data_provider=self.data_provider,
+                                                          weight_text=key[0], weight_pagerank=key[1])
+            return self._controllers[key]
+
+    def stats(self, query: str) -> Dict:
+        """df of the query terms in this shard and the shard's document count."""
+        tokens = list(dict.fromkeys(self._controller().query_to_tokens(query)))
+        self.data_provider.set_stats(None, None)
+        return {"shard": self.shard_id, "df": self.data_provider.get_df(tokens),
+                "N": self.data_provider.local_corpus_size()}
+
+    def _score(self, query: str, df: Dict[str, int], N: int):
+        """(doc ids, text scores, log PageRank) arrays of this shard's candidates under global df/N."""
+        key = json.dumps([query, sorted(df.items()), N])
+        with self._lock:
+            if key in self._scored:
+                self._scored.move_to_end(key)
+                return self._scored[key]
+        controller = self._controller()
+        self.data_provider.set_stats(df, N)
+        doc_ids, scores = controller.compute_text_score_arrays(query)
+        log_pr, degraded = controller.log_pagerank_prior(doc_ids)
+        scored = (doc_ids, scores, log_pr)
+        if degraded:
+            # scored without PageRank: used for this request only
+            return scored
+        with self._lock:
+            self._scored[key] = scored
+            while len(self._scored) > self.max_scored:
+                self._scored.popitem(last=False)
+        return scored
+
+    def score(self, query: str, df: Dict[str, int], N: int) -> Dict:
+        """Candidate count and (text min, text max, log PR min, log PR max), or None without candidates."""
+        doc_ids, scores, log_pr = self._score(query, df, N)
+        ranges = SearchController._score_ranges(scores, log_pr) if len(doc_ids) else None
+        return {"shard": self.shard_id, "candidates": len(doc_ids), "ranges": ranges}
+
+    def _first_terms(self, tokens: List[str], doc_ids: List[int]) -> List[int]:
+        # position of the first query term whose posting list holds each doc:
+        # a single node inserts candidates in that order, so it breaks ties
+        first = np.full(len(doc_ids), len(tokens), dtype=np.int64)
+        ids = np.asarray(doc_ids, dtype=np.int64)
+        postings = self.data_provider.get_posting_list(tokens, as_arrays=True)
+        for i, t in enumerate(tokens):
+            hit = (first == len(tokens)) & np.isin(ids, postings[t][0])
+            first[hit] = i
+        return first.tolist()
+
+    def rank(self, query: str, k: int, df: Dict[str, int], N: int, weight_text: float = 0.8,
+             weight_pagerank: float = 0.2, ranges: Optional[List[float]] = None, with_titles: bool = False) -> Dict:
+        """
+        This shard's top-k as [doc_id, score, first_term] (+ title) rows,
+        with the global df/N and, when PageRank is weighted in, the global
+        normalization `ranges`.
+        """
+        controller = self._controller(weight_text, weight_pagerank)
+        tokens = list(dict.fromkeys(controller.query_to_tokens(query)))
+        if not tokens:
+            return {"shard": self.shard_id, "results": []}
+        self.data_provider.set_stats(df, N)
+        if weight_pagerank == 0 and not with_titles:
+            # normalization keeps the BM25 order: prune as `get_top_k_text` does
+            all_tokens = controller.query_to_tokens(query)
+            top = MaxScore.top_k(postings=self.data_provider.get_posting_list(all_tokens, as_arrays=True),
+                                 query_w=controller.get_query_term_weights(query),
+                                 df_map=self.data_provider.get_df(all_tokens), N=N, k=k,
+                                 bounds=self.data_provider.get_term_bounds(all_tokens))
+        else:
+            doc_ids, scores, log_pr = self._score(query, df, N)
+            combined = controller._combine_scores(scores, log_pr, ranges=tuple(ranges) if ranges is not None else None)
+            top_ids, top_scores = TopK.from_arrays(doc_ids, combined, k)
+            top = list(zip(top_ids.tolist(), top_scores.tolist()))
+        doc_ids = [d for d, _ in top]
+        rows = [[d, s, f] for (d, s), f in zip(top, self._first_terms(tokens, doc_ids))]
+        if with_titles:
+            titles = dict(self.data_provider.get_titles_from_docIDs(doc_ids))
+            for row in rows:
+                row.append(titles[row[0]])
+        return {"shard": self.shard_id, "results": rows}
+
+
+def create_shard_app(service: ShardService) -> Flask:
+    app = Flask(f"shard{service.shard_id}")
+
+    @app.route("/shard/health")
+    def health():
+        return jsonify({"shard": service.shard_id})
+
+    @app.route("/shard/stats", methods=["POST"])
+    def stats():
+        return jsonify(service.stats(request.get_json()["query"]))
+
+    @app.route("/shard/score", methods=["POST"])
+    def score():
+        body = request.get_json()
+        return jsonify(service.score(body["query"], body["df"], body["N"]))
+
+    @app.route("/shard/rank", methods=["POST"])
+    def rank():
+        body = request.get_json()
+        return jsonify(service.rank(body["query"], int(body["k"]), body["df"], body["N"],
+                                    weight_text=body["weight_text"], weight_pagerank=body["weight_pagerank"],
+                                    ranges=body.get("ranges"), with_titles=bool(body.get("with_titles"))))
+
+    return app
+
+
+class ShardCoordinator:
+    """
+    Scatter-gather over shard workers, with the `get_top_k` / `get_top_100`
+    interface of `SearchController`.
+
+    `timeout` bounds each round of a query; shards that error or have not
+    answered by then are dropped from the rest of the query. `corpus_size` pins N
+    instead of summing the shards' document counts (e.g. to match a single
+    node's configured N). `last_query_stats` holds, per thread, the time of
+    each round and the shards that were missing.
+    """
+
+    def __init__(self, shard_urls: List[str], weight_text: float = 0.8, weight_pagerank: float = 0.2,
+                 timeout: float = 2.0, min_shards: int = 1, corpus_size: Optional[int] = None):
+        self.shard_urls = [u.rstrip("/") for u in shard_urls]
+        self.weight_text = float(weight_text)
+        self.weight_pagerank = float(weight_pagerank)
+        self.timeout = float(timeout)
+        self.min_shards = int(min_shards)
+        self.corpus_size = corpus_size
+        self._pool = ThreadPoolExecutor(max_workers=max(1, 2 * len(self.shard_urls)),
+                                        thread_name_prefix="shard-fanout")
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        # one keep-alive session per fan-out thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _post(self, shard: int, path: str, body: Dict, deadline: float) -> Dict:
+        timeout = max(0.001, deadline - time.monotonic())
+        resp = self._session().post(self.shard_urls[shard] + path, json=body, timeout=timeout)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _fan_out(self, path: str, bodies: Dict[int, Dict], failed: Dict[int, str]) -> Dict[int, Dict]:
+        """POST to every shard in `bodies`; shards that fail are recorded in `failed` and left out."""
+        deadline = time.monotonic() + self.timeout
+        futures = {self._pool.submit(self._post, shard, path, body, deadline): shard for shard, body in bodies.items()}
+        done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+        out = {}
+        for future, shard in futures.items():
+            if future in not_done:
+                future.cancel()
+                failed[shard] = "timeout"
+            elif future.exception() is not None:
+                failed[shard] = f"{type(future.exception()).__name__}: {future.exception()}"
+            else:
+                out[shard] = future.result()
+        if failed:
+            logger.warning("%s: shards %s failed: %s", path, sorted(failed), failed)
+        if len(out) < self.min_shards:
+            raise ShardsUnavailable(f"only {len(out)} of {len(self.shard_urls)} shards answered {path}")
+        return out
+
+    def search(self, query: str, k: int = 10, with_titles: bool = False) -> Dict:
+        """
+        Run `query` on all shards. Returns {"results", "partial",
+        "failed_shards"}; results are [doc_id, score] rows, or
+        [doc_id, score, title] with `with_titles`, best first.
+        """
+        failed: Dict[int, str] = {}
+        timings = {}
+        t0 = time.perf_counter()
+        stats = self._fan_out("/shard/stats", {i: {"query": query} for i in range(len(self.shard_urls))},
+                              failed)
+        df: Dict[str, int] = {}
+        for s in stats.values():
+            for t, n in s["df"].items():
+                df[t] = df.get(t, 0) + n
+        N = self.corpus_size if self.corpus_size is not None else sum(s["N"] for s in stats.values())
+        timings["stats_s"] = time.perf_counter() - t0
+        live = sorted(stats)
+
+        body = {"query": query, "df": df, "N": N}
+        ranges = None
+        if self.weight_pagerank != 0 or with_titles:
+            t0 = time.perf_counter()
+            scored = self._fan_out("/shard/score", {i: body for i in live}, failed)
+            per_shard = [s["ranges"] for s in scored.values() if s["ranges"] is not None]
+            if per_shard:
+                ranges = [min(r[0] for r in per_shard), max(r[1] for r in per_shard),
+                          min(r[2] for r in per_shard), max(r[3] for r in per_shard)]
+            live = [i for i in live if i in scored]
+            timings["score_s"] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        rank_body = dict(body, k=k, weight_text=self.weight_text, weight_pagerank=self.weight_pagerank,
+                         ranges=ranges, with_titles=with_titles)
+        ranked = self._fan_out("/shard/rank", {i: rank_body for i in live}, failed)
+        rows = [row for r in ranked.values() for row in r["results"]]
+        # highest score first; ties in single-node insertion order
+        top = heapq.nsmallest(k, rows, key=lambda row: (-row[1], row[2], row[0]))
+        timings["rank_s"] = time.perf_counter() - t0
+        self._local.query_stats = dict(timings, failed_shards=dict(failed))
+        results = [[row[0], row[1], row[3]] if with_titles else [row[0], row[1]] for row in top]
+        return {"results": results, "partial": bool(failed), "failed_shards": sorted(failed)}
+
+    @property
+    def last_query_stats(self) -> Dict:
+        return getattr(self._local, "query_stats", {})
+
+    def get_top_k(self, query: str, k: int = 10) -> List[int]:
+        return [row[0] for row in self.search(query, k)["results"]]
+
+    def get_top_100(self, query: str, k: int = 100) -> List[Tuple[int, str]]:
+        return [(row[0], row[2]) for row in self.search(query, k, with_titles=True)["results"]]
+
+    def health(self) -> Dict[str, bool]:
+        out = {}
+        for url in self.shard_urls:
+            try:
+                out[url] = self._session().get(url + "/shard/health", timeout=self.timeout).ok
+            except requests.RequestException:
+                out[url] = False
+        return out
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def create_coordinator_app(coordinator: ShardCoordinator) -> Flask:
+    app = Flask("coordinator")
+
+    @app.route("/search")
+    def search():
+        ''' Same response as the single-node /search; partial results are
+            flagged with the X-Partial-Results header. '''
+        query = request.args.get('query', '')
+        if len(query) == 0:
+            return jsonify([])
+        try:
+            res = coordinator.search(query, k=100, with_titles=True)
+        except ShardsUnavailable as e:
+            return jsonify({"error": str(e)}), 503
+        headers = {"X-Partial-Results": ",".join(map(str, res["failed_shards"]))} if res["partial"] else {}
+        return jsonify([(row[0], row[2]) for row in res["results"]]), 200, headers
+
+    @app.route("/shards")
+    def shards():
+        return jsonify(coordinator.health())
+
+    return app
+
+
+def _serve_shard(factory: Callable[[], ShardService], host: str, conn) -> None:
+    service = factory()
+    server = make_server(host, 0, create_shard_app(service), threaded=True)
+    conn.send(server.server_port)
+    conn.close()
+    server.serve_forever()
+
+
+class LocalShardCluster:
+    """
+    Shard workers as separate local processes on free localhost ports, for
+    development and tests. Every factory builds one `ShardService` inside
+    its (forked) worker process.
+    """
+
+    def __init__(self, factories: List[Callable[[], ShardService]], host: str = "127.0.0.1"):
+        self.factories = factories
+        self.host = host
+        self.processes: List[multiprocessing.Process] = []
+        self.urls: List[str] = []
+
+    def start(self, timeout: float = 60.0) -> List[str]:
+        ctx = multiprocessing.get_context("fork")
+        for factory in self.factories:
+            parent, child = ctx.Pipe(duplex=False)
+            proc = ctx.Process(target=_serve_shard, args=(factory, self.host, child), daemon=True)
+            proc.start()
+            child.close()
+            if not parent.poll(timeout):
+                raise RuntimeError(f"shard {len(self.urls)} did not start")
+            self.processes.append(proc)
+            self.urls.append(f"http://{self.host}:{parent.recv()}")
+        return self.urls
+
+    def stop_shard(self, shard: int) -> None:
+        self.processes[shard].terminate()
+        self.processes[shard].join()
+
+    def stop(self) -> None:
+        for proc in self.processes:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+
+    def __enter__(self) -> "LocalShardCluster":
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded serving: shard workers and the scatter-gather coordinator.")
+    sub = parser.add_subparsers(dest="role", required=True)
+    worker = sub.add_parser("worker", help="serve one index shard")
+    worker.add_argument("--index-dir", required=True, help="shard index directory (prefix inside --bucket-name)")
+    worker.add_argument("--bucket-name", default=None)
+    worker.add_argument("--pr-store-dir", default=None)
+    worker.add_argument("--titles-store-dir", default=None)
+    worker.add_argument("--host", default="0.0.0.0")
+    worker.add_argument("--port", type=int, default=9001)
+    coordinator = sub.add_parser("coordinator", help="fan queries out to the shard workers")
+    coordinator.add_argument("--shards", required=True, help="comma separated shard worker URLs")
+    coordinator.add_argument("--timeout", type=float, default=2.0, help="seconds per round of a query")
+    coordinator.add_argument("--min-shards", type=int, default=1)
+    coordinator.add_argument("--corpus-size", type=int, default=None, help="N; default: sum of the shard sizes")
+    coordinator.add_argument("--host", default="0.0.0.0")
+    coordinator.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.role == "worker":
+        from data_provider.data_provider import DataProvider
+        bucket = get_storage(args.bucket_name)
+        with _open(f"{args.index_dir}/{SHARD_META_FILE}", "rb", bucket) as f:
+            meta = json.loads(f.read().decode("utf-8"))
+        data_provider = DataProvider(bucket_name=args.bucket_name, postings_subdir=args.index_dir,
+                                     pr_store_dir=args.pr_store_dir, titles_store_dir=args.titles_store_dir)
+        app = create_shard_app(ShardService(data_provider, shard_id=meta["shard"], corpus_size=meta["docs"]))
+    else:
+        app = create_coordinator_app(ShardCoordinator(args.shards.split(","), timeout=args.timeout,
+                                                      min_shards=args.min_shards, corpus_size=args.corpus_size))
+    make_server(args.host, args.port, app, threaded=True).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
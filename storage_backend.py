@@ -0,0 +1,484 @@
+"""
+Storage backends: one interface over the local filesystem, GCS, HTTP and
+memory, used by the index, PageRank and title providers.
+
+`read_range(path, offset, length)` is the primitive for posting reads: it
+issues exactly one request for exactly those bytes (a ranged GET on GCS and
+HTTP, a `pread` locally) instead of seek-then-read on a file object, which
+on GCS may fetch a whole chunk per seek. `read_ranges` issues several
+ranges concurrently. `ReadaheadBackend` rounds reads up to aligned windows
+of `readahead_bytes` and caches them, for access patterns with locality.
+
+Backends are chosen by name with `get_backend`:
+- None: local files (paths as given)
+- "http://host:port" / "https://...": an HTTP server that supports Range
+  requests, e.g. `serve_directory` over a dataset directory
+- "memory://name": an in-memory store, shared by name within the process
+- anything else: the GCS bucket of that name (one shared client)
+
+Clients, sessions, locks and read threads do not survive `fork`: a forked
+child drops the shared GCS client and every cached backend except the
+memory stores (which hold the data), and every backend gets new locks
+and starts its read threads again on first use.
+"""
+import io
+import os
+import shutil
+import threading
+import time
+import weakref
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class StorageBackend(ABC):
+    """
+    Base class. Subclasses implement `open`, `read_range`, `exists`, `size`
+    and `version`; `requests` and `bytes_read` count the ranged reads.
+    """
+
+    # ranges read concurrently by `read_ranges`
+    max_concurrency = 8
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes_read = 0
+        self._stats_lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        _instances.add(self)
+
+    def _after_fork(self) -> None:
+        # the parent's read threads do not exist in the child; its locks may be held
+        self._stats_lock = threading.Lock()
+        self._executor = None
+
+    def _account(self, n_bytes: int) -> None:
+        with self._stats_lock:
+            self.requests += 1
+            self.bytes_read += n_bytes
+
+    @abstractmethod
+    def open(self, path: str, mode: str = "rb"):
+        raise NotImplementedError
+
+    @abstractmethod
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        """Read `length` bytes at `offset` of `path` with a single request."""
+        raise NotImplementedError
+
+    def read_ranges(self, ranges: Sequence[Tuple[str, int, int]]) -> List[bytes]:
+        """Vectored read of (path, offset, length) ranges, issued concurrently."""
+        if len(ranges) <= 1 or self.max_concurrency <= 1:
+            return [self.read_range(*r) for r in ranges]
+        if self._executor is None:
+            with self._stats_lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                                        thread_name_prefix="storage-read")
+        return list(self._executor.map(lambda r: self.read_range(*r), ranges))
+
+    @abstractmethod
+    def exists(self, path: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def size(self, path: str) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    def version(self, path: str) -> str:
+        """Identifier that changes whenever the object at `path` is rewritten ("" if missing)."""
+        raise NotImplementedError
+
+    def download(self, path: str, dst: str) -> None:
+        """Copy `path` to the local file `dst` (atomically replaced)."""
+        tmp = f"{dst}.part"
+        with self.open(path, "rb") as src, open(tmp, "wb") as out:
+            shutil.copyfileobj(src, out, 2 ** 20)
+        os.replace(tmp, dst)
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+# every backend of the process, reset in a forked child
+_instances: "weakref.WeakSet[StorageBackend]" = weakref.WeakSet()
+
+
+class LocalBackend(StorageBackend):
+    """Local filesystem; paths are relative to `root` when it is given."""
+
+    max_concurrency = 1
+
+    def __init__(self, root: Optional[str] = None):
+        super().__init__()
+        self.root = root
+
+    def _path(self, path: str) -> str:
+        return path if self.root is None else os.path.join(self.root, path)
+
+    def open(self, path: str, mode: str = "rb"):
+        return open(self._path(path), mode)
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        fd = os.open(self._path(path), os.O_RDONLY)
+        try:
+            b = os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+        self._account(len(b))
+        return b
+
+    def exists(self, path: str) -> bool:
+        return os.path.exists(self._path(path))
+
+    def size(self, path: str) -> int:
+        return os.stat(self._path(path)).st_size
+
+    def version(self, path: str) -> str:
+        try:
+            st = os.stat(self._path(path))
+        except FileNotFoundError:
+            return ""
+        return f"{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def download(self, path: str, dst: str) -> None:
+        shutil.copyfile(self._path(path), f"{dst}.part")
+        os.replace(f"{dst}.part", dst)
+
+
+_gcs_client = None
+_gcs_client_lock = threading.Lock()
+
+
+def gcs_client():
+    """The process-wide GCS client (creating one costs an auth round trip)."""
+    global _gcs_client
+    with _gcs_client_lock:
+        if _gcs_client is None:
+            from google.cloud import storage
+            _gcs_client = storage.Client()
+        return _gcs_client
+
+
+class GCSBackend(StorageBackend):
+    """A GCS bucket, by name (shared client) or as an existing bucket object."""
+
+    def __init__(self, bucket_name: Optional[str] = None, bucket=None):
+        super().__init__()
+        self.bucket = bucket if bucket is not None else gcs_client().bucket(bucket_name)
+
+    def open(self, path: str, mode: str = "rb"):
+        return self.bucket.blob(path).open(mode)
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        # one GET with a Range header; `end` is inclusive
+        b = self.bucket.blob(path).download_as_bytes(start=offset, end=offset + length - 1)
+        self._account(len(b))
+        return b
+
+    def exists(self, path: str) -> bool:
+        return self.bucket.blob(path).exists()
+
+    def size(self, path: str) -> int:
+        return self.bucket.get_blob(path).size
+
+    def version(self, path: str) -> str:
+        blob = self.bucket.get_blob(path)
+        return f"gcs:{blob.generation}" if blob is not None else ""
+
+    def download(self, path: str, dst: str) -> None:
+        self.bucket.blob(path).download_to_filename(f"{dst}.part")
+        os.replace(f"{dst}.part", dst)
+
+
+class _MemoryWriter(io.BytesIO):
+    def __init__(self, backend: "MemoryBackend", path: str):
+        super().__init__()
+        self._backend = backend
+        self._path = path
+        self.name = path
+
+    def close(self):
+        if not self.closed:
+            self._backend.put(self._path, self.getvalue())
+        super().close()
+
+
+class MemoryBackend(StorageBackend):
+    """Objects held in a dict, for tests and benchmarks."""
+
+    max_concurrency = 1
+
+    def __init__(self):
+        super().__init__()
+        self.objects: Dict[str, bytes] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _after_fork(self) -> None:
+        super()._after_fork()
+        self._lock = threading.Lock()
+
+    def put(self, path: str, data: bytes) -> None:
+        with self._lock:
+            self.objects[path] = bytes(data)
+            self._generations[path] = self._generations.get(path, 0) + 1
+
+    def open(self, path: str, mode: str = "rb"):
+        if "w" in mode:
+            return _MemoryWriter(self, path)
+        try:
+            return io.BytesIO(self.objects[path])
+        except KeyError:
+            raise FileNotFoundError(path) from None
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        try:
+            b = self.objects[path][offset:offset + length]
+        except KeyError:
+            raise FileNotFoundError(path) from None
+        self._account(len(b))
+        return b
+
+    def exists(self, path: str) -> bool:
+        return path in self.objects
+
+    def size(self, path: str) -> int:
+        return len(self.objects[path])
+
+    def version(self, path: str) -> str:
+        gen = self._generations.get(path)
+        return f"mem:{gen}" if gen is not None else ""
+
+
+class HTTPBackend(StorageBackend):
+    """Read-only objects under `base_url`, read with HTTP Range requests."""
+
+    def __init__(self, base_url: str, timeout: float = 30.0):
+        super().__init__()
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _after_fork(self) -> None:
+        # the forking thread's session (and its pooled sockets) is the parent's
+        super()._after_fork()
+        self._local = threading.local()
+
+    def _session(self):
+        if not hasattr(self._local, "session"):
+            import requests
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _url(self, path: str) -> str:
+        return f"{self.base_url}/{path.lstrip('/')}"
+
+    def _get(self, path: str, headers=None):
+        resp = self._session().get(self._url(path), headers=headers, timeout=self.timeout)
+        if resp.status_code == 404:
+            raise FileNotFoundError(path)
+        resp.raise_for_status()
+        return resp
+
+    def open(self, path: str, mode: str = "rb"):
+        if mode != "rb":
+            raise io.UnsupportedOperation("HTTPBackend is read-only")
+        return io.BytesIO(self._get(path).content)
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        b = self._get(path, {"Range": f"bytes={offset}-{offset + length - 1}"}).content
+        self._account(len(b))
+        return b
+
+    def _head(self, path: str):
+        return self._session().head(self._url(path), timeout=self.timeout)
+
+    def exists(self, path: str) -> bool:
+        return self._head(path).status_code == 200
+
+    def size(self, path: str) -> int:
+        resp = self._head(path)
+        if resp.status_code == 404:
+            raise FileNotFoundError(path)
+        return int(resp.headers["Content-Length"])
+
+    def version(self, path: str) -> str:
+        resp = self._head(path)
+        if resp.status_code != 200:
+            return ""
+        return resp.headers.get("ETag") or f"{resp.headers.get('Last-Modified')}-{resp.headers.get('Content-Length')}"
+
+
+class ReadaheadBackend(StorageBackend):
+    """
+    Wraps a backend so every read fetches whole aligned windows of
+    `readahead_bytes`, kept in an LRU bounded by `max_cached_bytes`. Missing
+    windows of one read are fetched with a single ranged request.
+    """
+
+    def __init__(self, inner: StorageBackend, readahead_bytes: int = 2 ** 20, max_cached_bytes: int = 64 * 2 ** 20):
+        super().__init__()
+        self.inner = inner
+        self.readahead_bytes = int(readahead_bytes)
+        self.max_cached_bytes = int(max_cached_bytes)
+        self._windows: "OrderedDict[Tuple[str, int], bytes]" = OrderedDict()
+        self._cached_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _after_fork(self) -> None:
+        super()._after_fork()
+        self._lock = threading.Lock()
+
+    def read_range(self, path: str, offset: int, length: int) -> bytes:
+        if length <= 0:
+            return b""
+        size = self.readahead_bytes
+        first, last = offset // size, (offset + length - 1) // size
+        windows = {}
+        with self._lock:
+            for w in range(first, last + 1):
+                b = self._windows.get((path, w))
+                if b is not None:
+                    self._windows.move_to_end((path, w))
+                    windows[w] = b
+            missing = [w for w in range(first, last + 1) if w not in windows]
+            self.hits += len(windows)
+            self.misses += len(missing)
+        if missing:
+            lo, hi = missing[0], missing[-1]
+            b = self.inner.read_range(path, lo * size, (hi - lo + 1) * size)
+            self._account(len(b))
+            with self._lock:
+                for w in range(lo, hi + 1):
+                    chunk = b[(w - lo) * size:(w - lo + 1) * size]
+                    windows[w] = chunk
+                    if (path, w) not in self._windows:
+                        self._windows[(path, w)] = chunk
+                        self._cached_bytes += len(chunk)
+                while self._cached_bytes > self.max_cached_bytes and self._windows:
+                    _, old = self._windows.popitem(last=False)
+                    self._cached_bytes -= len(old)
+        data = b"".join(windows[w] for w in range(first, last + 1))
+        start = offset - first * size
+        return data[start:start + length]
+
+    def open(self, path: str, mode: str = "rb"):
+        return self.inner.open(path, mode)
+
+    def exists(self, path: str) -> bool:
+        return self.inner.exists(path)
+
+    def size(self, path: str) -> int:
+        return self.inner.size(path)
+
+    def version(self, path: str) -> str:
+        return self.inner.version(path)
+
+    def download(self, path: str, dst: str) -> None:
+        self.inner.download(path, dst)
+
+    def close(self) -> None:
+        self.inner.close()
+        super().close()
+
+
+_backends: Dict[Tuple[Optional[str], int], StorageBackend] = {}
+_backends_lock = threading.Lock()
+
+
+def get_backend(name: Optional[str] = None, readahead_bytes: int = 0) -> StorageBackend:
+    """The shared backend for `name` (see the module docstring), optionally with readahead."""
+    key = (name, int(readahead_bytes))
+    with _backends_lock:
+        backend = _backends.get(key)
+        if backend is not None:
+            return backend
+    if readahead_bytes > 0:
+        backend = ReadaheadBackend(get_backend(name), readahead_bytes)
+    elif name is None:
+        backend = LocalBackend()
+    elif name.startswith(("http://", "https://")):
+        backend = HTTPBackend(name)
+    elif name.startswith("memory://"):
+        backend = MemoryBackend()
+    else:
+        backend = GCSBackend(name)
+    with _backends_lock:
+        return _backends.setdefault(key, backend)
+
+
+def _after_fork_in_child() -> None:
+    global _gcs_client, _gcs_client_lock, _backends_lock
+    _gcs_client = None
+    _gcs_client_lock = threading.Lock()
+    _backends_lock = threading.Lock()
+    for backend in list(_instances):
+        backend._after_fork()
+    # memory stores are the data itself; every other backend is re-created on next use
+    for key, backend in list(_backends.items()):
+        if not isinstance(backend, MemoryBackend):
+            del _backends[key]
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class _RangeRequestHandler(SimpleHTTPRequestHandler):
+    """Static files with single-range `Range: bytes=a-b` support."""
+
+    delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        if self.delay:
+            time.sleep(self.delay)
+        rng = self.headers.get("Range")
+        path = self.translate_path(self.path)
+        if rng is None or not os.path.isfile(path):
+            return super().send_head()
+        size = os.path.getsize(path)
+        start_s, _, end_s = rng.strip().removeprefix("bytes=").partition("-")
+        start = int(start_s)
+        end = min(int(end_s) if end_s else size - 1, size - 1)
+        if start >= size:
+            self.send_error(416, "Requested Range Not Satisfiable")
+            return None
+        with open(path, "rb") as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        self.send_response(206)
+        self.send_header("Content-Type", "application/octet-stream")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Last-Modified", self.date_time_string(int(os.stat(path).st_mtime)))
+        self.end_headers()
+        return io.BytesIO(body)
+
+
+def serve_directory(root: str, host: str = "127.0.0.1", port: int = 0, delay: float = 0.0) -> ThreadingHTTPServer:
+    """
+    Serve `root` over HTTP with Range support on a background thread: a
+    local stand-in for the bucket (`get_backend(f"http://{host}:{port}")`).
+    `delay` adds latency to every request, to mimic remote storage.
+    """
+    handler = type("Handler", (_RangeRequestHandler,), {"delay": delay})
+    server = ThreadingHTTPServer((host, port), lambda *a: handler(*a, directory=str(Path(root))))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="storage-http", daemon=True).start()
+    return server
@@ -0,0 +1,359 @@
+"""
+In-process metrics: stage timers, counters and histograms, rendered in the
+Prometheus text exposition format for the `/metrics` endpoint.
+
+Recording is a `perf_counter` call plus a short locked update, cheap
+enough to leave on for every query. `stage()` times one pipeline stage:
+
+    with METRICS.stage("tokenize"):
+        tokens = tokenize(query)
+
+Stage durations go to the `ir_stage_seconds` histogram (one series per
+stage) and are also kept per thread for the query being served, so a slow
+query can be broken down (`query_stages`, and the slow query log).
+
+Each process keeps its own values. With pre-forked workers, call
+`enable_multiprocess(directory)` in every worker: each one then writes its
+values to `directory` (every `interval` seconds and when it exits) and a
+scrape of any worker renders the sum over all of them. Counters and
+histograms of workers that have exited stay in the sum, so totals never go
+back when a worker is replaced; gauges are per process and get a `pid`
+label (only live workers are shown).
+"""
+import bisect
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# seconds; from sub-millisecond stages to multi-second GCS reads
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                   2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 10, 100, 1000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics) with one series per label set."""
+
+    def __init__(self, name: str, help: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts (+inf last), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self, **labels: str) -> Dict[str, float]:
+        with self._lock:
+            series = self._series.get(tuple(sorted(labels.items())))
+            return {"count": series[2], "sum": series[1]} if series else {"count": 0, "sum": 0.0}
+
+    def dump(self) -> List:
+        """JSON-serializable copy of every series."""
+        with self._lock:
+            return [[list(map(list, k)), [*s[0]], s[1], s[2]] for k, s in self._series.items()]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def merge(dumps: Sequence[List]) -> Dict[Tuple, List]:
+        """Sum `dump()`s of several processes, series by series."""
+        out: Dict[Tuple, List] = {}
+        for dump in dumps:
+            for labels, counts, total, count in dump:
+                key = tuple(map(tuple, labels))
+                series = out.get(key)
+                if series is None:
+                    out[key] = [list(counts), total, count]
+                else:
+                    series[0] = [a + b for a, b in zip(series[0], counts)]
+                    series[1] += total
+                    series[2] += count
+        return out
+
+    def render(self, series: Optional[Dict[Tuple, List]] = None) -> List[str]:
+        """Exposition lines of this histogram, or of merged `series`."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            with self._lock:
+                series = {k: ([*s[0]], s[1], s[2]) for k, s in self._series.items()}
+        items = sorted(series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip([*self.buckets, "+Inf"], counts):
+                cumulative += n
+                le = bound if bound == "+Inf" else _num(float(bound))
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', le),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(key)} {count}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter with one series per label set."""
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def dump(self) -> List:
+        """JSON-serializable copy of every series."""
+        with self._lock:
+            return [[list(map(list, k)), v] for k, v in self._values.items()]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    @staticmethod
+    def merge(dumps: Sequence[List]) -> Dict[Tuple, float]:
+        """Sum `dump()`s of several processes, series by series."""
+        out: Dict[Tuple, float] = {}
+        for dump in dumps:
+            for labels, v in dump:
+                key = tuple(map(tuple, labels))
+                out[key] = out.get(key, 0) + v
+        return out
+
+    def render(self, values: Optional[Dict[Tuple, float]] = None) -> List[str]:
+        """Exposition lines of this counter, or of merged `values`."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        items = sorted(values.items())
+        lines.extend(f"{self.name}{_labels(key)} {_num(v)}" for key, v in items)
+        return lines
+
+
+class Metrics:
+    """
+    Registry of the search metrics. Gauges are read at scrape time from
+    callbacks registered with `gauge()` (e.g. cache sizes).
+    """
+
+    def __init__(self, slow_query_seconds: Optional[float] = 1.0):
+        self.slow_query_seconds = slow_query_seconds
+        self.stages = Histogram("ir_stage_seconds", "Time spent per query pipeline stage.")
+        self.queries = Histogram("ir_query_seconds", "End-to-end query latency by kind.")
+        self.candidates = Histogram("ir_query_candidates", "Candidate documents scored per query.", SIZE_BUCKETS)
+        self.postings_scored = Counter("ir_postings_scored_total", "Postings scored.")
+        self.bytes_read = Counter("ir_posting_bytes_read_total", "Posting bytes read from storage.")
+        self.posting_reads = Counter("ir_posting_reads_total", "Posting range reads issued to storage.")
+        self.errors = Counter("ir_query_errors_total", "Queries that raised, by kind.")
+        self._gauges: Dict[str, Tuple[str, Callable[[], Dict[Tuple, float]]]] = {}
+        self._local = threading.local()
+        # multi-process mode (`enable_multiprocess`)
+        self.directory: Optional[str] = None
+        self._dumper: Optional[threading.Thread] = None
+        # the dump thread and scrapes write the same tmp file
+        self._dump_lock = threading.Lock()
+
+    def _metrics(self) -> Tuple:
+        return (self.queries, self.stages, self.candidates, self.postings_scored, self.bytes_read,
+                self.posting_reads, self.errors)
+
+    # --------------------------------------------------------- multi-process
+
+    def enable_multiprocess(self, directory: str, interval: float = 1.0) -> None:
+        """
+        Share this process's values through `directory` (call once per
+        worker, after the fork). Values inherited from the parent are
+        dropped, since the parent does not serve queries.
+        """
+        for metric in self._metrics():
+            metric.reset()
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        # a lock inherited through fork may be held by a thread that no longer exists
+        self._dump_lock = threading.Lock()
+        self.dump()
+        self._dumper = threading.Thread(target=self._dump_loop, args=(float(interval),), name="metrics-dump",
+                                        daemon=True)
+        self._dumper.start()
+
+    @staticmethod
+    def clear_directory(directory: str) -> None:
+        """Remove the dumps of an earlier run (call in the supervisor before forking)."""
+        for path in glob.glob(os.path.join(directory, "metrics_*.json")):
+            os.remove(path)
+
+    def _dump_path(self, pid: int) -> str:
+        return os.path.join(self.directory, f"metrics_{pid}.json")
+
+    def _read_gauges(self) -> Dict[str, List]:
+        out = {}
+        for name, (_, read) in self._gauges.items():
+            try:
+                out[name] = [[list(map(list, k)), v] for k, v in read().items()]
+            except Exception:
+                logger.exception("gauge %s failed", name)
+        return out
+
+    def dump(self) -> None:
+        """Write this process's values to the shared directory (atomically)."""
+        if self.directory is None:
+            return
+        state = {"pid": os.getpid(), "metrics": {m.name: m.dump() for m in self._metrics()},
+                 "gauges": self._read_gauges()}
+        path = self._dump_path(os.getpid())
+        tmp = f"{path}.tmp"
+        with self._dump_lock:
+            with open(tmp, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp, path)
+
+    def _dump_loop(self, interval: float) -> None:
+        while True:
+            time.sleep(interval)
+            try:
+                self.dump()
+            except OSError:
+                logger.exception("metrics dump failed")
+
+    @staticmethod
+    def _alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            return True
+        return True
+
+    def _load_dumps(self) -> List[Dict]:
+        try:
+            self.dump()
+        except OSError:
+            # the other workers' dumps can still be served
+            logger.exception("metrics dump failed")
+        dumps = []
+        for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+            try:
+                with open(path) as f:
+                    dumps.append(json.load(f))
+            except (OSError, ValueError):
+                # replaced or removed while reading
+                continue
+        return dumps
+
+    def _render_multiprocess(self) -> List[str]:
+        dumps = self._load_dumps()
+        lines = []
+        for metric in self._metrics():
+            merged = metric.merge([d["metrics"].get(metric.name, []) for d in dumps])
+            lines.extend(metric.render(merged))
+        live = [d for d in dumps if d["pid"] == os.getpid() or self._alive(d["pid"])]
+        for name, (help, _) in sorted(self._gauges.items()):
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge"])
+            values = {}
+            for d in live:
+                for labels, v in d["gauges"].get(name, []):
+                    values[tuple(map(tuple, labels)) + (("pid", str(d["pid"])),)] = v
+            lines.extend(f"{name}{_labels(key)} {_num(v)}" for key, v in sorted(values.items()))
+        return lines
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            self.stages.observe(elapsed, stage=name)
+            current = getattr(self._local, "stages", None)
+            if current is not None:
+                current[name] = current.get(name, 0.0) + elapsed
+
+    @contextmanager
+    def query(self, kind: str) -> Iterator[None]:
+        """Time a whole query; its stage times are collected into `query_stages`."""
+        outer = getattr(self._local, "stages", None)
+        if outer is not None:
+            # nested (e.g. a cached call inside a batch): stages go to the outer query
+            yield
+            return
+        self._local.stages = stages = {}
+        t0 = time.perf_counter()
+        try:
+            yield
+        except BaseException:
+            self.errors.inc(kind=kind)
+            raise
+        finally:
+            elapsed = time.perf_counter() - t0
+            self._local.stages = None
+            self._local.last = dict(stages, total=elapsed)
+            self.queries.observe(elapsed, kind=kind)
+            if self.slow_query_seconds is not None and elapsed >= self.slow_query_seconds:
+                logger.warning("slow %s query: %.3fs %s", kind, elapsed,
+                               " ".join(f"{k}={v * 1000:.1f}ms" for k, v in stages.items()))
+
+    def query_stages(self) -> Dict[str, float]:
+        """Stage times (seconds) of the last query finished by this thread."""
+        return dict(getattr(self._local, "last", {}))
+
+    def gauge(self, name: str, help: str, read: Callable[[], Dict[Tuple, float]]) -> None:
+        """Register a gauge; `read()` returns label tuple -> value."""
+        self._gauges[name] = (help, read)
+
+    def render(self) -> str:
+        """Exposition text of this process, or of every worker in multi-process mode."""
+        if self.directory is not None:
+            return "\n".join(self._render_multiprocess()) + "\n"
+        lines = []
+        for metric in self._metrics():
+            lines.extend(metric.render())
+        for name, (help, read) in sorted(self._gauges.items()):
+            lines.extend([f"# HELP {name} {help}", f"# TYPE {name} gauge"])
+            try:
+                values = read()
+            except Exception:
+                logger.exception("gauge %s failed", name)
+                continue
+            lines.extend(f"{name}{_labels(key)} {_num(v)}" for key, v in sorted(values.items()))
+        return "\n".join(lines) + "\n"
+
+
+# process-wide registry used by the controller, the providers and /metrics
+METRICS = Metrics()
@@ -0,0 +1,114 @@
+"""
+Cold-start profile of the serving process.
+
+Starts a fresh interpreter with `-X importtime`, imports the frontend
+module and waits until its data providers are loaded, then reports:
+- the time to import the module, and per import: its direct imports and
+  the heaviest modules overall (cumulative time, i.e. with their own
+  imports)
+- the load time and RSS growth of every data provider
+- the time until the process is ready to serve, and its peak RSS
+
+    python search_frontend.py --startup-profile
+    IR_DATA_DIR=/tmp/ir_bench python -m telemetry.startup --json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+_PROFILE_SCRIPT = r"""
+import json, sys, time
+t0 = time.perf_counter()
+# an import statement, so that importtime reports the module itself
+exec(f"import {sys.argv[1]}")
+module = sys.modules[sys.argv[1]]
+t1 = time.perf_counter()
+dp = module.data_provider
+ready = dp.wait_ready()
+t2 = time.perf_counter()
+with open("/proc/self/status") as f:
+    hwm_kb = next(int(l.split()[1]) for l in f if l.startswith("VmHWM"))
+print(json.dumps({"import_s": t1 - t0, "ready_s": t2 - t0, "ready": bool(ready), "providers": dp.readiness(),
+                  "load_stats": dp.load_stats, "peak_rss_mb": hwm_kb / 1024}))
+"""
+
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)\s*$")
+
+
+def parse_importtime(text: str) -> List[Dict]:
+    """Entries of `-X importtime` output: module, depth, self_s and cumulative_s."""
+    out = []
+    for line in text.splitlines():
+        m = _IMPORTTIME_LINE.match(line)
+        if m is not None:
+            out.append({"module": m.group(4), "depth": (len(m.group(3)) - 1) // 2,
+                        "self_s": int(m.group(1)) / 1e6, "cumulative_s": int(m.group(2)) / 1e6})
+    return out
+
+
+def direct_imports(entries: List[Dict], module: str) -> List[Dict]:
+    """The imports done while importing `module` itself, slowest first."""
+    out, depth = [], None
+    # importtime prints a module after its own imports, so walk backwards
+    for e in reversed(entries):
+        if depth is None:
+            if e["module"] == module:
+                depth = e["depth"]
+            continue
+        if e["depth"] <= depth:
+            break
+        if e["depth"] == depth + 1:
+            out.append(e)
+    return sorted(out, key=lambda e: -e["cumulative_s"])
+
+
+def profile_startup(module: str = "search_frontend", env: Optional[Dict[str, str]] = None, top: int = 15,
+                    timeout: float = 600.0) -> Dict:
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", _PROFILE_SCRIPT, module],
+                          cwd=REPO_ROOT, env=dict(os.environ, **(env or {})), capture_output=True, text=True,
+                          timeout=timeout)
+    if proc.returncode != 0:
+        raise RuntimeError(f"startup profile failed:\n{proc.stderr[-2000:]}")
+    report = json.loads(proc.stdout.strip().splitlines()[-1])
+    entries = parse_importtime(proc.stderr)
+    report["imports"] = direct_imports(entries, module)
+    report["heaviest_imports"] = sorted(entries, key=lambda e: -e["cumulative_s"])[:top]
+    return report
+
+
+def format_report(report: Dict) -> str:
+    lines = [f"import   {report['import_s'] * 1000:8.1f} ms",
+             f"ready    {report['ready_s'] * 1000:8.1f} ms  ({'ready' if report['ready'] else 'NOT ready'}, "
+             f"peak rss {report['peak_rss_mb']:.0f} MB)", "", "direct imports (cumulative ms):"]
+    lines += [f"  {e['cumulative_s'] * 1000:8.1f}  {e['module']}" for e in report["imports"]]
+    lines += ["", "heaviest imports (cumulative ms / self ms):"]
+    lines += [f"  {e['cumulative_s'] * 1000:8.1f} {e['self_s'] * 1000:8.1f}  {'  ' * e['depth']}{e['module']}"
+              for e in report["heaviest_imports"]]
+    lines += ["", "providers (load s / rss delta MB):"]
+    for name, state in report["providers"].items():
+        stats = report["load_stats"].get(name)
+        detail = f"{stats['seconds']:8.2f} {stats['rss_delta_mb']:+8.0f}" if stats else " " * 17
+        lines.append(f"  {detail}  {name} ({state})")
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--module", default="search_frontend", help="module that builds `data_provider` on import")
+    parser.add_argument("--top", type=int, default=15, help="heaviest imports to list")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    report = profile_startup(args.module, top=args.top)
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 0 if report["ready"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+
+from inverted_index_gcp import arrays_to_posting_list
+from ranker.array_accumulator import ArrayScoreAccumulator
+from ranker.bm25 import BM25
+from ranker.score_accumulator import ScoreAccumulator
+
+
+class TestArrayScoreAccumulator(unittest.TestCase):
+    N = 100_000
+
+    def _case(self, seed, shuffle):
+        rng = np.random.default_rng(seed)
+        postings = {}
+        for term, n in (("mount", 3000), ("everest", 40), ("climbing", 800), ("missing", 0)):
+            doc_ids = rng.choice(self.N, size=n, replace=False).astype(np.uint32)
+            if not shuffle:
+                doc_ids.sort()
+            postings[term] = (doc_ids, rng.integers(1, 9, size=n).astype(np.uint16))
+        query_w = {"everest": 2.0, "mount": 1.0, "climbing": 1.0, "missing": 1.0}
+        df_map = {t: len(a[0]) for t, a in postings.items()}
+        return postings, query_w, df_map
+
+    def _reference(self, postings, query_w, df_map):
+        lists = {t: arrays_to_posting_list(*a) for t, a in postings.items()}
+        return ScoreAccumulator.aggregate_scores(query_w, BM25.compute(lists, df_map, self.N))
+
+    def test_sparse_and_dense_match_dict_pipeline(self):
+        for dense_size in (0, self.N):
+            acc = ArrayScoreAccumulator(dense_size=dense_size)
+            for seed, shuffle in ((1, False), (2, True)):
+                postings, query_w, df_map = self._case(seed, shuffle)
+                expected = self._reference(postings, query_w, df_map)
+                doc_ids, scores = acc.accumulate(postings, query_w, df_map, self.N)
+                # same candidates, same insertion order, bit-identical scores
+                self.assertEqual(list(zip(doc_ids.tolist(), scores.tolist())), list(expected.items()))
+
+    def test_dense_scratch_is_reset(self):
+        acc = ArrayScoreAccumulator(dense_size=self.N)
+        postings, query_w, df_map = self._case(3, False)
+        first = acc.accumulate(postings, query_w, df_map, self.N)
+        second = acc.accumulate(postings, query_w, df_map, self.N)
+        self.assertEqual(first[1].tolist(), second[1].tolist())
+
+    def test_empty(self):
+        doc_ids, scores = ArrayScoreAccumulator().accumulate({}, {"a": 1.0}, {}, self.N)
+        self.assertEqual((len(doc_ids), len(scores)), (0, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
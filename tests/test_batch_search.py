@@ -0,0 +1,88 @@
+import random
+import unittest
+
+import numpy as np
+
+from controllers.SearchController import SearchController
+from controllers.query_cache import QueryResultCache
+
+
+class _FakeDataProvider:
+    """Random in-memory corpus that counts how often postings are fetched."""
+
+    def __init__(self, seed=0):
+        rng = random.Random(seed)
+        self.postings = {}
+        for term in ["stonehenge", "monument", "prehistoric", "britain", "salisbury", "druid"]:
+            docs = sorted(rng.sample(range(1, 500), rng.randint(5, 120)))
+            self.postings[term] = (np.array(docs, dtype=np.uint32),
+                                   np.array([rng.randint(1, 6) for _ in docs], dtype=np.uint16))
+        self.pagerank = {d: rng.random() for d in range(500)}
+        self.fetched = []
+
+    def get_posting_list(self, terms, as_arrays=False):
+        self.fetched.extend(terms)
+        empty = (np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.uint16))
+        return {t: self.postings.get(t, empty) for t in terms}
+
+    def get_df(self, terms):
+        return {t: len(self.postings[t][0]) if t in self.postings else 0 for t in terms}
+
+    def get_term_bounds(self, terms):
+        return {}
+
+    def corpus_size(self):
+        return 1000
+
+    def get_pagerank(self, doc_ids):
+        return {d: self.pagerank.get(d, 0.0) for d in doc_ids}
+
+    def get_pagerank_array(self, doc_ids):
+        return np.array([self.pagerank.get(int(d), 0.0) for d in doc_ids])
+
+    def get_titles_from_docIDs(self, doc_ids):
+        return [(int(d), f"title {d}") for d in doc_ids]
+
+    def index_version(self):
+        return "v1"
+
+
+QUERIES = [
+    "stonehenge monument",
+    "prehistoric monument of Britain",
+    "the the of",
+    "druid stonehenge stonehenge salisbury",
+    "unknownterm monument",
+    "stonehenge monument",
+]
+
+
+class TestBatchSearch(unittest.TestCase):
+    def test_batch_matches_single_queries(self):
+        for weight_pagerank in (0.2, 0.0):
+            dp = _FakeDataProvider()
+            sc = SearchController(bucket_name=None, data_provider=dp,
+                                  weight_text=1 - weight_pagerank, weight_pagerank=weight_pagerank)
+            self.assertEqual(sc.get_top_k_batch(QUERIES, k=10), [sc.get_top_k(q, k=10) for q in QUERIES])
+            self.assertEqual(sc.get_top_k_batch(QUERIES, k=20, with_titles=True),
+                             [sc.get_top_100(q, k=20) for q in QUERIES])
+
+    def test_each_posting_list_is_fetched_once(self):
+        dp = _FakeDataProvider()
+        sc = SearchController(bucket_name=None, data_provider=dp)
+        sc.get_top_k_batch(QUERIES, k=10)
+        self.assertEqual(sorted(dp.fetched), sorted(set(dp.fetched)))
+        self.assertIn("unknownterm", dp.fetched)
+
+    def test_batch_uses_result_cache(self):
+        dp = _FakeDataProvider()
+        sc = SearchController(bucket_name=None, data_provider=dp, result_cache=QueryResultCache())
+        first = sc.get_top_k_batch(QUERIES, k=10, with_titles=True)
+        dp.fetched.clear()
+        self.assertEqual(sc.get_top_k_batch(QUERIES, k=10, with_titles=True), first)
+        self.assertEqual(dp.fetched, [])
+        self.assertEqual(sc.get_top_100(QUERIES[0], k=10), first[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks.dataset import build_dataset, load_queries
+from benchmarks.suite import compare, percentiles
+from controllers.SearchController import SearchController
+from data_provider.data_provider import DataProvider
+from data_provider.docID_to_title_provider import TitleProvider
+from data_provider.pagerank_provider import PageRankProvider
+from data_provider.pagerank_store import LOG_PR_EPSILON
+
+
+class TestBenchmarkDataset(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.root = cls.tmp.name
+        cls.meta = build_dataset(cls.root, n_docs=500, doc_len=40, vocab_size=2000, workers=1)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.tmp.cleanup()
+
+    def test_served_from_a_local_directory(self):
+        dp = DataProvider(bucket_name=None, postings_subdir=f"{self.root}/postings_gcp", pr_subdir=f"{self.root}/pr",
+                          titles_subdir=f"{self.root}/id_to_title", parallel=False)
+        try:
+            sc = SearchController(bucket_name=None, data_provider=dp)
+            # every training query term is in the vocabulary
+            for q in load_queries()[:5]:
+                res = sc.get_top_100(q)
+                self.assertTrue(res, q)
+                self.assertTrue(all(title.startswith("Synthetic article") for _, title in res))
+        finally:
+            dp.index_provider.close()
+
+    def test_index_options_reach_the_index_provider(self):
+        lexicon = f"{self.root}/lexicon"
+        dp = DataProvider(bucket_name=None, postings_subdir=f"{self.root}/postings_gcp", pr_subdir=f"{self.root}/pr",
+                          titles_subdir=f"{self.root}/id_to_title", parallel=False, lexicon_dir=lexicon, cache_bytes=0)
+        try:
+            self.assertTrue(dp.index_version().startswith("lexicon:"))
+            self.assertIsNone(dp.index_provider.cache)
+            self.assertTrue(SearchController(bucket_name=None, data_provider=dp).get_top_100(load_queries()[0]))
+        finally:
+            dp.index_provider.close()
+
+    def test_local_stores(self):
+        store = f"{self.root}/stores"
+        pr = PageRankProvider(None, pr_subdir=f"{self.root}/pr", store_dir=f"{store}/pr")
+        titles = TitleProvider(None, titles_subdir=f"{self.root}/id_to_title", store_dir=f"{store}/titles")
+        plain = PageRankProvider(None, pr_subdir=f"{self.root}/pr")
+        ids = list(plain._pagerank)[:10] + [1]
+        expected = plain.get_pagerank(ids)
+        # the store keeps float32 scores
+        for d, score in pr.get_pagerank(ids).items():
+            self.assertAlmostEqual(score, expected[d], delta=1e-6 * max(1.0, expected[d]))
+        self.assertEqual(titles.get_titles_from_docIDs(ids[:1]), [(ids[0], f"Synthetic article {ids[0]}")])
+        # the per-query log prior: int64 ids against the store's uint32 memmap, out-of-range ids are unknown
+        q = np.array(ids + [-1, 2 ** 32 + ids[0]], dtype=np.int64)
+        self.assertEqual(pr._ids.dtype, np.uint32)
+        np.testing.assert_allclose(pr.get_log_pagerank_array(q), plain.get_log_pagerank_array(q), atol=1e-6)
+        self.assertEqual(pr.get_log_pagerank_array(q)[-1], np.log10(LOG_PR_EPSILON))
+
+    def test_rebuild_only_on_new_parameters(self):
+        self.assertEqual(build_dataset(self.root, n_docs=500, doc_len=40, vocab_size=2000, workers=1), self.meta)
+
+    def test_report_helpers(self):
+        p = percentiles([0.001, 0.002, 0.003])
+        self.assertAlmostEqual(p["p50_ms"], 2.0)
+        self.assertEqual(p["n"], 3)
+        ratios = compare({"a": {"load_s": 2.0, "qps": 50.0, "n": 3}}, {"a": {"load_s": 1.0, "qps": 100.0, "n": 1}})
+        self.assertEqual(ratios, {"a.load_s": 2.0, "a.qps": 0.5})
+
+
+if __name__ == "__main__":
+    unittest.main()
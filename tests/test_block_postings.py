@@ -0,0 +1,90 @@
+import itertools
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from inverted_index_gcp import (BLOCK_POSTINGS, POSTING_FORMAT_BLOCK_V1, InvertedIndex,
+                                decode_block_postings, encode_block_postings, read_block_headers)
+
+
+class TestBlockPostings(unittest.TestCase):
+    def test_round_trip(self):
+        rng = np.random.default_rng(7)
+        for n in (1, 2, BLOCK_POSTINGS, BLOCK_POSTINGS + 1, 1000):
+            doc_ids = np.sort(rng.choice(2 ** 32 - 1, size=n, replace=False))
+            tfs = rng.integers(1, 2 ** 20, size=n)
+            d, t = decode_block_postings(encode_block_postings(doc_ids, tfs))
+            self.assertEqual(d.tolist(), doc_ids.tolist())
+            self.assertEqual(t.tolist(), tfs.tolist())
+
+    def test_headers_allow_skipping(self):
+        doc_ids = np.arange(0, 3 * BLOCK_POSTINGS * 5, 5)
+        b = encode_block_postings(doc_ids, np.ones(len(doc_ids)))
+        headers, gap_offsets, tf_offsets = read_block_headers(b)
+        self.assertEqual(headers['n'].tolist(), [BLOCK_POSTINGS] * 3)
+        self.assertEqual(headers['first'][1], doc_ids[BLOCK_POSTINGS])
+        self.assertEqual(headers['last'][2], doc_ids[-1])
+        self.assertTrue((gap_offsets < tf_offsets).all())
+        self.assertLess(len(b), len(doc_ids) * 6)
+
+    def test_empty(self):
+        d, t = decode_block_postings(encode_block_postings([], []))
+        self.assertEqual((len(d), len(t)), (0, 0))
+
+    def test_convert_existing_index(self):
+        with tempfile.TemporaryDirectory() as src, tempfile.TemporaryDirectory() as dst:
+            postings = {
+                "mount": [(i, 1 + i % 3) for i in range(0, 3000, 7)],
+                "everest": [(5, 7), (70000, 2)],
+            }
+            index = InvertedIndex()
+            for w, pl in postings.items():
+                index.df[w] = len(pl)
+            InvertedIndex.write_a_posting_list((0, list(postings.items())), src)
+            with open(f"{src}/0_posting_locs.pickle", "rb") as f:
+                index.posting_locs.update(pickle.load(f))
+
+            converted = index.convert_posting_format(src, dst)
+            reloaded = InvertedIndex.read_index(dst, "index")
+            self.assertEqual(reloaded.posting_format, POSTING_FORMAT_BLOCK_V1)
+            for w, pl in postings.items():
+                self.assertEqual(reloaded.read_a_posting_list(dst, w), pl)
+                # the old index is still readable
+                self.assertEqual(index.read_a_posting_list(src, w), pl)
+            self.assertLess(converted.posting_n_bytes("mount"), index.posting_n_bytes("mount"))
+
+    def test_write_and_read_block_buckets(self):
+        postings = {
+            0: [("mount", [(i, 1 + i % 3) for i in range(0, 3000, 7)]), ("everest", [(5, 7), (70000, 2)])],
+            1: [("zurich", [(9, 1)])],
+        }
+        with tempfile.TemporaryDirectory() as base_dir:
+            bucket_ids = [InvertedIndex.write_a_posting_list(b_w_pl, base_dir, posting_format=POSTING_FORMAT_BLOCK_V1)
+                          for b_w_pl in postings.items()]
+            # without the byte lengths a block index cannot size its reads
+            unsized = InvertedIndex()
+            unsized.posting_format = POSTING_FORMAT_BLOCK_V1
+            with self.assertRaises(KeyError):
+                unsized.posting_n_bytes("mount")
+
+            index = InvertedIndex()
+            for w, pl in itertools.chain(*postings.values()):
+                index.df[w] = len(pl)
+            index.read_posting_metadata(base_dir, bucket_ids)
+            self.assertEqual(index.posting_format, POSTING_FORMAT_BLOCK_V1)
+            for w, pl in itertools.chain(*postings.values()):
+                self.assertEqual(index.read_a_posting_list(base_dir, w), pl)
+                # the block bounds written next to the locations are loaded too
+                last, max_tf = index.term_bounds(w)
+                self.assertEqual(last.tolist()[-1], pl[-1][0])
+                self.assertEqual(int(max_tf.max()), max(tf for _, tf in pl))
+            # a raw bucket next to block ones is refused
+            InvertedIndex.write_a_posting_list((2, [("raw", [(1, 1)])]), base_dir)
+            with self.assertRaises(ValueError):
+                InvertedIndex().read_posting_metadata(base_dir, bucket_ids + [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
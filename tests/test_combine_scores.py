@@ -0,0 +1,75 @@
+import math
+import random
+import tempfile
+import unittest
+
+import numpy as np
+
+from benchmarks.synthetic import SyntheticDataProvider
+from controllers.SearchController import SearchController
+from data_provider.pagerank_store import PageRankStore, log_pagerank
+
+
+def _reference_combine(text_scores, pr_scores, weight_text, weight_pagerank):
+    """The per-document formula: min-max normalized BM25 and log10 PageRank."""
+    log_pr = {d: math.log10(max(pr_scores.get(d, 0.0), 1e-8)) for d in text_scores}
+    c_min, c_max = min(text_scores.values()), max(text_scores.values())
+    lp_min, lp_max = min(log_pr.values()), max(log_pr.values())
+    c_diff, lp_diff = (c_max - c_min) or 1.0, (lp_max - lp_min) or 1.0
+    return {d: weight_text * (s - c_min) / c_diff + weight_pagerank * (log_pr[d] - lp_min) / lp_diff
+            for d, s in text_scores.items()}
+
+
+class TestCombineScores(unittest.TestCase):
+    def setUp(self):
+        self.dp = SyntheticDataProvider(n_terms=6, postings_per_term=400, n_docs=5000)
+        self.sc = SearchController(bucket_name=None, data_provider=self.dp)
+
+    def test_matches_reference_formula(self):
+        rng = np.random.default_rng(0)
+        doc_ids = rng.choice(5000, 300, replace=False).astype(np.uint32)
+        scores = rng.random(300).astype(np.float32) * 20
+        pr = {int(d): float(self.dp.pagerank[d]) for d in doc_ids}
+        # a few documents without PageRank
+        for d in doc_ids[:5].tolist():
+            pr[d] = 0.0
+        expected = _reference_combine(dict(zip(doc_ids.tolist(), scores.tolist())), pr, 0.8, 0.2)
+        log_pr = log_pagerank([pr[d] for d in doc_ids.tolist()])
+        combined = self.sc._combine_scores(scores, log_pr)
+        self.assertEqual(combined.dtype, np.float64)
+        np.testing.assert_allclose(combined, [expected[d] for d in doc_ids.tolist()], atol=1e-6)
+
+    def test_constant_scores_and_explicit_ranges(self):
+        scores = np.full(4, 3.0, dtype=np.float32)
+        log_pr = np.full(4, -5.0, dtype=np.float32)
+        np.testing.assert_array_equal(self.sc._combine_scores(scores, log_pr), np.zeros(4))
+        combined = self.sc._combine_scores(scores, log_pr, ranges=(1.0, 5.0, -8.0, -4.0))
+        np.testing.assert_allclose(combined, 0.8 * 0.5 + 0.2 * 0.75)
+        self.assertEqual(len(self.sc._combine_scores(scores[:0], log_pr[:0])), 0)
+
+    def test_top_k_matches_dict_ranking(self):
+        for q in ("term0 term1", "term2 term3 term4", "term5"):
+            expected = self.sc.rank_top_k(self.sc.compute_ranking_scores(q), 20)
+            self.assertEqual(self.sc.get_top_k(q, k=20), expected)
+            self.assertEqual([d for d, _ in self.sc.get_top_100(q, k=20)], expected)
+
+
+class TestLogPageRankPrior(unittest.TestCase):
+    def test_store_and_lookup(self):
+        rng = random.Random(0)
+        data = {d: rng.random() / 1000 for d in rng.sample(range(1, 10 ** 6), 1000)}
+        data[7] = 0.0
+        with tempfile.TemporaryDirectory() as tmp:
+            PageRankStore.convert(data, tmp)
+            store = PageRankStore(tmp)
+            self.assertEqual(store.log_scores.dtype, np.float32)
+            ids = [7, 8] + list(data)[:50]
+            got = store.get_log_pagerank(ids)
+            self.assertEqual(got.dtype, np.float32)
+            # unknown and zero PageRank both get the floor
+            self.assertEqual(got[:2].tolist(), [-8.0, -8.0])
+            np.testing.assert_allclose(got[2:], [math.log10(max(data[d], 1e-8)) for d in ids[2:]], rtol=1e-5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import pickle
+import tempfile
+import unittest
+
+from data_provider.index_provider import IndexProvider
+from data_provider.lexicon import Lexicon
+from inverted_index_gcp import POSTING_FORMAT_BLOCK_V1, InvertedIndex
+
+
+class TestLexicon(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base_dir = self.tmp.name
+        self.postings = {
+            "mount": [(1, 2), (5, 1), (9, 3)],
+            "everest": [(5, 7)],
+            "climbing": [(2, 1), (9, 1)],
+            "café": [(3, 4)],
+        }
+        self.index = InvertedIndex()
+        for w, pl in self.postings.items():
+            self.index.df[w] = len(pl)
+            self.index.term_total[w] = sum(tf for _, tf in pl)
+        self.index.posting_format = POSTING_FORMAT_BLOCK_V1
+        InvertedIndex.write_a_posting_list((0, list(self.postings.items())), self.base_dir,
+                                           posting_format=POSTING_FORMAT_BLOCK_V1)
+        for name in ("posting_locs", "posting_bytes", "posting_bounds"):
+            with open(f"{self.base_dir}/0_{name}.pickle", "rb") as f:
+                getattr(self.index, name).update(pickle.load(f))
+        self.index._write_globals(self.base_dir, "index", None)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_lookups_match_the_index(self):
+        lexicon_dir = f"{self.base_dir}/lexicon"
+        Lexicon.build(self.index, lexicon_dir)
+        lexicon = Lexicon(lexicon_dir)
+        self.assertEqual(len(lexicon), len(self.postings))
+        for w in self.postings:
+            self.assertEqual(lexicon.df[w], self.index.df[w])
+            self.assertEqual(lexicon.term_total[w], self.index.term_total[w])
+            self.assertEqual(lexicon.posting_locs[w], self.index.posting_locs[w])
+            self.assertEqual(lexicon.posting_n_bytes(w), self.index.posting_n_bytes(w))
+            for got, expected in zip(lexicon.term_bounds(w), self.index.term_bounds(w)):
+                self.assertEqual(list(got), list(expected))
+        self.assertNotIn("missing", lexicon.df)
+        self.assertEqual(lexicon.df.get("missing", 0), 0)
+        self.assertEqual(lexicon.posting_n_bytes("missing"), 0)
+        self.assertIsNone(lexicon.term_bounds("missing"))
+        with self.assertRaises(KeyError):
+            lexicon.posting_locs["missing"]
+
+    def test_provider_builds_and_serves_from_lexicon(self):
+        lexicon_dir = f"{self.base_dir}/lexicon"
+        provider = IndexProvider(bucket_name=None, index_prefix=self.base_dir, lexicon_dir=lexicon_dir)
+        try:
+            self.assertIsInstance(provider.index, Lexicon)
+            out = provider.get_posting_list(["everest", "missing", "café", "mount"])
+            for t in ("everest", "missing", "café", "mount"):
+                self.assertEqual(out[t], self.postings.get(t, []))
+        finally:
+            provider.close()
+        self.assertTrue(Lexicon.exists(lexicon_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import base64
+import io
+import hashlib
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from data_provider.local_mirror import LocalMirror
+from data_provider.reader_pool import PostingReaderPool
+from storage_backend import GCSBackend
+
+
+class _FakeBlob:
+    def __init__(self, name, data):
+        self.name = name
+        self.data = data
+        self.size = len(data)
+        self.md5_hash = base64.b64encode(hashlib.md5(data).digest()).decode()
+        self.crc32c = None
+
+    def download_to_filename(self, path):
+        Path(path).write_bytes(self.data)
+
+    def open(self, mode):
+        return io.BytesIO(self.data)
+
+    def download_as_bytes(self, start=None, end=None):
+        return self.data[start:end + 1]
+
+
+class _FakeBucket:
+    def __init__(self, blobs):
+        self.blobs = {b.name: b for b in blobs}
+        self.client = self
+
+    def list_blobs(self, bucket, prefix=""):
+        return [b for n, b in self.blobs.items() if n.startswith(prefix)]
+
+    def blob(self, name):
+        return self.blobs[name]
+
+
+class TestLocalMirror(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.bucket = _FakeBucket([
+            _FakeBlob("postings_gcp/0_000.bin", bytes(range(50))),
+            _FakeBlob("postings_gcp/1_000.bin", bytes(range(50, 100))),
+            _FakeBlob("postings_gcp/notes.txt", b"ignored"),
+        ])
+        patcher = mock.patch("data_provider.local_mirror.get_bucket", return_value=self.bucket)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.mirror = LocalMirror("fake", "postings_gcp", self.tmp)
+
+    def tearDown(self):
+        self.mirror.close()
+        shutil.rmtree(self.tmp)
+
+    def test_sync_and_view(self):
+        self.assertIsNone(self.mirror.view("postings_gcp/0_000.bin", 0, 4))
+        stats = self.mirror.sync()
+        self.assertEqual(stats["downloaded"], 2)
+        view = self.mirror.view("postings_gcp/1_000.bin", 10, 5)
+        self.assertIsInstance(view, memoryview)
+        self.assertEqual(bytes(view), bytes(range(60, 65)))
+        self.assertFalse(self.mirror.is_mirrored("postings_gcp/notes.txt"))
+
+        # a second mirror over the same directory reuses the files on disk
+        again = LocalMirror("fake", "postings_gcp", self.tmp, verify_existing=True)
+        self.assertEqual(again.sync()["verified"], 2)
+
+    def test_corrupt_download_is_rejected(self):
+        self.bucket.blobs["postings_gcp/0_000.bin"].md5_hash = base64.b64encode(b"0" * 16).decode()
+        self.mirror.sync()
+        self.assertFalse(self.mirror.is_mirrored("postings_gcp/0_000.bin"))
+        self.assertFalse(Path(self.tmp, "postings_gcp/0_000.bin").exists())
+
+    def test_pool_falls_back_to_bucket(self):
+        self.mirror.sync(suffixes=("1_000.bin",))
+        backend = GCSBackend(bucket=self.bucket)
+        with mock.patch("data_provider.reader_pool.get_storage", return_value=backend):
+            pool = PostingReaderPool("postings_gcp", "fake", mirror=self.mirror)
+        self.assertIsInstance(pool.read_range("1_000.bin", 0, 2), memoryview)
+        self.assertEqual(pool.read_range("0_000.bin", 3, 2), bytes([3, 4]))
+        # one ranged request, no blob handle kept open
+        self.assertEqual((backend.requests, backend.bytes_read), (1, 2))
+        self.assertEqual(pool.opened, 0)
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
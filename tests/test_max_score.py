@@ -0,0 +1,67 @@
+import unittest
+
+import numpy as np
+
+from controllers.SearchController import SearchController
+from inverted_index_gcp import arrays_to_posting_list, compute_posting_bounds
+from ranker.bm25 import BM25
+from ranker.max_score import MaxScore
+from ranker.score_accumulator import ScoreAccumulator
+
+
+class TestMaxScore(unittest.TestCase):
+    N = 1_000_000
+
+    def _postings(self, rng, sizes, max_tf=5, shuffle=False):
+        postings = {}
+        for i, n in enumerate(sizes):
+            doc_ids = np.sort(rng.choice(self.N, size=n, replace=False)).astype(np.uint32)
+            tfs = rng.integers(1, max_tf, size=n).astype(np.uint16)
+            if shuffle:
+                perm = rng.permutation(n)
+                doc_ids, tfs = doc_ids[perm], tfs[perm]
+            postings[f"t{i}"] = (doc_ids, tfs)
+        return postings
+
+    def _reference(self, postings, query_w, df_map, k):
+        lists = {t: arrays_to_posting_list(*a) for t, a in postings.items()}
+        scores = ScoreAccumulator.aggregate_scores(query_w, BM25.compute(lists, df_map, self.N))
+        return SearchController.rank_top_k(scores, k), scores
+
+    def test_matches_exhaustive_ranking(self):
+        rng = np.random.default_rng(3)
+        for sizes in ([20, 50000], [3, 400, 60000], [5000, 5000], [1], [40000, 40000, 7]):
+            for k in (1, 10, 100):
+                for shuffle in (False, True):
+                    postings = self._postings(rng, sizes, shuffle=shuffle)
+                    query_w = {t: float(rng.integers(1, 3)) for t in postings}
+                    df_map = {t: len(a[0]) for t, a in postings.items()}
+                    expected, scores = self._reference(postings, query_w, df_map, k)
+                    got = MaxScore.top_k(postings, query_w, df_map, self.N, k)
+                    self.assertEqual([d for d, _ in got], expected)
+                    self.assertEqual([s for _, s in got], [scores[d] for d in expected])
+
+    def test_rare_term_skips_common_postings(self):
+        rng = np.random.default_rng(5)
+        postings = self._postings(rng, [30, 200000])
+        query_w = {t: 1.0 for t in postings}
+        df_map = {t: len(a[0]) for t, a in postings.items()}
+        bounds = {t: compute_posting_bounds(*a) for t, a in postings.items()}
+        stats = {}
+        got = MaxScore.top_k(postings, query_w, df_map, self.N, 10, bounds=bounds, stats=stats)
+        self.assertEqual([d for d, _ in got], self._reference(postings, query_w, df_map, 10)[0])
+        self.assertEqual(stats["essential_postings"], 30)
+        self.assertLess(stats["scored"], 100)
+
+    def test_seed_reads_only_the_best_blocks(self):
+        doc_ids = np.arange(0, 4096, dtype=np.uint32)
+        tfs = np.ones(len(doc_ids), dtype=np.uint16)
+        tfs[1000:1010] = 9
+        postings = {"t0": (doc_ids, tfs)}
+        terms = MaxScore._prepare(postings, {"t0": 1.0}, {"t0": len(doc_ids)}, self.N,
+                                  {"t0": compute_posting_bounds(doc_ids, tfs)})
+        self.assertEqual(sorted(MaxScore._seed_docs(terms[0], 10).tolist()), list(range(1000, 1010)))
+
+
+if __name__ == '__main__':
+    unittest.main()
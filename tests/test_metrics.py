@@ -0,0 +1,121 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from benchmarks.synthetic import SyntheticDataProvider
+from controllers.SearchController import SearchController
+from telemetry.metrics import METRICS, Counter, Histogram, Metrics
+
+
+class TestMetrics(unittest.TestCase):
+    def test_histogram_exposition(self):
+        h = Histogram("x_seconds", "help text", buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.5, 3.0):
+            h.observe(v, stage="a")
+        lines = h.render()
+        self.assertEqual(lines[:2], ["# HELP x_seconds help text", "# TYPE x_seconds histogram"])
+        self.assertIn('x_seconds_bucket{stage="a",le="0.1"} 1', lines)
+        self.assertIn('x_seconds_bucket{stage="a",le="1.0"} 3', lines)
+        self.assertIn('x_seconds_bucket{stage="a",le="+Inf"} 4', lines)
+        self.assertIn('x_seconds_sum{stage="a"} 4.05', lines)
+        self.assertIn('x_seconds_count{stage="a"} 4', lines)
+
+    def test_counter_and_gauges(self):
+        m = Metrics()
+        m.postings_scored.inc(5)
+        m.postings_scored.inc(7)
+        m.gauge("g", "a gauge", lambda: {(("cache", "result"),): 3})
+        text = m.render()
+        self.assertIn("ir_postings_scored_total 12", text)
+        self.assertIn('g{cache="result"} 3', text)
+        c = Counter("c_total", "c")
+        c.inc(kind="a")
+        self.assertEqual(c.value(kind="a"), 1)
+
+    def test_query_stage_breakdown(self):
+        sc = SearchController(bucket_name=None,
+                              data_provider=SyntheticDataProvider(n_terms=5, postings_per_term=500, n_docs=10000))
+        before = METRICS.queries.snapshot(kind="top_100")["count"]
+        sc.get_top_100("term0 term1 of term2", k=10)
+        stages = METRICS.query_stages()
+        for stage in ("tokenize", "postings", "df", "score", "pagerank", "combine", "sort", "titles", "total"):
+            self.assertIn(stage, stages)
+        self.assertGreaterEqual(stages["total"], stages["score"])
+        self.assertEqual(METRICS.queries.snapshot(kind="top_100")["count"], before + 1)
+
+        sc.weight_pagerank = 0.0
+        sc.get_top_k("term0 term1", k=5)
+        self.assertIn("max_score", METRICS.query_stages())
+        self.assertNotIn("combine", METRICS.query_stages())
+
+    def test_errors_are_counted(self):
+        m = Metrics()
+        with self.assertRaises(ValueError):
+            with m.query("top_k"):
+                raise ValueError()
+        self.assertEqual(m.errors.value(kind="top_k"), 1)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_multiprocess_scrape_sums_every_worker(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            m = Metrics()
+            m.gauge("g", "a gauge", lambda: {(("cache", "result"),): 1})
+            m.postings_scored.inc(100)  # the parent's values are not counted
+            pids = []
+            for n in (3, 4):
+                pid = os.fork()
+                if pid == 0:
+                    m.enable_multiprocess(tmp, interval=3600)
+                    m.postings_scored.inc(n)
+                    m.queries.observe(0.5, kind="top_k")
+                    m.dump()
+                    os._exit(0)
+                pids.append(pid)
+            for pid in pids:
+                os.waitpid(pid, 0)
+            m.enable_multiprocess(tmp, interval=3600)
+            m.postings_scored.inc(5)
+            text = m.render()
+        # exited workers still count, so totals never go back
+        self.assertIn("ir_postings_scored_total 12", text)
+        self.assertIn('ir_query_seconds_count{kind="top_k"} 2', text)
+        self.assertIn('ir_query_seconds_bucket{kind="top_k",le="0.5"} 2', text)
+        # gauges of live processes only, one series each
+        self.assertIn(f'g{{cache="result",pid="{os.getpid()}"}} 1', text)
+        self.assertEqual(text.count("g{"), 1)
+
+    def test_concurrent_dumps_do_not_collide(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            m = Metrics()
+            m.directory = tmp
+            errors = []
+
+            def scrape():
+                try:
+                    for _ in range(200):
+                        m.render()
+                except Exception as e:
+                    errors.append(e)
+
+            threads = [threading.Thread(target=scrape) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(errors, [])
+
+    def test_stage_overhead(self):
+        m = Metrics()
+        n = 20000
+        t0 = time.perf_counter()
+        for _ in range(n):
+            with m.stage("x"):
+                pass
+        # a few microseconds per stage; generous bound for slow CI machines
+        self.assertLess((time.perf_counter() - t0) / n, 50e-6)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from data_provider.pagerank_store import LOG_PR_EPSILON, PageRankStore, lookup_sorted
+
+
+class TestPageRankStore(unittest.TestCase):
+    def test_convert_and_lookup(self):
+        data = {"12": 3.5, 7: 0.25, 90000: 1e-6, 5: 0.0}
+        with tempfile.TemporaryDirectory() as store_dir:
+            self.assertFalse(PageRankStore.exists(store_dir))
+            PageRankStore.convert(data, store_dir)
+            self.assertTrue(PageRankStore.exists(store_dir))
+            store = PageRankStore(store_dir)
+            self.assertEqual(len(store), 4)
+            self.assertIsInstance(store.doc_ids, np.memmap)
+            self.assertEqual(store.doc_ids.tolist(), [5, 7, 12, 90000])
+
+            got = store.get_pagerank(np.array([12, 4, 90000, 7, 10 ** 9]))
+            self.assertEqual(got.dtype, np.float64)
+            np.testing.assert_allclose(got, [3.5, 0.0, 1e-6, 0.25, 0.0], rtol=1e-6)
+            self.assertEqual(len(store.get_pagerank([])), 0)
+
+    def test_int64_ids_on_uint32_memmap(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            PageRankStore.convert({7: 0.25, 12: 3.5, 2 ** 32 - 1: 0.5}, store_dir)
+            store = PageRankStore(store_dir)
+            self.assertEqual(store.doc_ids.dtype, np.uint32)
+            # negative and > uint32 ids are unknown, not wrapped onto 7 or 2**32 - 1
+            q = np.array([-1, 12, 2 ** 32 + 7, 7, 2 ** 32 - 1, 2 ** 40, -(2 ** 32) + 12], dtype=np.int64)
+            np.testing.assert_allclose(store.get_pagerank(q), [0.0, 3.5, 0.0, 0.25, 0.5, 0.0, 0.0], rtol=1e-6)
+            floor = np.log10(LOG_PR_EPSILON)
+            got = store.get_log_pagerank(q)
+            self.assertEqual(got[[0, 2, 5, 6]].tolist(), [floor] * 4)
+            np.testing.assert_allclose(got[[1, 3]], np.log10([3.5, 0.25]), rtol=1e-6)
+        self.assertEqual(lookup_sorted(np.array([1, 2], dtype=np.int64), np.array([0.5, 1.5]), [2, -5]).tolist(),
+                         [1.5, 0.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import threading
+import unittest
+
+import numpy as np
+
+from data_provider.posting_cache import PostingListCache
+
+
+def _pl(n):
+    # n postings take 6 * n bytes (uint32 doc ids + uint16 tfs)
+    return np.arange(n, dtype=np.uint32), np.ones(n, dtype=np.uint16)
+
+
+class TestPostingListCache(unittest.TestCase):
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = PostingListCache(max_bytes=6 * 30)
+        cache.put("a", _pl(10))
+        cache.put("b", _pl(10))
+        cache.get("a")
+        cache.put("c", _pl(15))
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+        self.assertLessEqual(cache.current_bytes, cache.max_bytes)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["evictions"]), (1, 1))
+
+    def test_pinned_entries_survive(self):
+        cache = PostingListCache(max_bytes=6 * 10)
+        cache.pin("hot")
+        cache.put("hot", _pl(10))
+        cache.put("cold", _pl(5))
+        self.assertIn("hot", cache)
+        self.assertNotIn("cold", cache)
+        cache.unpin("hot")
+        cache.put("cold", _pl(5))
+        self.assertNotIn("hot", cache)
+
+    def test_cached_arrays_are_read_only(self):
+        cache = PostingListCache()
+        cache.put("a", _pl(3))
+        doc_ids, _ = cache.get("a")
+        with self.assertRaises(ValueError):
+            doc_ids[0] = 7
+
+    def test_concurrent_access(self):
+        cache = PostingListCache(max_bytes=6 * 100)
+
+        def worker(i):
+            for j in range(500):
+                key = (i + j) % 20
+                if cache.get(key) is None:
+                    cache.put(key, _pl(key + 1))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertLessEqual(cache.current_bytes, cache.max_bytes)
+        self.assertEqual(cache.current_bytes, sum(6 * (k + 1) for k in range(20) if k in cache))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+import pickle
+import tempfile
+import unittest
+
+import numpy as np
+
+from inverted_index_gcp import InvertedIndex, TUPLE_SIZE, decode_posting_arrays
+
+
+class TestPostingDecode(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base_dir = self.tmp.name
+        self.pl = [(3, 1), (17, 4), (2**31 + 5, 65535)]
+        self.index = InvertedIndex()
+        self.index.df['everest'] = len(self.pl)
+        InvertedIndex.write_a_posting_list((0, [('everest', self.pl)]), self.base_dir)
+        with open(f"{self.base_dir}/0_posting_locs.pickle", 'rb') as f:
+            self.index.posting_locs.update(pickle.load(f))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_arrays_match_tuples(self):
+        doc_ids, tfs = self.index.read_a_posting_list_arrays(self.base_dir, 'everest')
+        self.assertEqual(doc_ids.dtype, np.uint32)
+        self.assertEqual(tfs.dtype, np.uint16)
+        self.assertEqual(list(zip(doc_ids.tolist(), tfs.tolist())), self.pl)
+        self.assertEqual(self.index.read_a_posting_list(self.base_dir, 'everest'), self.pl)
+
+    def test_unknown_term_is_empty(self):
+        doc_ids, tfs = self.index.read_a_posting_list_arrays(self.base_dir, 'missing')
+        self.assertEqual(len(doc_ids), 0)
+        self.assertEqual(self.index.read_a_posting_list(self.base_dir, 'missing'), [])
+
+    def test_decode_memoryview(self):
+        b = b''.join((d << 16 | t).to_bytes(TUPLE_SIZE, 'big') for d, t in self.pl)
+        doc_ids, tfs = decode_posting_arrays(memoryview(b), len(self.pl))
+        self.assertEqual(doc_ids.tolist(), [d for d, _ in self.pl])
+        self.assertEqual(tfs.tolist(), [t for _, t in self.pl])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import pickle
+import tempfile
+import threading
+import time
+import unittest
+
+from data_provider.index_provider import IndexProvider
+from data_provider.posting_fetcher import ConcurrentPostingFetcher
+from inverted_index_gcp import InvertedIndex
+
+
+class TestPostingFetcher(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base_dir = self.tmp.name
+        self.postings = {
+            "mount": [(1, 2), (5, 1), (9, 3)],
+            "everest": [(5, 7)],
+            "climbing": [(2, 1), (9, 1)],
+        }
+        index = InvertedIndex()
+        for w, pl in self.postings.items():
+            index.df[w] = len(pl)
+        InvertedIndex.write_a_posting_list((0, list(self.postings.items())), self.base_dir)
+        with open(f"{self.base_dir}/0_posting_locs.pickle", "rb") as f:
+            index.posting_locs.update(pickle.load(f))
+        index._write_globals(self.base_dir, "index", None)
+        self.provider = IndexProvider(bucket_name=None, index_prefix=self.base_dir)
+
+    def tearDown(self):
+        self.provider.close()
+        self.tmp.cleanup()
+
+    def test_adjacent_ranges_are_merged(self):
+        index = self.provider.index
+        requests = {t: (index.posting_locs[t], index.posting_n_bytes(t)) for t in self.postings}
+        reads = ConcurrentPostingFetcher.plan_reads(requests)
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(reads[0][2], sum(index.posting_n_bytes(t) for t in self.postings))
+
+    def test_get_posting_list_matches_sequential_reads(self):
+        terms = ["everest", "missing", "mount", "climbing"]
+        out = self.provider.get_posting_list(terms)
+        for t in terms:
+            self.assertEqual(out[t], self.postings.get(t, []))
+        stats = self.provider.last_fetch_stats
+        self.assertEqual(stats["reads"], 1)
+        self.assertEqual(stats["ranges"], 3)
+        self.assertEqual(set(stats["per_term"]), {"mount", "everest", "climbing"})
+
+    def test_repeated_terms_come_from_cache(self):
+        self.provider.get_posting_list(["mount", "everest"])
+        out = self.provider.get_posting_list(["mount", "everest"], as_arrays=True)
+        self.assertEqual(self.provider.last_fetch_stats["reads"], 0)
+        self.assertEqual(out["everest"][0].tolist(), [5])
+        self.assertEqual(self.provider.cache.stats()["hits"], 2)
+
+    def test_concurrent_requests_share_one_read(self):
+        self.provider.cache = None
+        reader = self.provider.fetcher.reader
+        read_range, reads = reader.read_range, []
+
+        def slow_read_range(*args):
+            reads.append(args)
+            time.sleep(0.2)
+            return read_range(*args)
+
+        reader.read_range = slow_read_range
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.provider.get_posting_list(["mount"])))
+                   for _ in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(reads), 1)
+        self.assertEqual(results, [{"mount": self.postings["mount"]}] * 6)
+        self.assertEqual(self.provider.singleflight.stats()["coalesced"], 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
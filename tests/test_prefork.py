@@ -0,0 +1,78 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+import unittest
+import urllib.request
+from pathlib import Path
+
+_SERVER = r"""
+import os, sys
+from flask import Flask
+from serving.prefork import PreforkServer
+
+app = Flask(__name__)
+loaded = {}
+
+@app.route("/pid")
+def pid():
+    return f"{os.getpid()} {loaded['parent']} {loaded['forked']}"
+
+def preload():
+    loaded["parent"] = os.getpid()
+
+def post_fork():
+    loaded["forked"] = os.getpid()
+
+server = PreforkServer(app, host="127.0.0.1", port=0, workers=2, preload=preload, post_fork=post_fork,
+                       graceful_timeout=5)
+print(server.bind(), flush=True)
+server.run()
+"""
+
+
+@unittest.skipUnless(hasattr(os, "fork"), "pre-forking needs os.fork")
+class TestPreforkServer(unittest.TestCase):
+    def setUp(self):
+        repo_root = str(Path(__file__).resolve().parents[1])
+        self.proc = subprocess.Popen([sys.executable, "-c", _SERVER], cwd=repo_root,
+                                     stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        self.port = int(self.proc.stdout.readline())
+
+    def tearDown(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+            self.proc.wait()
+
+    def get_pids(self, n=20):
+        out = set()
+        for _ in range(n):
+            with urllib.request.urlopen(f"http://127.0.0.1:{self.port}/pid", timeout=5) as r:
+                out.add(tuple(int(x) for x in r.read().split()))
+        return out
+
+    def test_workers_share_preload_restart_and_stop(self):
+        answers = self.get_pids()
+        for worker, parent, forked in answers:
+            # preloaded in the supervisor, post_fork ran in the worker itself
+            self.assertEqual(parent, self.proc.pid)
+            self.assertEqual(forked, worker)
+        workers = {a[0] for a in answers}
+        self.assertNotIn(self.proc.pid, workers)
+
+        self.proc.send_signal(signal.SIGHUP)
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline:
+            new = {a[0] for a in self.get_pids(5)}
+            if not new & workers:
+                break
+            time.sleep(0.1)
+        self.assertFalse(new & workers)
+
+        self.proc.send_signal(signal.SIGTERM)
+        self.assertEqual(self.proc.wait(timeout=10), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
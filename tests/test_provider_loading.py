@@ -0,0 +1,88 @@
+import threading
+import unittest
+from unittest import mock
+
+from data_provider import data_provider as dp_module
+from data_provider.data_provider import DataProvider, ProviderNotReady
+
+
+class _GatedProvider:
+    """Stand-in provider whose construction blocks until `gate` is set."""
+    gate = None
+    started = None
+
+    def __init__(self, **kwargs):
+        type(self).started.set()
+        type(self).gate.wait(5)
+        self.kwargs = kwargs
+
+    def get_df(self, terms):
+        return {t: 1 for t in terms}
+
+
+class _FailingProvider:
+    def __init__(self, **kwargs):
+        raise OSError("bucket unavailable")
+
+
+def _gated(name):
+    return type(name, (_GatedProvider,), {"gate": threading.Event(), "started": threading.Event()})
+
+
+class TestProviderLoading(unittest.TestCase):
+    def setUp(self):
+        self.index_cls, self.pr_cls, self.titles_cls = _gated("Index"), _gated("PageRank"), _gated("Titles")
+        patches = [mock.patch.object(dp_module, "IndexProvider", self.index_cls),
+                   mock.patch.object(dp_module, "PageRankProvider", self.pr_cls),
+                   mock.patch.object(dp_module, "TitleProvider", self.titles_cls)]
+        for p in patches:
+            p.start()
+            self.addCleanup(p.stop)
+
+    def release_all(self):
+        for cls in (self.index_cls, self.pr_cls, self.titles_cls):
+            cls.gate.set()
+
+    def test_parallel_loads_overlap(self):
+        def release_once_all_started():
+            # sequential loading would never start the second provider
+            if all(c.started.wait(5) for c in (self.index_cls, self.pr_cls, self.titles_cls)):
+                self.release_all()
+
+        threading.Thread(target=release_once_all_started).start()
+        dp = DataProvider("bucket")
+        self.assertTrue(dp.is_ready())
+        self.assertTrue(self.titles_cls.started.is_set())
+        self.assertEqual(set(dp.load_stats), set(DataProvider.PROVIDERS))
+        self.assertEqual(dp.get_df(["a"]), {"a": 1})
+
+    def test_lazy_mode_gates_each_accessor_on_its_provider(self):
+        dp = DataProvider("bucket", lazy=True, wait_timeout=0.05)
+        self.addCleanup(self.release_all)
+        self.assertFalse(dp.is_ready())
+        self.assertEqual(dp.readiness()["index"], "loading")
+        with self.assertRaises(ProviderNotReady):
+            dp.get_df(["a"])
+
+        self.index_cls.gate.set()
+        self.assertEqual(dp.get_df(["a"]), {"a": 1})
+        self.assertEqual(dp.readiness(), {"index": "ready", "pagerank": "loading", "titles": "loading"})
+        self.assertFalse(dp.wait_ready(timeout=0.05))
+
+        self.release_all()
+        self.assertTrue(dp.wait_ready(timeout=5))
+
+    def test_failed_provider_is_reported(self):
+        with mock.patch.object(dp_module, "PageRankProvider", _FailingProvider):
+            self.release_all()
+            with self.assertRaises(OSError):
+                DataProvider("bucket")
+            dp = DataProvider("bucket", lazy=True)
+            self.assertFalse(dp.wait_ready(timeout=5))
+            self.assertEqual(dp.readiness()["pagerank"], "failed")
+            with self.assertRaises(ProviderNotReady):
+                dp.get_pagerank([1])
+
+
+if __name__ == '__main__':
+    unittest.main()
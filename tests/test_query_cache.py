@@ -0,0 +1,197 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+import numpy as np
+
+from controllers.SearchController import SearchController
+from controllers.query_cache import QueryResultCache
+from data_provider.data_provider import ProviderNotReady
+
+
+class _FakeDataProvider:
+    def __init__(self):
+        self.postings = {"stonehenge": ([3, 7], [2, 1]), "monument": ([7, 9], [1, 4])}
+        self.version = "v1"
+        self.posting_calls = 0
+        # exception raised by the PageRank lookup, if any
+        self.pagerank_error = None
+
+    def get_posting_list(self, terms, as_arrays=False):
+        self.posting_calls += 1
+        return {t: tuple(np.asarray(a) for a in self.postings.get(t, ([], []))) for t in terms}
+
+    def get_df(self, terms):
+        return {t: len(self.postings.get(t, ([],))[0]) for t in terms}
+
+    def corpus_size(self):
+        return 100
+
+    def get_pagerank(self, doc_ids):
+        return {d: float(d) for d in doc_ids}
+
+    def get_pagerank_array(self, doc_ids):
+        if self.pagerank_error is not None:
+            raise self.pagerank_error
+        return np.asarray(doc_ids, dtype=np.float64)
+
+    def get_term_bounds(self, terms):
+        return {}
+
+    def get_titles_from_docIDs(self, doc_ids):
+        return [(d, f"title {d}") for d in doc_ids]
+
+    def index_version(self):
+        return self.version
+
+
+class TestQueryResultCache(unittest.TestCase):
+    def test_key_normalizes_tokens_and_keeps_params(self):
+        a = QueryResultCache.make_key(["stonehenge", "monument", "stonehenge"], w=0.8)
+        self.assertEqual(a, QueryResultCache.make_key(["stonehenge", "stonehenge", "monument"], w=0.8))
+        self.assertNotEqual(a, QueryResultCache.make_key(["stonehenge", "monument", "stonehenge"], w=0.5))
+        self.assertNotEqual(a, QueryResultCache.make_key(["stonehenge", "monument"], w=0.8))
+
+    def test_lru_ttl_and_version(self):
+        cache = QueryResultCache(max_entries=2, ttl=None)
+        cache.put("a", [1])
+        cache.put("b", [2])
+        cache.get("a")
+        cache.put("c", [3])
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), [1])
+        cache.set_version("v2")
+        self.assertIsNone(cache.get("a"))
+
+        cache = QueryResultCache(ttl=0.0)
+        cache.put("a", [1])
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["expirations"], 1)
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cache = QueryResultCache(disk_path=path)
+            cache.set_version("v1")
+            cache.put("a", [[1, "x"]])
+            cache.close()
+
+            cache = QueryResultCache(disk_path=path)
+            cache.set_version("v1")
+            self.assertEqual(cache.get("a"), [[1, "x"]])
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+            cache.set_version("v2")
+            cache.close()
+
+            cache = QueryResultCache(disk_path=path)
+            cache.set_version("v1")
+            self.assertIsNone(cache.get("a"))
+            cache.close()
+
+    def test_disk_tier_is_bounded(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cache = QueryResultCache(max_entries=5, disk_path=path, max_disk_entries=20)
+            for i in range(100):
+                cache.put(f"k{i}", [i])
+            cache.flush()
+            rows = cache._reader().execute("SELECT key FROM results").fetchall()
+            self.assertLessEqual(len(rows), 20 + int(20 * QueryResultCache.TRIM_FRACTION))
+            # the newest rows are kept
+            self.assertIn(("k99",), rows)
+            self.assertIsNone(cache.get("k0"))
+            self.assertEqual(cache.get("k90"), [90])
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+            cache.close()
+
+    def test_sqlite_errors_only_skip_the_disk_tier(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cache = QueryResultCache(max_entries=1, disk_path=path)
+            with sqlite3.connect(path) as db:
+                db.execute("DROP TABLE results")
+            cache.put("a", [1])
+            cache.put("b", [2])
+            cache.flush()
+            self.assertIsNone(cache.get("a"))
+            self.assertEqual(cache.get("b"), [2])
+            # a failed read, and the write batches that failed
+            self.assertGreaterEqual(cache.stats()["disk_errors"], 2)
+            cache.close()
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs fork")
+    def test_forked_process_opens_its_own_connections(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.sqlite")
+            cache = QueryResultCache(max_entries=1, disk_path=path)
+            cache.put("parent", [1])
+            cache.flush()
+            parent_db = cache._reader()
+            pid = os.fork()
+            if pid == 0:
+                ok = False
+                try:
+                    cache.after_fork()
+                    cache.put("child", [2])
+                    cache.flush()
+                    ok = (cache._reader() is not parent_db and cache.get("parent") == [1]
+                          and cache.stats()["disk_errors"] == 0)
+                finally:
+                    os._exit(0 if ok else 1)
+            _, status = os.waitpid(pid, 0)
+            self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+            # the parent's connection and writer still work
+            self.assertIs(cache._reader(), parent_db)
+            cache.put("x", [3])
+            self.assertEqual(cache.get("child"), [2])
+            cache.close()
+
+    def test_controller_serves_repeats_from_cache(self):
+        dp = _FakeDataProvider()
+        sc = SearchController(bucket_name=None, data_provider=dp, result_cache=QueryResultCache())
+        first = sc.get_top_100("Stonehenge monument!")
+        calls = dp.posting_calls
+        self.assertEqual(sc.get_top_100("the STONEHENGE, monument"), first)
+        self.assertEqual(dp.posting_calls, calls)
+        self.assertEqual(sc.result_cache.stats()["hits"], 1)
+
+        sc.weight_pagerank = 0.5
+        sc.get_top_100("Stonehenge monument")
+        dp.version = "v2"
+        sc.get_top_100("Stonehenge monument")
+        self.assertEqual(sc.result_cache.stats()["hits"], 1)
+
+    def test_pagerank_not_ready_is_not_ranked_without_it(self):
+        dp = _FakeDataProvider()
+        dp.pagerank_error = ProviderNotReady("pagerank provider is still loading")
+        sc = SearchController(bucket_name=None, data_provider=dp, result_cache=QueryResultCache())
+        with self.assertRaises(ProviderNotReady):
+            sc.get_top_100("Stonehenge monument")
+        with self.assertRaises(ProviderNotReady):
+            sc.get_top_k_batch(["Stonehenge monument"], k=10)
+        self.assertEqual(sc.result_cache.stats()["entries"], 0)
+
+    def test_ranking_without_pagerank_is_not_cached(self):
+        dp = _FakeDataProvider()
+        dp.pagerank_error = OSError("pagerank read failed")
+        sc = SearchController(bucket_name=None, data_provider=dp, result_cache=QueryResultCache())
+        degraded = sc.get_top_100("Stonehenge monument")
+        self.assertEqual(sc.get_top_k_batch(["Stonehenge monument"], k=100, with_titles=True), [degraded])
+        self.assertEqual(sc.result_cache.stats()["entries"], 0)
+
+        ids = np.array([1, 2], dtype=np.int64)
+        prior, degraded = sc.log_pagerank_prior(ids)
+        self.assertTrue(degraded)
+        self.assertEqual(len(prior), 2)
+
+        dp.pagerank_error = None
+        self.assertFalse(sc.log_pagerank_prior(ids)[1])
+        fresh = sc.get_top_100("Stonehenge monument")
+        self.assertEqual(sc.result_cache.stats()["entries"], 1)
+        self.assertEqual(sc.get_top_100("Stonehenge monument"), fresh)
+        self.assertEqual(sc.result_cache.stats()["hits"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from data_provider.reader_pool import PostingReaderPool
+
+
+class TestReaderPool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.base_dir = Path(self.tmp.name)
+        for i in range(3):
+            (self.base_dir / f"0_{i:03}.bin").write_bytes(bytes(range(i, i + 100)))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_handles_are_reused(self):
+        pool = PostingReaderPool(str(self.base_dir))
+        for _ in range(5):
+            self.assertEqual(pool.read([("0_001.bin", 10)], 4), bytes([11, 12, 13, 14]))
+        self.assertEqual(pool.opened, 1)
+        self.assertEqual(pool.reused, 4)
+        pool.close()
+        self.assertEqual(pool.open_files(), 0)
+
+    def test_max_open_files(self):
+        pool = PostingReaderPool(str(self.base_dir), max_open_files=2)
+        for i in range(3):
+            pool.read_range(f"0_{i:03}.bin", 0, 1)
+        self.assertEqual(pool.open_files(), 2)
+        self.assertEqual(pool.closed, 1)
+        pool.close()
+
+    def test_concurrent_reads(self):
+        pool = PostingReaderPool(str(self.base_dir))
+        errors = []
+
+        def worker(offset):
+            for _ in range(200):
+                if pool.read_range("0_002.bin", offset, 3) != bytes(range(offset + 2, offset + 5)):
+                    errors.append(offset)
+
+        threads = [threading.Thread(target=worker, args=(o,)) for o in range(0, 80, 10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        pool.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
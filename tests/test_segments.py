@@ -0,0 +1,134 @@
+import os
+import random
+import tempfile
+import unittest
+from collections import Counter, defaultdict
+
+from data_provider.index_provider import IndexProvider
+from data_provider.segmented_index_provider import SegmentedIndexProvider
+from indexing.spimi import DOC_IDS_FILE, SpimiIndexBuilder
+from inverted_index_gcp import POSTING_FORMAT_BLOCK_V1
+from text_processor.query_tokenize import QueryTokenize
+
+WORDS = ["mount", "everest", "climbing", "stonehenge", "prehistoric", "monument", "Britain", "the", "of", "café"]
+
+
+class TestSegmentedIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.rng = random.Random(0)
+        self.docs = {d: self.text() for d in self.rng.sample(range(1, 10 ** 5), 200)}
+        SpimiIndexBuilder(self.tmp.name, workers=1, posting_format=POSTING_FORMAT_BLOCK_V1).build(self.docs.items())
+        self.provider = SegmentedIndexProvider(None, index_prefix=self.tmp.name, max_deltas=100)
+
+    def tearDown(self):
+        self.provider.close()
+        self.tmp.cleanup()
+
+    def text(self):
+        return " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(1, 30)))
+
+    def expected(self):
+        out = defaultdict(dict)
+        tk = QueryTokenize()
+        for doc_id, text in self.docs.items():
+            for w, cnt in Counter(tk.tokenize(text)).items():
+                out[w][doc_id] = cnt
+        return out
+
+    def update(self, n_new=20, n_changed=10, n_deleted=5):
+        existing = list(self.docs)
+        changed = self.rng.sample(existing, n_changed)
+        deleted = [d for d in self.rng.sample(existing, n_deleted + n_changed) if d not in changed][:n_deleted]
+        new = [d for d in self.rng.sample(range(10 ** 5, 2 * 10 ** 5), n_new)]
+        batch = [(d, self.text()) for d in changed + new]
+        self.docs.update(batch)
+        for d in deleted:
+            del self.docs[d]
+        self.provider.add_documents(batch, deleted=deleted)
+
+    def check(self):
+        expected = self.expected()
+        terms = sorted(expected) + ["missing"]
+        got = self.provider.get_posting_list(terms)
+        df = self.provider.get_df(terms)
+        for w in terms:
+            self.assertEqual(got[w], sorted(expected.get(w, {}).items()), w)
+            self.assertEqual(df[w], len(expected.get(w, {})))
+        # idf uses the live document count
+        self.assertEqual(self.provider.get_N(), len(self.docs))
+
+    def test_deltas_match_the_rebuilt_index(self):
+        version = self.provider.index_version
+        for _ in range(3):
+            self.update()
+            self.check()
+        self.assertNotEqual(self.provider.index_version, version)
+        self.assertEqual(len(self.provider._snapshot.deltas), 3)
+        self.assertEqual(self.provider.last_merge_stats["segments"], 4)
+        # a fresh process sees the same segment set
+        reopened = SegmentedIndexProvider(None, index_prefix=self.tmp.name)
+        try:
+            self.assertEqual(reopened.index_version, self.provider.index_version)
+        finally:
+            reopened.close()
+
+    def test_readers_poll_for_segments_published_elsewhere(self):
+        reader = SegmentedIndexProvider(None, index_prefix=self.tmp.name, refresh_interval=0.0)
+        frozen = SegmentedIndexProvider(None, index_prefix=self.tmp.name, refresh_interval=None)
+        try:
+            self.update()
+            self.assertEqual(reader.index_version, self.provider.index_version)
+            self.assertNotEqual(frozen.index_version, self.provider.index_version)
+            self.provider.compact(include_base=True)
+            expected = self.expected()
+            self.assertEqual(reader.get_df(sorted(expected)), {w: len(d) for w, d in expected.items()})
+            self.assertEqual(reader._snapshot.deltas, [])
+        finally:
+            reader.close()
+            frozen.close()
+
+    def test_compaction(self):
+        for _ in range(3):
+            self.update()
+        self.assertIsNotNone(self.provider.compact())
+        self.assertEqual(len(self.provider._snapshot.deltas), 1)
+        self.check()
+        self.update()
+        self.assertIsNotNone(self.provider.compact(include_base=True))
+        self.assertEqual(self.provider._snapshot.deltas, [])
+        self.assertEqual(self.provider.merge_stats["compactions"], 2)
+        self.check()
+
+    def test_background_compaction_after_max_deltas(self):
+        self.provider.max_deltas = 2
+        for _ in range(3):
+            self.update()
+        self.provider._compaction.join()
+        self.assertEqual(len(self.provider._snapshot.deltas), 1)
+        self.check()
+
+    def test_document_count_over_a_base_without_doc_ids(self):
+        self.provider.close()
+        os.remove(os.path.join(self.tmp.name, DOC_IDS_FILE))
+        self.provider = SegmentedIndexProvider(None, index_prefix=self.tmp.name)
+        n = self.provider.get_N()
+        self.assertEqual(n, IndexProvider(None, index_prefix=self.tmp.name, cache_bytes=0).get_N())
+        base_doc, other_doc = list(self.docs)[:2]
+        # a new id, a base document replaced (so also in `deleted`) and one deleted
+        self.provider.add_documents([(10 ** 6, "mount"), (base_doc, "everest")], deleted=[base_doc, other_doc])
+        self.assertEqual(self.provider.get_N(), n)
+        # ids held by a delta are resolved from its doc list
+        self.provider.add_documents([(10 ** 6, "everest")])
+        self.assertEqual(self.provider.get_N(), n)
+        self.provider.add_documents([], deleted=[10 ** 6])
+        self.assertEqual(self.provider.get_N(), n - 1)
+
+    def test_bounds_only_for_terms_without_deltas(self):
+        self.assertEqual(set(self.provider.get_term_bounds(["mount", "everest"])), {"mount", "everest"})
+        self.provider.add_documents([(10 ** 6, "mount")])
+        self.assertEqual(set(self.provider.get_term_bounds(["mount", "everest"])), {"everest"})
+
+
+if __name__ == "__main__":
+    unittest.main()
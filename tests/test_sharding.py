@@ -0,0 +1,121 @@
+import random
+import socket
+import tempfile
+import unittest
+
+import numpy as np
+
+from controllers.SearchController import SearchController
+from data_provider.index_provider import IndexProvider
+from indexing.spimi import SpimiIndexBuilder, shard_of
+from inverted_index_gcp import POSTING_FORMAT_BLOCK_V1
+from serving.sharding import LocalShardCluster, ShardCoordinator, ShardService, ShardsUnavailable
+
+WORDS = ["mount", "everest", "climbing", "stonehenge", "prehistoric", "monument", "Britain", "the", "of", "café"]
+QUERIES = ["mount everest", "prehistoric monument of Britain", "climbing café café", "the of", "unknownterm mount"]
+
+
+class _LocalDataProvider:
+    """A local index with in-memory PageRank and titles."""
+
+    def __init__(self, index_dir, pagerank, n_docs):
+        self.index = IndexProvider(bucket_name=None, index_prefix=index_dir)
+        self.pagerank = pagerank
+        self.n_docs = n_docs
+
+    def get_posting_list(self, terms, as_arrays=False):
+        return self.index.get_posting_list(terms, as_arrays=as_arrays)
+
+    def get_df(self, terms):
+        return self.index.get_df(terms)
+
+    def get_term_bounds(self, terms):
+        return self.index.get_term_bounds(terms)
+
+    def corpus_size(self):
+        return self.n_docs
+
+    def get_pagerank(self, doc_ids):
+        return {d: self.pagerank.get(d, 0.0) for d in doc_ids}
+
+    def get_pagerank_array(self, doc_ids):
+        return np.array([self.pagerank.get(int(d), 0.0) for d in doc_ids])
+
+    def get_titles_from_docIDs(self, doc_ids):
+        return [(int(d), f"title {d}") for d in doc_ids]
+
+    def index_version(self):
+        return "v1"
+
+
+class TestSharding(unittest.TestCase):
+    NUM_SHARDS = 3
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        rng = random.Random(0)
+        docs = [(d, " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 20))))
+                for d in rng.sample(range(1, 10 ** 5), 600)]
+        # coarse PageRank values, so combined scores tie across shards
+        pagerank = {d: rng.choice([0.0, 0.5, 1.0, 2.0]) for d, _ in docs}
+        SpimiIndexBuilder(f"{cls.tmp.name}/all", workers=1, posting_format=POSTING_FORMAT_BLOCK_V1).build(docs)
+        cls.single = _LocalDataProvider(f"{cls.tmp.name}/all", pagerank, len(docs))
+        factories = []
+        for shard in range(cls.NUM_SHARDS):
+            shard_docs = [(d, text) for d, text in docs if shard_of(d, cls.NUM_SHARDS) == shard]
+            out = f"{cls.tmp.name}/shard{shard}"
+            SpimiIndexBuilder(out, workers=1, posting_format=POSTING_FORMAT_BLOCK_V1).build(shard_docs)
+            factories.append(lambda out=out, shard=shard, n=len(shard_docs): ShardService(
+                _LocalDataProvider(out, pagerank, n), shard_id=shard))
+        cls.cluster = LocalShardCluster(factories)
+        cls.cluster.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cluster.stop()
+        cls.single.index.close()
+        cls.tmp.cleanup()
+
+    def test_matches_single_node(self):
+        for weight_pagerank in (0.2, 0.0):
+            sc = SearchController(bucket_name=None, data_provider=self.single,
+                                  weight_text=1 - weight_pagerank, weight_pagerank=weight_pagerank)
+            coordinator = ShardCoordinator(self.cluster.urls, weight_text=1 - weight_pagerank,
+                                           weight_pagerank=weight_pagerank, timeout=30.0)
+            try:
+                for q in QUERIES:
+                    self.assertEqual(coordinator.get_top_k(q, k=25), sc.get_top_k(q, k=25), q)
+                    self.assertEqual(coordinator.get_top_100(q, k=40), sc.get_top_100(q, k=40), q)
+                self.assertIn("rank_s", coordinator.last_query_stats)
+            finally:
+                coordinator.close()
+
+    def test_unreachable_shard_gives_partial_results(self):
+        # a socket that accepts connections but never answers
+        silent = socket.socket()
+        silent.bind(("127.0.0.1", 0))
+        silent.listen(8)
+        url = f"http://127.0.0.1:{silent.getsockname()[1]}"
+        coordinator = ShardCoordinator(self.cluster.urls + [url], timeout=1.0)
+        try:
+            res = coordinator.search("mount everest", k=10)
+            self.assertTrue(res["partial"])
+            self.assertEqual(res["failed_shards"], [self.NUM_SHARDS])
+            self.assertEqual(len(res["results"]), 10)
+            self.assertEqual(coordinator.last_query_stats["failed_shards"], {self.NUM_SHARDS: "timeout"})
+        finally:
+            coordinator.close()
+            silent.close()
+
+    def test_too_few_shards(self):
+        coordinator = ShardCoordinator(["http://127.0.0.1:9"], timeout=1.0)
+        try:
+            with self.assertRaises(ShardsUnavailable):
+                coordinator.search("mount")
+        finally:
+            coordinator.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+import threading
+import time
+import unittest
+
+from data_provider.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def test_concurrent_callers_share_one_load(self):
+        sf = SingleFlight()
+        calls = []
+        release = threading.Event()
+
+        def load(keys):
+            calls.append(list(keys))
+            release.wait(5)
+            return {k: k.upper() for k in keys}
+
+        results = []
+        start = threading.Barrier(9)
+
+        def caller():
+            start.wait()
+            results.append(sf.do_many(["a", "b"], load))
+
+        threads = [threading.Thread(target=caller) for _ in range(8)]
+        for t in threads:
+            t.start()
+        start.wait()
+        # give every caller time to find the load in flight
+        time.sleep(0.2)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(calls, [["a", "b"]])
+        self.assertEqual(results, [{"a": "A", "b": "B"}] * 8)
+        self.assertEqual(sf.stats()["loads"], 2)
+        self.assertEqual(sf.stats()["coalesced"], 14)
+        self.assertEqual(sf.key_stats("a")["coalesced"], 7)
+        self.assertGreater(sf.key_stats("a")["wait_s"], 0.0)
+        self.assertEqual(sf.in_flight(), 0)
+
+    def test_partial_overlap_and_errors(self):
+        sf = SingleFlight()
+        self.assertEqual(sf.do_many(["x", "y"], lambda keys: {"x": 1}), {"x": 1, "y": None})
+        self.assertEqual(sf.do("z", lambda: 3), 3)
+        with self.assertRaises(KeyError):
+            sf.do("boom", lambda: {}["missing"])
+        # a failed load is not remembered
+        self.assertEqual(sf.do("boom", lambda: 4), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
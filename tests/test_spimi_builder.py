@@ -0,0 +1,71 @@
+import json
+import random
+import tempfile
+import unittest
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from data_provider.index_provider import IndexProvider
+from indexing.spimi import SpimiIndexBuilder, iter_documents, token2bucket_id
+from inverted_index_gcp import POSTING_FORMAT_BLOCK_V1, POSTING_FORMAT_RAW, InvertedIndex
+from text_processor.query_tokenize import QueryTokenize
+
+WORDS = ["mount", "everest", "climbing", "stonehenge", "prehistoric", "monument", "Britain", "the", "of", "café"]
+
+
+class TestSpimiBuilder(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = random.Random(0)
+        # doc ids out of order, so runs must be re-sorted while merging
+        ids = rng.sample(range(1, 10 ** 6), 400)
+        self.docs = [(d, " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 40)))) for d in ids]
+        self.expected = defaultdict(dict)
+        tk = QueryTokenize()
+        for doc_id, text in self.docs:
+            for w, cnt in Counter(tk.tokenize(text)).items():
+                self.expected[w][doc_id] = cnt
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check_index(self, out_dir, posting_format):
+        index = InvertedIndex.read_index(out_dir, "index")
+        self.assertEqual(index.posting_format, posting_format)
+        self.assertEqual(set(index.df), set(self.expected))
+        provider = IndexProvider(bucket_name=None, index_prefix=out_dir, cache_bytes=0)
+        try:
+            got = provider.get_posting_list(list(self.expected))
+        finally:
+            provider.close()
+        for w, postings in self.expected.items():
+            self.assertEqual(got[w], sorted(postings.items()))
+            self.assertEqual(index.df[w], len(postings))
+            self.assertEqual(index.term_total[w], sum(postings.values()))
+            self.assertTrue(all(f.startswith(f"{token2bucket_id(w)}_") for f, _ in index.posting_locs[w]))
+            self.assertTrue(Path(out_dir, f"{token2bucket_id(w)}_posting_locs.pickle").exists())
+
+    def test_multiple_runs_merge_into_the_bucket_layout(self):
+        for posting_format in (POSTING_FORMAT_RAW, POSTING_FORMAT_BLOCK_V1):
+            out_dir = f"{self.tmp.name}/out{posting_format}"
+            builder = SpimiIndexBuilder(out_dir, workers=1, memory_mb=0, batch_docs=50,
+                                        posting_format=posting_format, tmp_dir=self.tmp.name)
+            builder.build(iter(self.docs))
+            self.assertEqual(builder.stats["runs"], 8)
+            self.assertEqual(builder.stats["docs"], len(self.docs))
+            self.check_index(out_dir, posting_format)
+
+    def test_process_pool_and_jsonl_input(self):
+        path = f"{self.tmp.name}/docs.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for doc_id, text in self.docs:
+                f.write(json.dumps({"id": doc_id, "text": text}) + "\n")
+        out_dir = f"{self.tmp.name}/out"
+        builder = SpimiIndexBuilder(out_dir, workers=2, batch_docs=64, tmp_dir=self.tmp.name)
+        builder.build(iter_documents([path]))
+        self.assertEqual(builder.stats["runs"], 1)
+        self.check_index(out_dir, POSTING_FORMAT_RAW)
+
+
+if __name__ == '__main__':
+    unittest.main()
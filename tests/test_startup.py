@@ -0,0 +1,48 @@
+import json
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+from telemetry.startup import direct_imports, parse_importtime
+from text_processor.query_tokenize import QueryTokenize
+from text_processor.stopwords import ENGLISH_STOPWORDS
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+_IMPORTTIME = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |     numpy._core
+import time:       200 |        300 |   numpy
+import time:        50 |         50 |   ranker
+import time:        10 |        360 | controllers.SearchController
+import time:        40 |        400 | search_frontend
+"""
+
+
+class TestStartup(unittest.TestCase):
+    def test_baked_stopwords_match_nltk(self):
+        try:
+            from nltk.corpus import stopwords
+            words = stopwords.words("english")
+        except (ImportError, LookupError):
+            self.skipTest("nltk stopwords corpus not available")
+        self.assertEqual(ENGLISH_STOPWORDS, frozenset(words))
+        self.assertEqual(QueryTokenize().tokenize("The History of the Roman Empire"), ["roman", "empire"])
+
+    def test_serving_imports_stay_light(self):
+        code = ("import sys, json, controllers.SearchController, data_provider.data_provider, storage_backend; "
+                "print(json.dumps([m for m in ('nltk', 'google.cloud.storage', 'requests') if m in sys.modules]))")
+        out = subprocess.run([sys.executable, "-c", code], cwd=REPO_ROOT, check=True, capture_output=True, text=True)
+        self.assertEqual(json.loads(out.stdout), [])
+
+    def test_parse_importtime(self):
+        entries = parse_importtime(_IMPORTTIME)
+        self.assertEqual(len(entries), 5)
+        self.assertEqual(entries[1], {"module": "numpy", "depth": 1, "self_s": 200e-6, "cumulative_s": 300e-6})
+        self.assertEqual([e["module"] for e in direct_imports(entries, "controllers.SearchController")],
+                         ["numpy", "ranker"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from data_provider.reader_pool import PostingReaderPool
+from inverted_index_gcp import MultiFileReader
+from storage_backend import (HTTPBackend, LocalBackend, MemoryBackend, ReadaheadBackend, StorageBackend, get_backend,
+                             serve_directory)
+
+
+class TestStorageBackends(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls.tmp.name)
+        (cls.root / "postings").mkdir()
+        cls.data = bytes(range(256)) * 40
+        (cls.root / "postings" / "0_000.bin").write_bytes(cls.data)
+        cls.server = serve_directory(cls.tmp.name)
+        cls.url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.tmp.cleanup()
+
+    def _check(self, backend, path):
+        self.assertEqual(backend.read_range(path, 100, 7), self.data[100:107])
+        self.assertEqual(backend.read_range(path, len(self.data) - 3, 10), self.data[-3:])
+        self.assertEqual(backend.read_ranges([(path, 0, 3), (path, 1000, 5)]), [self.data[:3], self.data[1000:1005]])
+        self.assertEqual(backend.size(path), len(self.data))
+        self.assertTrue(backend.exists(path))
+        self.assertFalse(backend.exists("postings/missing.bin"))
+        self.assertTrue(backend.version(path))
+        with backend.open(path, "rb") as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_local(self):
+        backend = LocalBackend(str(self.root))
+        self._check(backend, "postings/0_000.bin")
+        self.assertEqual(backend.requests, 4)
+
+    def test_memory(self):
+        backend = MemoryBackend()
+        with backend.open("postings/0_000.bin", "wb") as f:
+            f.write(self.data)
+        version = backend.version("postings/0_000.bin")
+        self._check(backend, "postings/0_000.bin")
+        backend.put("postings/0_000.bin", self.data)
+        self.assertNotEqual(backend.version("postings/0_000.bin"), version)
+
+    def test_http_stand_in(self):
+        backend = HTTPBackend(self.url)
+        self._check(backend, "postings/0_000.bin")
+        # each range is exactly one request for exactly those bytes
+        self.assertEqual((backend.requests, backend.bytes_read), (4, 7 + 3 + 3 + 5))
+        with self.assertRaises(FileNotFoundError):
+            backend.read_range("postings/missing.bin", 0, 1)
+
+    def test_readahead(self):
+        inner = MemoryBackend()
+        inner.put("f", self.data)
+        backend = ReadaheadBackend(inner, readahead_bytes=1024, max_cached_bytes=2048)
+        self.assertEqual(backend.read_range("f", 10, 20), self.data[10:30])
+        self.assertEqual(backend.read_range("f", 500, 100), self.data[500:600])
+        self.assertEqual(inner.requests, 1)
+        # spans a cached and three missing windows: one request for the missing run
+        self.assertEqual(backend.read_range("f", 1000, 2100), self.data[1000:3100])
+        self.assertEqual((inner.requests, inner.bytes_read), (2, 4 * 1024))
+        # the cache holds two windows, window 0 was evicted
+        self.assertEqual(backend.read_range("f", 0, 4), self.data[:4])
+        self.assertEqual(inner.requests, 3)
+
+    def test_incomplete_backend_fails_at_construction(self):
+        class NoVersion(StorageBackend):
+            def open(self, path, mode="rb"):
+                return open(path, mode)
+
+            def read_range(self, path, offset, length):
+                return b""
+
+            def exists(self, path):
+                return False
+
+            def size(self, path):
+                return 0
+
+        with self.assertRaises(TypeError):
+            NoVersion()
+
+    def test_get_backend(self):
+        self.assertIsInstance(get_backend(None), LocalBackend)
+        self.assertIs(get_backend("memory://a"), get_backend("memory://a"))
+        self.assertIsNot(get_backend("memory://a"), get_backend("memory://b"))
+        self.assertIsInstance(get_backend(self.url), HTTPBackend)
+        self.assertIsInstance(get_backend(self.url, readahead_bytes=4096), ReadaheadBackend)
+
+    def test_posting_readers_over_http(self):
+        locs = [("0_000.bin", 64)]
+        reader = MultiFileReader("postings", self.url)
+        self.assertEqual(reader.read(locs, 12), self.data[64:76])
+        pool = PostingReaderPool("postings", self.url, readahead_bytes=4096)
+        self.assertEqual(pool.read(locs, 12), self.data[64:76])
+        self.assertEqual(pool.read_range("0_000.bin", 100, 8), self.data[100:108])
+        self.assertEqual(pool.opened, 0)
+        pool.close()
+
+    @unittest.skipUnless(hasattr(os, "fork"), "needs os.fork")
+    def test_forked_child_gets_fresh_backends(self):
+        http = get_backend(self.url)
+        http.read_ranges([("postings/0_000.bin", 0, 3), ("postings/0_000.bin", 8, 3)])
+        self.assertIsNotNone(http._executor)
+        memory = get_backend("memory://fork")
+        memory.put("f", b"abc")
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                ok = (get_backend(self.url) is not http and http._executor is None
+                      and get_backend("memory://fork") is memory and memory.read_range("f", 1, 2) == b"bc"
+                      and get_backend(self.url).read_ranges([("postings/0_000.bin", 0, 2)] * 2) == [self.data[:2]] * 2)
+                os.write(w, b"1" if ok else b"0")
+            finally:
+                os._exit(0)
+        os.close(w)
+        with os.fdopen(r, "rb") as f:
+            answer = f.read()
+        os.waitpid(pid, 0)
+        self.assertEqual(answer, b"1")
+        # the parent keeps its backends
+        self.assertIs(get_backend(self.url), http)
+        self.assertIsNotNone(http._executor)
+
+
+if __name__ == "__main__":
+    unittest.main()
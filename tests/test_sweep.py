@@ -0,0 +1,58 @@
+import unittest
+
+from benchmarks.synthetic import SyntheticDataProvider
+from controllers.SearchController import SearchController
+from evaluation.sweep import ParameterSweep, average_precision_at_k, grid, recall_at_k
+from ranker.bm25 import BM25
+
+QUERIES = ["term0 term1", "term2 term3 term4", "term5 of term5", "the of", "term1 term6"]
+
+
+class TestParameterSweep(unittest.TestCase):
+    def setUp(self):
+        self.dp = SyntheticDataProvider(n_terms=8, postings_per_term=300, n_docs=5000)
+        self.sc = SearchController(bucket_name=None, data_provider=self.dp)
+        # a gold standard that agrees with part of the default ranking
+        self.gold = {q: self.sc.get_top_k(q, k=20)[::2] for q in QUERIES}
+
+    def _reference(self, k1, weight_text, weight_pagerank, k):
+        sc = SearchController(bucket_name=None, data_provider=self.dp, weight_text=weight_text,
+                              weight_pagerank=weight_pagerank)
+        k1_default = BM25.K1
+        BM25.K1 = k1
+        try:
+            return [sc.get_top_k(q, k=k) for q in QUERIES]
+        finally:
+            BM25.K1 = k1_default
+
+    def test_rankings_match_the_controller(self):
+        sweep = ParameterSweep(self.sc, self.gold, k=30)
+        for k1, wt, wp in [(1.5, 0.8, 0.2), (0.9, 0.6, 0.4), (2.0, 1.0, 0.0)]:
+            self.assertEqual([sweep.rank(p, k1, wt, wp) for p in sweep.queries], self._reference(k1, wt, wp, 30))
+        # the caller's controller keeps its weights
+        self.assertEqual((self.sc.weight_text, self.sc.weight_pagerank), (0.8, 0.2))
+
+    def test_parallel_run(self):
+        sweep = ParameterSweep(self.sc, self.gold, k=30)
+        configs = grid([1.2, 1.5], [0.0, 0.2])
+        self.assertEqual(configs[1], (1.2, 0.8, 0.2))
+        serial = sweep.run(configs, workers=1)
+        parallel = sweep.run(configs, workers=2)
+        strip = lambda rows: [{k: v for k, v in r.items() if not k.endswith("_ms")} for r in rows]
+        self.assertEqual(strip(parallel), strip(serial))
+        best = [r for r in serial if (r["k1"], r["weight_pagerank"]) == (1.5, 0.2)][0]
+        # the gold documents are every other one of the default top 20
+        self.assertEqual(best["p@10"], 0.5 * sum(1 for g in self.gold.values() if g) / len(QUERIES))
+        self.assertEqual(best["recall@30"], sum(1 for g in self.gold.values() if g) / len(QUERIES))
+        self.assertGreaterEqual(serial[0]["map@40"], best["map@40"])
+
+    def test_metrics(self):
+        self.assertAlmostEqual(average_precision_at_k([1, 2, 3, 4], [1, 3], k=40), (1 / 1 + 2 / 3) / 2)
+        self.assertEqual(average_precision_at_k([5, 6], [1, 2], k=40), 0.0)
+        self.assertEqual(average_precision_at_k([1], [], k=40), 0.0)
+        self.assertEqual(recall_at_k([1, 2, 3], [3, 4], k=2), 0.0)
+        self.assertEqual(recall_at_k([1, 2, 3], [3, 4], k=3), 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,31 @@
+import tempfile
+import unittest
+
+import numpy as np
+
+from data_provider.title_store import TitleStore
+
+
+class TestTitleStore(unittest.TestCase):
+    def test_convert_and_lookup(self):
+        data = {"12": "Mount Everest", 7: "Stonehenge", 90000: "Zürich", 5: ""}
+        with tempfile.TemporaryDirectory() as store_dir:
+            TitleStore.convert(data, store_dir)
+            self.assertTrue(TitleStore.exists(store_dir))
+            store = TitleStore(store_dir)
+            self.assertEqual(len(store), 4)
+            self.assertEqual(store.get_titles([90000, 12, 4, 7, 5]),
+                             ["Zürich", "Mount Everest", "", "Stonehenge", ""])
+            self.assertEqual(store.get_titles(np.array([7], dtype=np.uint32)), ["Stonehenge"])
+            self.assertEqual(store.get_titles([]), [])
+            # ids outside uint32 are unknown, not wrapped onto stored ids
+            self.assertEqual(store.get_titles(np.array([-1, 2 ** 32 + 7, 12], dtype=np.int64)), ["", "", "Mount Everest"])
+
+    def test_empty_store(self):
+        with tempfile.TemporaryDirectory() as store_dir:
+            TitleStore.convert({}, store_dir)
+            self.assertEqual(TitleStore(store_dir).get_titles([1, 2]), ["", ""])
+
+
+if __name__ == '__main__':
+    unittest.main()
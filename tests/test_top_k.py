@@ -0,0 +1,35 @@
+import unittest
+
+import numpy as np
+
+from ranker.top_k import TopK
+
+
+class TestTopK(unittest.TestCase):
+    def _sorted_reference(self, doc_ids, scores, k):
+        ranked = sorted(zip(doc_ids, scores), key=lambda item: item[1], reverse=True)
+        return ranked[:k]
+
+    def test_dict_matches_full_sort_with_ties(self):
+        rng = np.random.default_rng(11)
+        for n in (0, 1, 5, 1000):
+            doc_ids = rng.permutation(10 * n + 1)[:n].tolist()
+            # few distinct values, so ties cross the top-k boundary
+            scores = rng.integers(0, 4, size=n).astype(float).tolist()
+            d = dict(zip(doc_ids, scores))
+            for k in (0, 1, 3, 100, 2000):
+                self.assertEqual(TopK.from_dict(d, k), self._sorted_reference(doc_ids, scores, k))
+
+    def test_arrays_match_full_sort_with_ties(self):
+        rng = np.random.default_rng(12)
+        for n in (0, 1, 5, 1000):
+            doc_ids = rng.permutation(10 * n + 1)[:n].astype(np.int64)
+            scores = rng.integers(0, 4, size=n) / 3.0
+            for k in (0, 1, 3, 100, 2000):
+                ids, top = TopK.from_arrays(doc_ids, scores, k)
+                self.assertEqual(list(zip(ids.tolist(), top.tolist())),
+                                 self._sorted_reference(doc_ids.tolist(), scores.tolist(), k))
+
+
+if __name__ == '__main__':
+    unittest.main()
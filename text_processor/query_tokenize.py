@@ -1,7 +1,8 @@
 import re
-from nltk.corpus import stopwords
 from typing import List
 
+from .stopwords import ALL_STOPWORDS, CORPUS_STOPWORDS, ENGLISH_STOPWORDS
+
 class QueryTokenize:
     """
     Responsible for query text processing.
@@ -12,19 +13,10 @@ class QueryTokenize:
     # Regular expression used in index creation
     RE_WORD = re.compile(r"""[\#\@\w](['\-]?\w){2,24}""", re.UNICODE)
 
-    # English stopwords (NLTK)
-    ENGLISH_STOPWORDS = frozenset(stopwords.words('english'))
-
-    # Corpus-specific stopwords (Assignment 3)
-    CORPUS_STOPWORDS = {
-        "category", "references", "also", "external", "links",
-        "may", "first", "see", "history", "people", "one", "two",
-        "part", "thumb", "including", "second", "following",
-        "many", "however", "would", "became"
-    }
-
-    # Unified stopword set
-    ALL_STOPWORDS = ENGLISH_STOPWORDS.union(CORPUS_STOPWORDS)
+    # English (NLTK) + corpus-specific stopwords, baked in `stopwords.py`
+    ENGLISH_STOPWORDS = ENGLISH_STOPWORDS
+    CORPUS_STOPWORDS = CORPUS_STOPWORDS
+    ALL_STOPWORDS = ALL_STOPWORDS
 
     def tokenize(self, text: str) -> List[str]:
         """